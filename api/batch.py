@@ -0,0 +1,184 @@
+"""
+Пакетные запросы: несколько вызовов API за один HTTP-запрос.
+
+Подзапросы выполняются прямо через URL-роутинг Django, без повторного
+прохода middleware: пользователь и сессия берутся из внешнего запроса
+(CSRF уже проверен для него), соединение с БД общее. Ответ DRF
+возвращается как есть (response.data), без повторной сериализации в JSON.
+"""
+import json
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.http import Http404, HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import serializers, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import querybudget
+
+BATCH_MAX_REQUESTS = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+BATCH_ALLOWED_METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE')
+# Подзапросы только к API, не к админке и медиа
+BATCH_PATH_PREFIX = '/api/'
+
+# Заголовки внешнего запроса, которые не относятся к подзапросу
+_BODY_META = ('CONTENT_TYPE', 'CONTENT_LENGTH', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE')
+# Заголовки, которые может задать подзапрос, -> ключ META. Host, Cookie,
+# X-Forwarded-* и прочие берутся только из внешнего запроса
+BATCH_ALLOWED_HEADERS = {
+    'accept': 'HTTP_ACCEPT',
+    'if-none-match': 'HTTP_IF_NONE_MATCH',
+    'if-modified-since': 'HTTP_IF_MODIFIED_SINCE',
+    'content-type': 'CONTENT_TYPE',
+}
+
+
+class SubRequestSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=BATCH_ALLOWED_METHODS, default='GET')
+    path = serializers.CharField(max_length=2000)
+    body = serializers.JSONField(required=False)
+    headers = serializers.DictField(child=serializers.CharField(), required=False)
+
+    def validate_method(self, value):
+        return value.upper()
+
+    def validate_headers(self, value):
+        forbidden = sorted(name for name in value if name.lower() not in BATCH_ALLOWED_HEADERS)
+        if forbidden:
+            raise serializers.ValidationError(f'Недопустимые заголовки: {", ".join(forbidden)}')
+        return value
+
+    def validate_path(self, value):
+        if not value.startswith(BATCH_PATH_PREFIX):
+            raise serializers.ValidationError(f'Путь должен начинаться с {BATCH_PATH_PREFIX}')
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = SubRequestSerializer(many=True, allow_empty=False)
+    # Все записи в одной транзакции: первая ошибка откатывает весь пакет
+    transaction = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        if len(value) > BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(f'Не больше {BATCH_MAX_REQUESTS} запросов в пакете')
+        return value
+
+
+def build_subrequest(request, item):
+    """Django-запрос для подзапроса с пользователем и сессией внешнего"""
+    parts = urlsplit(item['path'])
+    sub = HttpRequest()
+    sub.method = item['method']
+    sub.path = sub.path_info = parts.path
+    sub.META = {key: value for key, value in request.META.items() if key not in _BODY_META}
+    sub.META['REQUEST_METHOD'] = item['method']
+    sub.META['PATH_INFO'] = parts.path
+    sub.META['QUERY_STRING'] = parts.query
+    for name, value in item.get('headers', {}).items():
+        sub.META[BATCH_ALLOWED_HEADERS[name.lower()]] = value
+    sub.GET = QueryDict(parts.query)
+
+    body = b''
+    if 'body' in item:
+        body = json.dumps(item['body']).encode('utf-8')
+        # Тело всегда сериализуется в JSON, что бы ни указал клиент
+        sub.META['CONTENT_TYPE'] = 'application/json'
+    sub.META['CONTENT_LENGTH'] = str(len(body))
+    sub._stream = BytesIO(body)
+    sub._read_started = False
+
+    sub.user = request.user
+    sub.session = getattr(request._request, 'session', None)
+    # CSRF проверен для внешнего запроса
+    sub._dont_enforce_csrf_checks = True
+    return sub
+
+
+def run_subrequest(request, item):
+    """(status, headers, body) ответа на подзапрос"""
+    try:
+        match = resolve(urlsplit(item['path']).path)
+    except Resolver404:
+        return status.HTTP_404_NOT_FOUND, {}, {'detail': 'Не найдено'}
+    if getattr(match.func, 'view_class', None) is BatchView:
+        return status.HTTP_400_BAD_REQUEST, {}, {'detail': 'Вложенные пакеты не поддерживаются'}
+    # Асинхронные view (поток уведомлений) вернули бы корутину
+    if iscoroutinefunction(match.func):
+        return status.HTTP_400_BAD_REQUEST, {}, {'detail': 'Асинхронные эндпоинты не поддерживаются'}
+
+    try:
+        with querybudget.subrequest(request._request, match.func, item['method'], item['path']):
+            response = match.func(build_subrequest(request, item), *match.args, **match.kwargs)
+    except Http404:
+        # DRF-view превращают их в ответ сами, обычные Django-view - нет
+        return status.HTTP_404_NOT_FOUND, {}, {'detail': 'Не найдено'}
+    except PermissionDenied:
+        return status.HTTP_403_FORBIDDEN, {}, {'detail': 'Доступ запрещен'}
+    if response.streaming:
+        return status.HTTP_400_BAD_REQUEST, {}, {'detail': 'Потоковые ответы не поддерживаются'}
+    if hasattr(response, 'render'):
+        response.render()
+
+    if hasattr(response, 'data'):
+        body = response.data
+    elif response.get('Content-Type', '').startswith('application/json') and response.content:
+        body = json.loads(response.content)
+    else:
+        body = response.content.decode(response.charset, errors='replace') or None
+    headers = {
+        name: value for name, value in response.items()
+        if name not in ('Content-Type', 'Content-Length', 'Vary', 'Allow')
+    }
+    return response.status_code, headers, body
+
+
+class BatchView(APIView):
+    """
+    Пакетный запрос:
+    - POST /api/v1/batch/
+      {"requests": [{"method": "GET", "path": "/api/v1/posts/posts/1/"}, ...],
+       "transaction": false}
+    Ответ: {"responses": [{"status": 200, "headers": {...}, "body": ...}, ...]}
+    в порядке запросов. С "transaction": true подзапросы выполняются в одной
+    транзакции: после первого ответа >= 400 она откатывается, а оставшиеся
+    подзапросы получают статус 424.
+    """
+    # Права проверяет каждый подзапрос
+    permission_classes = []
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['requests']
+
+        if serializer.validated_data['transaction']:
+            responses = self.run_atomic(request, items)
+        else:
+            responses = [self.run_one(request, item) for item in items]
+        return Response({'responses': responses})
+
+    def run_one(self, request, item):
+        status_code, headers, body = run_subrequest(request, item)
+        return {'status': status_code, 'headers': headers, 'body': body}
+
+    def run_atomic(self, request, items):
+        responses = []
+        with transaction.atomic():
+            for item in items:
+                result = self.run_one(request, item)
+                responses.append(result)
+                if result['status'] >= 400:
+                    transaction.set_rollback(True)
+                    break
+        failed = len(items) - len(responses)
+        responses += [
+            {'status': status.HTTP_424_FAILED_DEPENDENCY, 'headers': {}, 'body': None}
+        ] * failed
+        return responses
@@ -0,0 +1,215 @@
+"""
+Кэш ответов публичных эндпоинтов с инвалидацией по событиям.
+
+Ключ ответа включает версии пространств имен, от которых он зависит
+(post:<id>, user:<id>, trending). Записи постов, лайков, комментариев и
+подписок увеличивают версию (bump), после чего старые ключи просто
+перестают запрашиваться и вытесняются по TTL.
+
+Внутри одной версии запись живет cache_timeout секунд, затем еще
+cache_stale_timeout секунд отдается устаревшей, пока один запрос
+(получивший блокировку) ее пересчитывает - так нет лавины запросов
+в БД при истечении горячего ключа.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from .replicas import primary
+
+API_CACHE_ALIAS = getattr(settings, 'API_CACHE_ALIAS', 'default')
+API_CACHE_TIMEOUT = getattr(settings, 'API_CACHE_TIMEOUT', 60)
+API_CACHE_STALE_TIMEOUT = getattr(settings, 'API_CACHE_STALE_TIMEOUT', 30)
+# Сколько ждать чужого пересчета при полном промахе, прежде чем считать самим
+API_CACHE_LOCK_WAIT = getattr(settings, 'API_CACHE_LOCK_WAIT', 0.5)
+API_CACHE_LOCK_TIMEOUT = 10
+
+VERSION_PREFIX = 'api:v:'
+
+
+def get_cache():
+    return caches[API_CACHE_ALIAS]
+
+
+def _initial_version():
+    # Версия от времени: если ключ версии вытеснят, старые ответы не оживут
+    return int(time.time() * 1000)
+
+
+def get_versions(namespaces):
+    if not namespaces:
+        return {}
+    cache = get_cache()
+    keys = [VERSION_PREFIX + namespace for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    return {key[len(VERSION_PREFIX):]: value for key, value in versions.items()}
+
+
+def bump(*namespaces):
+    """Инвалидировать все ответы, зависящие от пространств имен"""
+    cache = get_cache()
+    for namespace in namespaces:
+        key = VERSION_PREFIX + namespace
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+
+
+def invalidate(*namespaces):
+    """bump() после коммита текущей транзакции, чтобы не закэшировать старые данные"""
+    namespaces = [namespace for namespace in namespaces if namespace]
+    if namespaces:
+        transaction.on_commit(lambda: bump(*namespaces))
+
+
+def invalidate_users(user_ids):
+    invalidate(*(f'user:{user_id}' for user_id in user_ids if user_id is not None))
+
+
+def invalidate_profiles(profile_ids):
+    from users.models import Profile
+
+    invalidate_users(Profile.objects.filter(pk__in=profile_ids).values_list('user_id', flat=True))
+
+
+def invalidate_posts(post_ids):
+    """Посты и страницы их авторов (в них счетчики постов)"""
+    from posts.models import Post
+
+    rows = Post.objects.filter(pk__in=post_ids).values_list('id', 'author_id')
+    namespaces = []
+    for post_id, author_id in rows:
+        namespaces += [f'post:{post_id}', f'user:{author_id}']
+    invalidate(*namespaces)
+
+
+def forget_usernames(*usernames):
+    """Сбросить кэш user_id_for после коммита (переименование, удаление)"""
+    keys = [f'api:uid:{username}' for username in usernames if username]
+    if keys:
+        transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+def user_id_for(username):
+    """id пользователя по username, с кэшированием соответствия"""
+    from users.models import User
+
+    cache = get_cache()
+    key = f'api:uid:{username}'
+    user_id = cache.get(key)
+    if user_id is None:
+        user_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+        if user_id is not None:
+            cache.set(key, user_id, 300)
+    return user_id
+
+
+def build_key(prefix, url, versions):
+    raw = '|'.join([url] + [f'{name}={value}' for name, value in sorted(versions.items())])
+    return f'api:r:{prefix}:{hashlib.md5(raw.encode("utf-8")).hexdigest()}'
+
+
+def get_or_compute(key, compute, timeout, stale_timeout):
+    """
+    Вернуть (data, status, state), где state - HIT, STALE или MISS.
+    compute() возвращает Response; кэшируются только ответы 200.
+    """
+    cache = get_cache()
+    lock_key = f'{key}:lock'
+    entry = cache.get(key)
+    now = time.time()
+
+    if entry is not None and entry['fresh_until'] > now:
+        return entry['data'], entry['status'], 'HIT'
+
+    locked = cache.add(lock_key, 1, API_CACHE_LOCK_TIMEOUT)
+    if not locked:
+        if entry is not None:
+            # Устарело, но пересчитывает другой запрос - отдаем старое
+            return entry['data'], entry['status'], 'STALE'
+        # Полный промах, ответ уже считает другой запрос - ждем его
+        deadline = now + API_CACHE_LOCK_WAIT
+        while time.time() < deadline:
+            time.sleep(0.02)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry['data'], entry['status'], 'HIT'
+
+    try:
+        # Общий кэш заполняем с default: ответ отстающей реплики
+        # остался бы в кэше уже под новой версией
+        with primary():
+            response = compute()
+        if response.status_code == 200:
+            cache.set(key, {
+                'data': response.data,
+                'status': response.status_code,
+                'fresh_until': time.time() + timeout,
+            }, timeout + stale_timeout)
+        return response.data, response.status_code, 'MISS'
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+class CachedResponseMixin:
+    """
+    Кэширование GET-ответов view, одинаковых для всех пользователей.
+    View задает get_cache_namespaces() - от чего зависит ответ.
+    """
+    cache_timeout = API_CACHE_TIMEOUT
+    cache_stale_timeout = API_CACHE_STALE_TIMEOUT
+
+    def get_cache_namespaces(self):
+        return []
+
+    def cached_response(self, request, compute):
+        if request.method not in ('GET', 'HEAD'):
+            return compute()
+
+        # Внутри транзакции (пакет с "transaction": true, api/batch.py) ответ
+        # может видеть незакоммиченные записи, а версии увеличатся только
+        # после коммита - кэш не читаем и не заполняем
+        if transaction.get_connection().in_atomic_block:
+            response = compute()
+            response['X-Cache'] = 'BYPASS'
+            return response
+
+        namespaces = self.get_cache_namespaces()
+        if namespaces is None:
+            return compute()
+        key = build_key(type(self).__name__, request.build_absolute_uri(), get_versions(namespaces))
+        data, status_code, state = get_or_compute(
+            key, compute, self.cache_timeout, self.cache_stale_timeout
+        )
+        response = Response(data, status=status_code)
+        response['X-Cache'] = state
+        return response
+
+    def cached_validators(self, request, compute):
+        """
+        Валидаторы условного GET (api/conditional.py) в том же кэше и под
+        теми же версиями, что и ответ: повторный запрос проверяется без БД
+        """
+        if request.method not in ('GET', 'HEAD') or transaction.get_connection().in_atomic_block:
+            return compute()
+        namespaces = self.get_cache_namespaces()
+        if namespaces is None:
+            return compute()
+        key = build_key(f'{type(self).__name__}:validators', request.build_absolute_uri(), get_versions(namespaces))
+        cache = get_cache()
+        # None (объекта нет) тоже кэшируется, поэтому значение в обертке
+        entry = cache.get(key)
+        if entry is None:
+            entry = {'validators': compute()}
+            cache.set(key, entry, self.cache_timeout)
+        return entry['validators']
@@ -0,0 +1,55 @@
+"""
+Условные GET-запросы (ETag / Last-Modified).
+
+View отдает дешевый валидатор - версию или updated_at, прочитанные
+одним запросом по индексу. Если клиент прислал совпадающий
+If-None-Match или If-Modified-Since, отвечаем 304 без основного
+запроса и сериализации.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """
+    View задает get_validators() -> (version, last_modified) или None,
+    last_modified - datetime или None.
+    """
+    # Ответы зависят от пользователя, если view не публичный
+    conditional_cache_control = 'private, no-cache'
+
+    def get_validators(self):
+        return None
+
+    def build_etag(self, request, version):
+        raw = f'{type(self).__name__}|{request.get_full_path()}|{version}'
+        return quote_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+    def conditional_response(self, request, compute):
+        if request.method not in ('GET', 'HEAD'):
+            return compute()
+
+        # С CachedResponseMixin валидаторы тоже берутся из кэша ответов
+        cached_validators = getattr(self, 'cached_validators', None)
+        if cached_validators is not None:
+            validators = cached_validators(request, self.get_validators)
+        else:
+            validators = self.get_validators()
+        if validators is None:
+            return compute()
+        version, last_modified = validators
+        etag = self.build_etag(request, version)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = compute()
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        response['Cache-Control'] = self.conditional_cache_control
+        return response
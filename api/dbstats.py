@@ -0,0 +1,96 @@
+"""
+Статистика соединений с БД в процессе воркера.
+
+ConnectionStatsMiddleware считает по алиасам БД HTTP-запросы, которые
+обращались к этой БД, и новые соединения (сигнал connection_created):
+при постоянных соединениях или пуле новых соединений должно быть
+намного меньше, чем запросов к алиасу.
+Счетчики живут в памяти процесса, поэтому /api/db-stats/ показывает
+воркер, который ответил (pid в ответе).
+"""
+import os
+import threading
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_lock = threading.Lock()
+_stats = {
+    'started_at': time.time(),
+    'requests': 0,
+    'alias_requests': {},
+    'connections_created': {},
+}
+
+
+def record_connection(sender, connection, **kwargs):
+    with _lock:
+        created = _stats['connections_created']
+        created[connection.alias] = created.get(connection.alias, 0) + 1
+
+
+def _pool_stats(connection):
+    # Django создает пул psycopg только для OPTIONS['pool']
+    pool = getattr(connection, 'pool', None) if connection.vendor == 'postgresql' else None
+    if pool is None:
+        return None
+    return pool.get_stats()
+
+
+def snapshot():
+    with _lock:
+        requests = _stats['requests']
+        alias_requests = dict(_stats['alias_requests'])
+        created = dict(_stats['connections_created'])
+        started_at = _stats['started_at']
+
+    databases = {}
+    for alias in connections:
+        connection = connections[alias]
+        alias_created = created.get(alias, 0)
+        used_by = alias_requests.get(alias, 0)
+        databases[alias] = {
+            'vendor': connection.vendor,
+            'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+            'health_checks': connection.settings_dict['CONN_HEALTH_CHECKS'],
+            'pooled': 'pool' in connection.settings_dict.get('OPTIONS', {}),
+            # Соединение текущего потока
+            'connected': connection.connection is not None,
+            'requests': used_by,
+            'connections_created': alias_created,
+            'reuse_ratio': round(1 - alias_created / used_by, 4) if used_by else None,
+            'pool': _pool_stats(connection),
+        }
+    return {
+        'pid': os.getpid(),
+        'uptime': round(time.time() - started_at, 1),
+        'requests': requests,
+        'databases': databases,
+    }
+
+
+class ConnectionStatsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        connection_created.connect(record_connection, dispatch_uid='api.dbstats.record_connection')
+
+    def __call__(self, request):
+        used = set()
+
+        def record_alias(execute, sql, params, many, context):
+            used.add(context['connection'].alias)
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(record_alias))
+            response = self.get_response(request)
+
+        with _lock:
+            _stats['requests'] += 1
+            alias_requests = _stats['alias_requests']
+            for alias in used:
+                alias_requests[alias] = alias_requests.get(alias, 0) + 1
+        return response
@@ -0,0 +1,194 @@
+"""
+Бюджет запросов к БД на эндпоинт и поиск N+1.
+
+QueryBudgetMiddleware считает запросы и их время за каждый запрос и
+копит статистику по view (видна в /api/db-stats/). Если у view объявлен
+query_budget, GET-запрос сверх бюджета пишется в лог:
+
+    class FeedView(generics.ListAPIView):
+        query_budget = 6
+
+    @action(detail=True, methods=['get'], query_budget=4)
+    def likes(self, request, pk=None): ...
+
+Бюджет - число запросов на GET вместе с сессией и пользователем, и он не
+должен зависеть от размера страницы (проверяется в api/tests.py).
+
+С QUERY_BUDGET_DETECT_N_PLUS_ONE (по умолчанию - DEBUG) запоминается и
+форма каждого запроса: SQL без параметров, списки IN (%s, %s, ...)
+свернуты. Форма SELECT, повторенная QUERY_BUDGET_REPEAT_THRESHOLD раз
+за запрос, - признак N+1: предупреждение в лог и заголовки X-Query-Count,
+X-Query-Time-Ms, X-Query-Repeated в ответе. Подзапросы пакета
+(api/batch.py) проверяются каждый сам по себе.
+
+Предупреждения идут в логгер api.querybudget, вывод настраивается в
+LOGGING (mini_insta/settings.py).
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGET_DETECT_N_PLUS_ONE = getattr(settings, 'QUERY_BUDGET_DETECT_N_PLUS_ONE', settings.DEBUG)
+QUERY_BUDGET_REPEAT_THRESHOLD = getattr(settings, 'QUERY_BUDGET_REPEAT_THRESHOLD', 3)
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+
+_lock = threading.Lock()
+_views = {}
+
+
+def query_shape(sql):
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """execute_wrapper: число и время запросов, с shapes=True - их формы"""
+
+    def __init__(self, shapes=False):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter() if shapes else None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            if self.shapes is not None:
+                self.shapes[query_shape(sql)] += 1
+
+    def repeated(self, threshold=QUERY_BUDGET_REPEAT_THRESHOLD):
+        """Повторяющиеся формы SELECT: [(форма, сколько раз)]"""
+        if self.shapes is None:
+            return []
+        return [
+            (shape, count) for shape, count in self.shapes.most_common()
+            if count >= threshold and shape.lstrip().upper().startswith('SELECT')
+        ]
+
+
+@contextmanager
+def record_queries(shapes=False):
+    """Запросы текущего потока ко всем БД"""
+    recorder = QueryRecorder(shapes)
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
+
+
+def view_name(view_func):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    name = f'{view_class.__module__}.{view_class.__name__}'
+    actions = getattr(view_func, 'actions', None)
+    if actions:
+        # ViewSet: одна функция на маршрут, действие зависит от метода
+        name += ':' + ','.join(sorted(set(actions.values())))
+    return name
+
+
+def get_query_budget(view_func):
+    """Бюджет из @action(query_budget=...) или атрибута query_budget view"""
+    initkwargs = getattr(view_func, 'initkwargs', None) or {}
+    if 'query_budget' in initkwargs:
+        return initkwargs['query_budget']
+    return getattr(getattr(view_func, 'cls', None), 'query_budget', None)
+
+
+def record_view(name, count, duration, over_budget):
+    with _lock:
+        stats = _views.setdefault(name, {
+            'requests': 0, 'queries': 0, 'query_time': 0.0, 'max_queries': 0, 'over_budget': 0,
+        })
+        stats['requests'] += 1
+        stats['queries'] += count
+        stats['query_time'] += duration
+        stats['max_queries'] = max(stats['max_queries'], count)
+        stats['over_budget'] += int(over_budget)
+
+
+def snapshot():
+    with _lock:
+        views = {name: dict(stats) for name, stats in _views.items()}
+    return {
+        name: {
+            'requests': stats['requests'],
+            'avg_queries': round(stats['queries'] / stats['requests'], 2),
+            'max_queries': stats['max_queries'],
+            'avg_query_time_ms': round(stats['query_time'] * 1000 / stats['requests'], 2),
+            'over_budget': stats['over_budget'],
+        }
+        for name, stats in sorted(views.items())
+    }
+
+
+def check_view(view_func, method, path, recorder):
+    """Статистика view, предупреждения о бюджете и N+1; возвращает повторы"""
+    name = view_name(view_func)
+    budget = get_query_budget(view_func)
+    over_budget = method in ('GET', 'HEAD') and budget is not None and recorder.count > budget
+    record_view(name, recorder.count, recorder.duration, over_budget)
+    if over_budget:
+        logger.warning('%s %s: %d queries, budget %d', method, path, recorder.count, budget)
+
+    repeated = recorder.repeated()
+    for shape, count in repeated:
+        logger.warning('Possible N+1 in %s (%s %s): %d x %s', name, method, path, count, shape)
+    return repeated
+
+
+@contextmanager
+def subrequest(request, view_func, method, path):
+    """
+    Подзапрос пакета (api/batch.py) внутри запроса request: свои бюджет,
+    статистика и поиск N+1, а его запросы не считаются повторами внешнего.
+    """
+    outer = getattr(request, '_query_recorder', None)
+    if outer is None:
+        yield
+        return
+    with record_queries(shapes=outer.shapes is not None) as recorder:
+        try:
+            yield
+        finally:
+            if outer.shapes is not None:
+                outer.shapes.subtract(recorder.shapes)
+    check_view(view_func, method, path, recorder)
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record_queries(shapes=QUERY_BUDGET_DETECT_N_PLUS_ONE) as recorder:
+            request._query_recorder = recorder
+            response = self.get_response(request)
+
+        view_func = getattr(request, '_query_budget_view', None)
+        # Потоковые ответы читают БД уже после выхода из middleware
+        if view_func is None or response.streaming:
+            return response
+
+        repeated = check_view(view_func, request.method, request.path, recorder)
+        if recorder.shapes is not None:
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-Query-Time-Ms'] = f'{recorder.duration * 1000:.1f}'
+            if repeated:
+                response['X-Query-Repeated'] = str(sum(count for _, count in repeated))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget_view = view_func
@@ -0,0 +1,113 @@
+"""
+Чтение с реплик БД.
+
+ReplicaMiddleware помечает безопасные запросы (GET, HEAD, OPTIONS), и
+ReplicaRouter отправляет их чтения на одну из реплик DATABASE_REPLICAS.
+Все остальное идет в default: записи, небезопасные запросы, чтения
+внутри транзакции, сессии, management-команды и воркеры.
+
+Read-your-writes: после небезопасного запроса клиент получает
+подписанную cookie, и следующие REPLICA_STICKY_SECONDS секунд его чтения
+идут в default - свой лайк, подписку или комментарий пользователь видит
+сразу, даже если реплика отстает.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signing import BadSignature
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_STICKY_COOKIE = 'primary_pin'
+REPLICA_STICKY_SALT = 'api.replicas.sticky'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Приложения, которые всегда читаются с default: сессия только что
+# вошедшего пользователя может еще не доехать до реплики
+PRIMARY_ONLY_APPS = ('sessions',)
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def get_sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+
+@contextmanager
+def primary():
+    """Читать с default внутри блока (например, при заполнении общего кэша)"""
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+@contextmanager
+def replica():
+    """Разрешить чтение с реплик внутри блока"""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if not replicas or not _use_replica.get():
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        # Внутри транзакции читаем то, что в ней же записали
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии default, объекты с них связываются свободно
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик приходит репликацией
+        return db not in get_replicas()
+
+
+def is_pinned(request):
+    try:
+        request.get_signed_cookie(
+            REPLICA_STICKY_COOKIE, salt=REPLICA_STICKY_SALT, max_age=get_sticky_seconds(),
+        )
+    except (KeyError, BadSignature):
+        return False
+    return True
+
+
+class ReplicaMiddleware:
+    """Чтения безопасных запросов - на реплики, кроме окна после записи клиента"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in SAFE_METHODS
+        token = _use_replica.set(safe and bool(get_replicas()) and not is_pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+
+        if not safe and get_replicas():
+            response.set_signed_cookie(
+                REPLICA_STICKY_COOKIE, '1', salt=REPLICA_STICKY_SALT,
+                max_age=get_sticky_seconds(), httponly=True, samesite='Lax',
+            )
+        return response
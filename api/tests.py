@@ -0,0 +1,401 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.exceptions import PermissionDenied
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.http import Http404
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import URLResolver, get_resolver, reverse
+
+from images.models import UploadSession
+from notifications import outbox
+from notifications.models import Notification
+from posts import trending
+from posts.likes import add_like
+from posts.models import Comment, Post
+from users import graph
+from users.models import FollowSuggestion, User
+
+from . import dbstats
+from .batch import BATCH_MAX_REQUESTS
+from .querybudget import get_query_budget, record_queries
+from .replicas import REPLICA_STICKY_COOKIE, replica
+
+
+class ReplicaHarness:
+    """
+    Реплики на отдельных файлах SQLite для тестов роутера.
+    replicate() копирует текущее состояние default в реплики (SQLite
+    backup API); до следующего вызова реплики отстают, как при лаге
+    репликации.
+    """
+
+    aliases = ('test_replica1', 'test_replica2')
+
+    def __init__(self):
+        self.directory = tempfile.mkdtemp(prefix='mini_insta_replicas_')
+        self.override = override_settings(DATABASE_REPLICAS=list(self.aliases))
+
+    def path(self, alias):
+        return os.path.join(self.directory, f'{alias}.sqlite3')
+
+    def start(self):
+        for alias in self.aliases:
+            connections.settings[alias] = connections.configure_settings({
+                DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+                alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': self.path(alias)},
+            })[alias]
+        self.replicate()
+        self.override.enable()
+
+    def stop(self):
+        self.override.disable()
+        for alias in self.aliases:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def replicate(self):
+        source = connections[DEFAULT_DB_ALIAS]
+        source.ensure_connection()
+        for alias in self.aliases:
+            connections[alias].close()
+            target = sqlite3.connect(self.path(alias))
+            try:
+                source.connection.backup(target)
+            finally:
+                target.close()
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Реплики подключаются внутри теста, тестовый раннер их не создает
+        cls.databases = {*cls.databases, *ReplicaHarness.aliases}
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice@example.com', 'alice', 'pw12345!!')
+        self.bob = User.objects.create_user('bob@example.com', 'bob', 'pw12345!!')
+        self.replicas = ReplicaHarness()
+        self.replicas.start()
+        self.addCleanup(self.replicas.stop)
+
+    def following(self, client):
+        response = client.get('/api/users/alice/following/')
+        self.assertEqual(response.status_code, 200)
+        return [item['username'] for item in response.json()['results']]
+
+    def test_safe_requests_read_from_replica(self):
+        graph.follow(self.alice.profile, self.bob.profile.pk)
+        # Реплика еще не получила подписку
+        self.assertEqual(self.following(self.client), [])
+
+        self.replicas.replicate()
+        self.assertEqual(self.following(self.client), ['bob'])
+
+    def test_writer_reads_own_writes_from_primary(self):
+        self.client.force_login(self.alice)
+        response = self.client.post('/api/users/bob/follow/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(REPLICA_STICKY_COOKIE, response.cookies)
+
+        # Окно после записи: читаем с default
+        self.assertEqual(self.following(self.client), ['bob'])
+
+        with override_settings(REPLICA_STICKY_SECONDS=0):
+            self.assertEqual(self.following(self.client), [])
+
+    def test_writes_and_transactions_use_primary(self):
+        with replica():
+            self.assertIn(router.db_for_read(Post), self.replicas.aliases)
+            self.assertEqual(router.db_for_write(Post), DEFAULT_DB_ALIAS)
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Post), DEFAULT_DB_ALIAS)
+        # Вне запроса (команды, воркеры) - только default
+        self.assertEqual(router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+
+class DatabaseStatsTests(TestCase):
+    def test_requests_counted_per_alias(self):
+        before = dbstats.snapshot()
+        self.client.get('/api/v1/posts/posts/')
+        after = dbstats.snapshot()
+        self.assertEqual(after['requests'], before['requests'] + 1)
+        self.assertEqual(
+            after['databases']['default']['requests'], before['databases']['default']['requests'] + 1,
+        )
+
+
+class ConditionalCacheTests(TransactionTestCase):
+    # Кэш ответов не работает внутри транзакции TestCase
+    def setUp(self):
+        for cache in caches.all(initialized_only=True):
+            cache.clear()
+        self.alice = User.objects.create_user('alice@example.com', 'alice', 'pw12345!!')
+        self.post = Post.objects.create(author=self.alice, caption='orig')
+
+    def assertRevalidatedFromCache(self, path, change):
+        etag = self.client.get(path)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        change()
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_post_validators_cached(self):
+        def edit():
+            self.post.caption = 'edited'
+            self.post.save()
+        self.assertRevalidatedFromCache(f'/api/v1/posts/posts/{self.post.pk}/', edit)
+
+    def test_profile_validators_cached(self):
+        bob = User.objects.create_user('bob@example.com', 'bob', 'pw12345!!')
+        self.assertRevalidatedFromCache(
+            '/api/users/alice/', lambda: bob.profile.following.add(self.alice.profile),
+        )
+
+
+class BatchTests(TransactionTestCase):
+    # Транзакционный пакет проверяется на настоящей транзакции, не внутри
+    # транзакции TestCase
+    def setUp(self):
+        self.alice = User.objects.create_user('alice@example.com', 'alice', 'pw12345!!')
+        self.bob = User.objects.create_user('bob@example.com', 'bob', 'pw12345!!')
+        self.post = Post.objects.create(author=self.alice, caption='orig')
+        self.post_path = f'/api/v1/posts/posts/{self.post.pk}/'
+        for cache in caches.all(initialized_only=True):
+            cache.clear()
+
+    def batch(self, client, requests, atomic=False):
+        return client.post(
+            '/api/v1/batch/', {'requests': requests, 'transaction': atomic}, content_type='application/json',
+        )
+
+    def statuses(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [item['status'] for item in response.json()['responses']]
+
+    def phantom_batch(self):
+        self.client.force_login(self.alice)
+        response = self.batch(self.client, [
+            {'method': 'PATCH', 'path': self.post_path, 'body': {'caption': 'phantom'}},
+            {'method': 'GET', 'path': self.post_path},
+            {'method': 'DELETE', 'path': '/api/v1/posts/posts/999999/'},
+        ], atomic=True)
+        self.client.logout()
+        self.assertEqual(self.statuses(response), [200, 200, 404])
+        return response.json()['responses'][1]['body']
+
+    def test_request_limit(self):
+        response = self.batch(self.client, [{'path': '/api/v1/posts/posts/'}] * (BATCH_MAX_REQUESTS + 1))
+        self.assertEqual(response.status_code, 400)
+
+    def test_failed_request_rolls_back_and_fails_the_rest(self):
+        self.client.force_login(self.alice)
+        response = self.batch(self.client, [
+            {'method': 'PATCH', 'path': self.post_path, 'body': {'caption': 'changed'}},
+            {'method': 'DELETE', 'path': '/api/v1/posts/posts/999999/'},
+            {'method': 'GET', 'path': self.post_path},
+            {'method': 'GET', 'path': '/api/v1/posts/posts/'},
+        ], atomic=True)
+        self.assertEqual(self.statuses(response), [200, 404, 424, 424])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.caption, 'orig')
+
+    def test_without_transaction_requests_are_independent(self):
+        self.client.force_login(self.alice)
+        response = self.batch(self.client, [
+            {'method': 'DELETE', 'path': '/api/v1/posts/posts/999999/'},
+            {'method': 'PATCH', 'path': self.post_path, 'body': {'caption': 'changed'}},
+        ])
+        self.assertEqual(self.statuses(response), [404, 200])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.caption, 'changed')
+
+    def test_permissions_checked_per_request(self):
+        response = self.batch(self.client, [
+            {'method': 'POST', 'path': '/api/v1/posts/posts/', 'body': {'caption': 'anon'}},
+            {'method': 'GET', 'path': self.post_path},
+        ])
+        self.assertEqual(self.statuses(response), [403, 200])
+
+        self.client.force_login(self.bob)
+        response = self.batch(self.client, [
+            {'method': 'PATCH', 'path': self.post_path, 'body': {'caption': 'not mine'}},
+        ])
+        self.assertEqual(self.statuses(response), [403])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.caption, 'orig')
+
+    def test_rejects_nested_and_async_views(self):
+        self.client.force_login(self.alice)
+        response = self.batch(self.client, [
+            {'method': 'POST', 'path': '/api/v1/batch/', 'body': {'requests': []}},
+            {'method': 'GET', 'path': '/api/v1/notifications/stream/'},
+        ])
+        self.assertEqual(self.statuses(response), [400, 400])
+
+    def test_only_allowed_headers(self):
+        self.client.force_login(self.alice)
+        response = self.batch(self.client, [
+            {'method': 'GET', 'path': self.post_path, 'headers': {'Host': 'evil.example', 'Cookie': 'x=1'}},
+        ])
+        self.assertEqual(response.status_code, 400)
+        etag = self.client.get(self.post_path)['ETag']
+        response = self.batch(self.client, [
+            {'method': 'GET', 'path': self.post_path, 'headers': {'If-None-Match': etag, 'accept': 'application/json'}},
+        ])
+        self.assertEqual(self.statuses(response), [304])
+
+    def test_django_view_exceptions_become_statuses(self):
+        self.client.force_login(self.alice)
+        for exception, expected in ((Http404, 404), (PermissionDenied, 403)):
+            def view(request, exception=exception):
+                raise exception
+            match = mock.Mock(func=view, args=(), kwargs={})
+            with mock.patch('api.batch.resolve', return_value=match):
+                response = self.batch(self.client, [{'method': 'GET', 'path': '/api/v1/anything/'}])
+            self.assertEqual(self.statuses(response), [expected])
+
+    def test_subrequests_checked_for_n_plus_one_separately(self):
+        response = self.batch(self.client, [{'path': self.post_path}] * 3)
+        self.assertEqual(self.statuses(response), [200, 200, 200])
+        self.assertIn('X-Query-Count', response)
+        self.assertNotIn('X-Query-Repeated', response)
+
+    def test_atomic_batch_does_not_fill_response_cache(self):
+        self.assertEqual(self.phantom_batch()['caption'], 'phantom')
+        response = self.client.get(self.post_path)
+        self.assertEqual(response.json()['caption'], 'orig')
+
+    def test_atomic_batch_does_not_read_response_cache(self):
+        self.assertEqual(self.client.get(self.post_path).json()['caption'], 'orig')
+        self.assertEqual(self.client.get(self.post_path)['X-Cache'], 'HIT')
+        # Внутри пакета видна собственная незакоммиченная запись
+        self.assertEqual(self.phantom_batch()['caption'], 'phantom')
+        self.assertEqual(self.client.get(self.post_path).json()['caption'], 'orig')
+
+
+def iter_routes(urlconf):
+    """(имя, паттерн) всех именованных маршрутов urlconf, кроме суффиксов формата"""
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns)
+            elif pattern.name and 'format' not in pattern.pattern.regex.groupindex:
+                yield pattern.name, pattern
+    yield from walk(get_resolver(urlconf).url_patterns)
+
+
+class QueryBudgetTestMixin:
+    """
+    Проверка query_budget (api/querybudget.py) для GET-маршрутов urlconf.
+
+    Каждый маршрут запрашивается с page_size из page_sizes на полных
+    страницах: число запросов должно укладываться в бюджет и не расти
+    с размером страницы (иначе - N+1). Маршрут без объявленного бюджета -
+    тоже ошибка, чтобы новые эндпоинты не обходили проверку.
+    """
+    page_sizes = (2, 10)
+
+    def route_url(self, name, pattern, urlconf, prefix, route_kwargs):
+        kwargs = {}
+        for key in pattern.pattern.regex.groupindex:
+            value = route_kwargs.get(name, {}).get(key, route_kwargs.get(key))
+            if value is None:
+                self.fail(f'Нет значения {key} для маршрута {name}')
+            kwargs[key] = value
+        return prefix + reverse(name, urlconf=urlconf, kwargs=kwargs)
+
+    def assertRoutesWithinBudget(self, urlconf, prefix, route_kwargs, route_query=None):
+        route_query = route_query or {}
+        checked = 0
+        for name, pattern in iter_routes(urlconf):
+            view = pattern.callback
+            actions = getattr(view, 'actions', None)
+            if not (('get' in actions) if actions else hasattr(getattr(view, 'cls', None), 'get')):
+                continue
+            # Корень роутера DRF - не наш код и не ходит в БД
+            if view.cls.__module__.startswith('rest_framework.'):
+                continue
+            budget = get_query_budget(view)
+            url = self.route_url(name, pattern, urlconf, prefix, route_kwargs)
+            with self.subTest(route=name, url=url):
+                self.assertIsNotNone(budget, f'{view.cls.__name__}: не объявлен query_budget')
+                counts = {}
+                for page_size in self.page_sizes:
+                    for cache in caches.all(initialized_only=True):
+                        cache.clear()
+                    with record_queries(shapes=True) as recorder:
+                        response = self.client.get(url, {
+                            **route_query.get(name, {}), 'page_size': page_size, 'limit': page_size,
+                        })
+                    self.assertEqual(response.status_code, 200)
+                    counts[page_size] = recorder.count
+                    self.assertLessEqual(recorder.count, budget, (
+                        f'page_size={page_size}: {recorder.count} запросов при бюджете {budget}; '
+                        f'повторы: {recorder.repeated()}'
+                    ))
+                self.assertEqual(len(set(counts.values())), 1, f'Число запросов зависит от размера страницы: {counts}')
+            checked += 1
+        self.assertGreater(checked, 0)
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """Все GET-маршруты api/v1 на данных, где каждая страница заполнена"""
+    size = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice@example.com', 'alice', 'pw12345!!', is_staff=True)
+        users = [User.objects.create_user(f'u{n}@example.com', f'user{n}', 'pw12345!!') for n in range(cls.size)]
+        strangers = [User.objects.create_user(f's{n}@example.com', f'stranger{n}', 'pw12345!!') for n in range(cls.size)]
+        for user in users:
+            graph.follow(cls.alice.profile, user.profile.pk)
+            graph.follow(user.profile, cls.alice.profile.pk)
+            Post.objects.create(author=user, caption=f'sunset by {user.username}')
+
+        own_posts = [Post.objects.create(author=cls.alice, caption=f'sunset {n}') for n in range(cls.size)]
+        cls.post = own_posts[0]
+        for user, post in zip(users, own_posts):
+            # Лайки разных постов не сворачиваются в одно уведомление
+            add_like(post, user)
+            add_like(cls.post, user)
+            Comment.objects.create(post=cls.post, author=user, text='nice')
+        cls.comment = Comment.objects.filter(post=cls.post).order_by('id').first()
+        for user in users:
+            Comment.objects.create(post=cls.post, author=user, text='reply', parent=cls.comment)
+        outbox.drain()
+        trending.refresh(full=True)
+
+        FollowSuggestion.objects.bulk_create([
+            FollowSuggestion(user=cls.alice, suggested=stranger, score=n, mutual_count=1)
+            for n, stranger in enumerate(strangers)
+        ])
+        cls.notification = Notification.objects.filter(recipient=cls.alice).first()
+        cls.upload = UploadSession.objects.create(user=cls.alice, file_name='photo.jpg', size=100)
+
+    def setUp(self):
+        self.client.force_login(self.alice)
+
+    def test_v1_routes_within_query_budget(self):
+        self.assertGreaterEqual(Notification.objects.filter(recipient=self.alice).count(), max(self.page_sizes))
+        self.assertRoutesWithinBudget('api.v1.urls', '/api/v1', route_kwargs={
+            'username': 'alice',
+            'post_id': self.post.pk,
+            'user_id': self.alice.pk,
+            'posts-detail': {'pk': self.post.pk},
+            'posts-likes': {'pk': self.post.pk},
+            'comment-detail': {'pk': self.comment.pk},
+            'comment-replies': {'pk': self.comment.pk},
+            'notification-detail': {'pk': self.notification.pk},
+            'upload-session': {'pk': self.upload.pk},
+        }, route_query={
+            'post-search': {'q': 'sunset'},
+            'user-search': {'q': 'user'},
+        })
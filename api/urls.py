@@ -1,8 +1,9 @@
 from django.urls import path, include
-from .views import HealthCheckView, APIVersionView
+from .views import HealthCheckView, APIVersionView, DatabaseStatsView
 
 urlpatterns = [
     path('health/', HealthCheckView.as_view(), name='api-health'),
+    path('db-stats/', DatabaseStatsView.as_view(), name='api-db-stats'),
     path('version/', APIVersionView.as_view(), name='api-version'),
     path('v1/', include('api.v1.urls')),
 ]
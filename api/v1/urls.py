@@ -1,7 +1,11 @@
 from django.urls import path, include
 
+from api.batch import BatchView
+
 urlpatterns = [
     path('users/', include('users.urls')),
     path('posts/', include('posts.urls')),
     path('notifications/', include('notifications.urls')),
+    path('uploads/', include('images.urls')),
+    path('batch/', BatchView.as_view(), name='api-batch'),
 ]
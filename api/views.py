@@ -1,22 +1,27 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.conf import settings
+from rest_framework.permissions import IsAdminUser
+import django
 
+from . import dbstats, querybudget
+from .cache import CachedResponseMixin
 
-class HealthCheckView(APIView):
+
+class HealthCheckView(CachedResponseMixin, APIView):
     """
     Проверка состояния API:
     - GET /api/health/
     """
     permission_classes = []
+    cache_timeout = 10
 
     def get(self, request):
-        return Response({
+        return self.cached_response(request, lambda: Response({
             'status': 'healthy',
             'version': '1.0.0',
-            'django_version': settings.DJANGO_VERSION,
-        })
+            'django_version': django.get_version(),
+        }))
 
 
 class APIVersionView(APIView):
@@ -33,3 +38,14 @@ class APIVersionView(APIView):
             'version': '1.0.0',
             'supported_versions': ['v1'],
         })
+
+
+class DatabaseStatsView(APIView):
+    """
+    Статистика соединений с БД и запросов по view воркера (только для админов):
+    - GET /api/db-stats/
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({**dbstats.snapshot(), 'views': querybudget.snapshot()})
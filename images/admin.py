@@ -0,0 +1,8 @@
+from django.contrib import admin
+
+from images.models import ImageJob
+
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'model_label', 'object_id', 'field_name', 'attempts', 'created_at')
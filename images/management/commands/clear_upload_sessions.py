@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from images import uploads
+
+
+class Command(BaseCommand):
+    help = 'Удаляет брошенные сессии дозагрузки изображений вместе с частями файлов'
+
+    def handle(self, *args, **options):
+        removed = uploads.expire_sessions()
+        self.stdout.write(self.style.SUCCESS(f'Удалено сессий: {removed}'))
@@ -0,0 +1,57 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from images import pipeline
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Фоновый воркер: строит уменьшенные копии загруженных изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=pipeline.IMAGE_JOBS_BATCH_SIZE,
+            help='Сколько задач обрабатывать за один проход',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать текущую очередь и выйти',
+        )
+        parser.add_argument(
+            '--enqueue-missing', action='store_true',
+            help='Сначала поставить задачи для изображений без вариантов',
+        )
+
+    def handle(self, *args, batch_size, interval, once, enqueue_missing, **options):
+        if enqueue_missing:
+            queued = pipeline.enqueue_missing()
+            self.stdout.write(f'Поставлено задач: {queued}')
+
+        total = 0
+        while True:
+            stats = pipeline.drain(batch_size=batch_size)
+            if stats['processed'] or stats['failed']:
+                total += stats['processed']
+                line = (
+                    f"processed={stats['processed']} "
+                    f"failed={stats['failed']} "
+                    f"duration={stats['duration']:.3f}s"
+                )
+                logger.info('image jobs batch: %s', line)
+                if options['verbosity'] > 1:
+                    self.stdout.write(line)
+                if stats['processed'] + stats['failed'] >= batch_size:
+                    continue
+
+            if once:
+                break
+            time.sleep(interval)
+
+        self.stdout.write(self.style.SUCCESS(f'Обработано изображений: {total}'))
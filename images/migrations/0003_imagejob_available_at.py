@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0002_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagejob',
+            name='available_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='imagejob',
+            index=models.Index(fields=['available_at', 'id'], name='image_job_available_idx'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+import os
+import uuid
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class ImageJob(models.Model):
+    """
+    Очередь обработки загруженных изображений: сигнал ставит задачу
+    после сохранения Post.image / Profile.avatar, а фоновый воркер
+    (manage.py process_image_jobs) строит уменьшенные копии.
+    """
+    # app_label.ModelName и поле с исходным изображением
+    model_label = models.CharField(max_length=100)
+    object_id = models.PositiveBigIntegerField()
+    field_name = models.CharField(max_length=50)
+    # Имя файла в storage на момент постановки задачи
+    source = models.CharField(max_length=255)
+    # Сколько раз задачу брали в работу
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Раньше этого момента задачу не берут: аренда воркера или пауза перед повтором
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Image job'
+        verbose_name_plural = 'Image jobs'
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='image_job_available_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model_label}:{self.object_id}.{self.field_name}'
+
+
+class UploadSession(models.Model):
+    """
+    Дозагружаемая загрузка изображения (images/views.py): файл приходит
+    кусками в {IMAGE_UPLOAD_SESSION_DIR}/<id>.part, offset - сколько
+    байт уже принято. Готовая сессия передается в API постов и профиля
+    полем upload вместо файла.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    file_name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # Заполняются, когда пришел заголовок изображения
+    content_type = models.CharField(max_length=50, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = 'Upload session'
+        verbose_name_plural = 'Upload sessions'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.file_name} {self.offset}/{self.size}'
+
+    @property
+    def path(self):
+        from .uploads import IMAGE_UPLOAD_SESSION_DIR
+
+        return os.path.join(IMAGE_UPLOAD_SESSION_DIR, f'{self.pk}.part')
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size and self.width is not None
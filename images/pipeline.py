@@ -0,0 +1,248 @@
+"""
+Уменьшенные копии загруженных изображений.
+
+После сохранения Post.image / Profile.avatar сигнал ставит ImageJob, а
+воркер (manage.py process_image_jobs) строит варианты thumbnail, feed и
+full в WebP и JPEG. Изображение поворачивается по EXIF Orientation и
+перекодируется без метаданных, поэтому EXIF (в том числе GPS) в
+варианты не попадает. Имена файлов строятся по хешу содержимого
+исходника и не меняются - их можно кэшировать навсегда.
+
+Результат пишется в JSON-поле модели (Post.image_variants,
+Profile.avatar_variants):
+{'source': <имя исходника>, 'variants': {'feed': {'width', 'height', 'webp', 'jpeg'}, ...}}
+"""
+import hashlib
+import io
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from api.cache import invalidate_posts, invalidate_profiles
+
+from .models import ImageJob
+
+# Имя варианта -> максимальная сторона; crop - квадрат по центру
+IMAGE_VARIANTS = getattr(settings, 'IMAGE_VARIANTS', {
+    'thumbnail': {'size': 150, 'crop': True},
+    'feed': {'size': 640},
+    'full': {'size': 1440},
+})
+IMAGE_FORMATS = getattr(settings, 'IMAGE_FORMATS', ('webp', 'jpeg'))
+IMAGE_QUALITY = getattr(settings, 'IMAGE_QUALITY', 82)
+IMAGE_JOBS_BATCH_SIZE = getattr(settings, 'IMAGE_JOBS_BATCH_SIZE', 20)
+IMAGE_JOBS_MAX_ATTEMPTS = getattr(settings, 'IMAGE_JOBS_MAX_ATTEMPTS', 3)
+# Пауза перед первым повтором упавшей задачи, дальше удваивается
+IMAGE_JOBS_RETRY_DELAY = getattr(settings, 'IMAGE_JOBS_RETRY_DELAY', timedelta(seconds=30))
+# Сколько задача считается занятой воркером, который ее взял
+IMAGE_JOBS_LEASE = getattr(settings, 'IMAGE_JOBS_LEASE', timedelta(minutes=5))
+
+VARIANTS_PREFIX = 'variants'
+
+
+def _posts_changed(post_ids):
+    """Варианты видны в лентах: кроме кэша, меняем версии лент"""
+    from posts.timeline import bump_post_readers
+
+    invalidate_posts(post_ids)
+    bump_post_readers(post_ids)
+
+
+# Модель -> (поле с исходником, поле с вариантами, сброс кэша ответов)
+SOURCES = {
+    'posts.Post': ('image', 'image_variants', _posts_changed),
+    'users.Profile': ('avatar', 'avatar_variants', invalidate_profiles),
+}
+
+_EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def enqueue(instance):
+    """
+    Поставить задачу, если исходник изменился с последней обработки.
+    Вызывается из post_save, поэтому читает сохраненные варианты из БД,
+    а не из возможно устаревшего экземпляра.
+    """
+    label = instance._meta.label
+    field_name, variants_field, _ = SOURCES[label]
+    model = type(instance)
+    source = getattr(instance, field_name).name or ''
+
+    stored = model.objects.filter(pk=instance.pk).values_list(variants_field, flat=True).first() or {}
+    if stored.get('source', '') == source:
+        return None
+    jobs = ImageJob.objects.filter(model_label=label, object_id=instance.pk, field_name=field_name)
+    if source and jobs.filter(source=source).exists():
+        return None
+
+    # Старые варианты относятся к другому файлу - не отдаем их
+    model.objects.filter(pk=instance.pk).update(**{variants_field: {}})
+    jobs.delete()
+    if not source:
+        return None
+    return ImageJob.objects.create(
+        model_label=label, object_id=instance.pk, field_name=field_name, source=source,
+    )
+
+
+def enqueue_missing():
+    """Поставить задачи для изображений без актуальных вариантов (загруженных до воркера)"""
+    total = 0
+    for label, (field_name, variants_field, _) in SOURCES.items():
+        model = apps.get_model(label)
+        instances = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        for instance in instances.only('pk', field_name).iterator():
+            if enqueue(instance) is not None:
+                total += 1
+    return total
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'jpeg':
+        if image.mode != 'RGB':
+            # JPEG без альфа-канала: подкладываем белый фон
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+        image.save(buffer, 'JPEG', quality=IMAGE_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'WEBP', quality=IMAGE_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def _resize(image, options):
+    size = options['size']
+    if options.get('crop'):
+        return ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    resized = image.copy()
+    # thumbnail() сохраняет пропорции и не увеличивает маленькие изображения
+    resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+    return resized
+
+
+def render(data):
+    """Построить варианты из байтов исходника и сохранить их в storage"""
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    image = Image.open(io.BytesIO(data))
+    largest = max(options['size'] for options in IMAGE_VARIANTS.values())
+    # Для JPEG декодируем сразу в уменьшенном масштабе
+    image.draft('RGB', (largest, largest))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    variants = {}
+    for name, options in IMAGE_VARIANTS.items():
+        resized = _resize(image, options)
+        variant = {'width': resized.width, 'height': resized.height}
+        for fmt in IMAGE_FORMATS:
+            path = f'{VARIANTS_PREFIX}/{digest[:2]}/{digest}/{name}.{_EXTENSIONS[fmt]}'
+            if not default_storage.exists(path):
+                default_storage.save(path, ContentFile(_encode(resized, fmt)))
+            variant[fmt] = path
+        variants[name] = variant
+    return variants
+
+
+def claim():
+    """
+    Взять следующую готовую задачу одним UPDATE (сравнение с прочитанными
+    attempts и available_at): attempts + 1 и аренда на IMAGE_JOBS_LEASE.
+    Задачу упавшего воркера возьмут снова после аренды. None - очередь пуста.
+    """
+    while True:
+        now = timezone.now()
+        job = ImageJob.objects.filter(
+            attempts__lt=IMAGE_JOBS_MAX_ATTEMPTS, available_at__lte=now,
+        ).order_by('available_at', 'id').first()
+        if job is None:
+            return None
+        lease_until = now + IMAGE_JOBS_LEASE
+        claimed = ImageJob.objects.filter(
+            pk=job.pk, attempts=job.attempts, available_at=job.available_at,
+        ).update(attempts=F('attempts') + 1, available_at=lease_until)
+        if claimed:
+            job.attempts += 1
+            job.available_at = lease_until
+            return job
+
+
+def process(job):
+    """Построить варианты задачи вне транзакции. None, если исходник уже заменили"""
+    model = apps.get_model(job.model_label)
+    field_name = SOURCES[job.model_label][0]
+    current = model.objects.filter(pk=job.object_id).values_list(field_name, flat=True).first()
+    if current != job.source:
+        return None
+
+    with default_storage.open(job.source, 'rb') as source_file:
+        return render(source_file.read())
+
+
+def complete(job, variants):
+    """Записать варианты и удалить задачу одной короткой транзакцией"""
+    model = apps.get_model(job.model_label)
+    field_name, variants_field, invalidate = SOURCES[job.model_label]
+    with transaction.atomic():
+        if variants is not None:
+            # Условие по исходнику защищает от замены файла во время обработки
+            updated = model.objects.filter(pk=job.object_id, **{field_name: job.source}).update(**{
+                variants_field: {'source': job.source, 'variants': variants},
+                'updated_at': Now(),
+            })
+            if updated:
+                invalidate([job.object_id])
+        ImageJob.objects.filter(pk=job.pk).delete()
+
+
+def retry_delay(attempts):
+    """Пауза перед следующей попыткой: IMAGE_JOBS_RETRY_DELAY, 2x, 4x, ..."""
+    return IMAGE_JOBS_RETRY_DELAY * 2 ** max(attempts - 1, 0)
+
+
+def fail(job, exc):
+    """Записать ошибку и отложить задачу до следующей попытки"""
+    ImageJob.objects.filter(pk=job.pk).update(
+        last_error=f'{type(exc).__name__}: {exc}',
+        available_at=timezone.now() + retry_delay(job.attempts),
+    )
+
+
+def drain(batch_size=IMAGE_JOBS_BATCH_SIZE):
+    """
+    Обработать до batch_size задач. Задача берется и сохраняется короткими
+    транзакциями, а декодирование и кодирование идут вне них и не держат
+    блокировку записи. Упавшая задача откладывается (retry_delay) и в
+    этом проходе не повторяется.
+    Возвращает метрики: processed, failed, duration.
+    """
+    started = time.monotonic()
+    processed = failed = 0
+    for _ in range(batch_size):
+        job = claim()
+        if job is None:
+            break
+        try:
+            complete(job, process(job))
+        except Exception as exc:
+            fail(job, exc)
+            failed += 1
+            continue
+        processed += 1
+
+    return {
+        'processed': processed,
+        'failed': failed,
+        'duration': time.monotonic() - started,
+    }
@@ -0,0 +1,83 @@
+import os
+import uuid
+
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+from .models import UploadSession
+from .uploads import SessionUploadedFile, discard_session
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    URL уменьшенных копий из JSON-поля вариантов (images/pipeline.py):
+    {'thumbnail': {'width': 150, 'height': 150, 'webp': url, 'jpeg': url}, ...}
+    Пустой объект, пока воркер не обработал изображение.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        result = {}
+        for name, variant in (value or {}).get('variants', {}).items():
+            item = {}
+            for key, item_value in variant.items():
+                if key in ('width', 'height'):
+                    item[key] = item_value
+                else:
+                    url = default_storage.url(item_value)
+                    item[key] = request.build_absolute_uri(url) if request is not None else url
+            result[name] = item
+        return result
+
+
+class UploadSessionField(serializers.Field):
+    """
+    id завершенной сессии дозагрузки (images/views.py) вместо файла.
+    Возвращает файл сессии, который можно присвоить ImageField.
+    """
+    default_error_messages = {
+        'invalid': 'Загрузка не найдена или не завершена.',
+    }
+
+    def __init__(self, **kwargs):
+        kwargs['write_only'] = True
+        kwargs.setdefault('required', False)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        request = self.context['request']
+        try:
+            session = UploadSession.objects.get(pk=uuid.UUID(str(data)), user_id=request.user.pk)
+        except (ValueError, UploadSession.DoesNotExist):
+            self.fail('invalid')
+        if not session.is_complete or not os.path.exists(session.path):
+            self.fail('invalid')
+        return SessionUploadedFile(session)
+
+
+class UploadSessionSerializerMixin:
+    """
+    Поле upload (UploadSessionField) вместо файла upload_target. После
+    успешного сохранения сессия удаляется: ее файл уже перенесен в
+    хранилище.
+    """
+    upload_target = None
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        upload = attrs.pop('upload', None)
+        if upload is not None:
+            attrs[self.upload_target] = upload
+        return attrs
+
+    def save(self, **kwargs):
+        upload = self.validated_data.get(self.upload_target)
+        instance = super().save(**kwargs)
+        if isinstance(upload, SessionUploadedFile):
+            upload.close()
+            discard_session(upload.session)
+        return instance
@@ -0,0 +1,157 @@
+"""
+Отдача файлов из MEDIA_ROOT.
+
+Режим задается MEDIA_SERVE_MODE:
+- 'django' - FileResponse с поддержкой Range (206), ETag/Last-Modified и
+  304 на условные запросы;
+- 'accel' - X-Accel-Redirect для nginx, файл отдает прокси:
+      location /protected-media/ { internal; alias /path/to/media/; }
+- 'sendfile' - X-Sendfile для Apache (mod_xsendfile) / lighttpd.
+
+Варианты изображений (images/pipeline.py) лежат под именами по хешу
+содержимого и не меняются, поэтому отдаются с immutable Cache-Control.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+MEDIA_SERVE_MODE = getattr(settings, 'MEDIA_SERVE_MODE', 'django')
+MEDIA_ACCEL_PREFIX = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+MEDIA_CACHE_MAX_AGE = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)
+# Префиксы файлов с именами по хешу содержимого
+MEDIA_IMMUTABLE_PREFIXES = getattr(settings, 'MEDIA_IMMUTABLE_PREFIXES', ('variants/',))
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def cache_control(path):
+    if path.startswith(tuple(MEDIA_IMMUTABLE_PREFIXES)):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={MEDIA_CACHE_MAX_AGE}'
+
+
+def parse_range(header, size):
+    """
+    (start, end) включительно для одного диапазона, None - отдать файл
+    целиком (нет заголовка или несколько диапазонов), ValueError - диапазон
+    вне файла.
+    """
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-500: последние 500 байт
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+class RangeFile:
+    """Чтение куска файла [start, end] для FileResponse"""
+
+    def __init__(self, file, start, end):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = end - start + 1
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _if_range_matches(request, etag, mtime):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return etag in parse_etags(if_range)
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Файл из MEDIA_ROOT:
+    - GET/HEAD /media/<path>
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    etag = quote_etag(f'{stat.st_size:x}-{stat.st_mtime_ns:x}')
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    if not_modified is not None:
+        response = not_modified
+    elif MEDIA_SERVE_MODE == 'accel':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + quote(path)
+    elif MEDIA_SERVE_MODE == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    else:
+        response = _file_response(request, full_path, stat.st_size, content_type, etag, stat.st_mtime)
+        if response.status_code == 416:
+            return response
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control(path)
+    return response
+
+
+def _file_response(request, full_path, size, content_type, etag, mtime):
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is not None and not _if_range_matches(request, etag, mtime):
+        byte_range = None
+
+    if byte_range is None:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(RangeFile(open(full_path, 'rb'), start, end), content_type=content_type, status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,20 @@
+from django.apps import apps
+from django.db.models.signals import post_save
+
+from . import pipeline
+
+
+def enqueue_image_job(sender, instance, update_fields=None, **kwargs):
+    """Ставим в очередь обработку нового или замененного изображения"""
+    field_name = pipeline.SOURCES[sender._meta.label][0]
+    if update_fields is not None and field_name not in update_fields:
+        return
+    pipeline.enqueue(instance)
+
+
+for label in pipeline.SOURCES:
+    post_save.connect(
+        enqueue_image_job,
+        sender=apps.get_model(label),
+        dispatch_uid=f'images.enqueue_image_job.{label}',
+    )
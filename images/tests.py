@@ -0,0 +1,151 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from posts.models import Post
+from users.models import User
+
+from . import pipeline, uploads
+from .models import ImageJob, UploadSession
+
+
+def image_bytes(size=(20, 20), fmt='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, fmt)
+    return buffer.getvalue()
+
+
+class UploadTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='mini_insta_uploads_')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        patcher = mock.patch.object(uploads, 'IMAGE_UPLOAD_SESSION_DIR', os.path.join(self.directory, 'parts'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        media = override_settings(MEDIA_ROOT=os.path.join(self.directory, 'media'))
+        media.enable()
+        self.addCleanup(media.disable)
+        self.alice = User.objects.create_user('alice@example.com', 'alice', 'pw12345!!')
+        self.client.force_login(self.alice)
+
+    def create_session(self, size):
+        return self.client.post('/api/v1/uploads/', {'file_name': 'photo.png', 'size': size})
+
+    def put(self, session_id, data, offset=0):
+        return self.client.put(
+            f'/api/v1/uploads/{session_id}/', data, content_type='application/octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def upload(self, data):
+        session_id = self.create_session(len(data)).json()['id']
+        return session_id, self.put(session_id, data)
+
+    def test_session_consumed_by_post(self):
+        session_id, response = self.upload(image_bytes())
+        self.assertTrue(response.json()['complete'])
+        path = UploadSession.objects.get(pk=session_id).path
+
+        response = self.client.post('/api/v1/posts/posts/', {'caption': 'photo', 'upload': session_id})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Post.objects.get(pk=response.json()['id']).image)
+        self.assertFalse(UploadSession.objects.filter(pk=session_id).exists())
+        self.assertFalse(os.path.exists(path))
+        # Повторно ту же сессию не передать
+        response = self.client.post('/api/v1/posts/posts/', {'caption': 'again', 'upload': session_id})
+        self.assertEqual(response.status_code, 400)
+
+    def test_stale_offset_conflict(self):
+        data = image_bytes()
+        session_id = self.create_session(len(data)).json()['id']
+        self.assertEqual(self.put(session_id, data[:10]).status_code, 200)
+        response = self.put(session_id, data[10:], offset=0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 10)
+
+    def test_parallel_chunk_with_same_offset_discarded(self):
+        data = image_bytes()
+        session_id = self.create_session(len(data)).json()['id']
+        # Оба запроса прочитали offset 0, первый успел сдвинуть его
+        stale = UploadSession.objects.get(pk=session_id)
+        self.assertEqual(self.put(session_id, data[:10]).status_code, 200)
+        self.assertFalse(uploads.append_chunk(stale, io.BytesIO(b'x' * 10), 10, 0))
+        with open(stale.path, 'rb') as part:
+            self.assertEqual(part.read(), data[:10])
+        self.assertEqual(UploadSession.objects.get(pk=session_id).offset, 10)
+
+    def test_session_rejects_bad_magic_bytes(self):
+        session_id, response = self.upload(b'GIF88a' + b'\0' * 100)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadSession.objects.filter(pk=session_id).exists())
+
+    def test_session_rejects_large_dimensions(self):
+        with mock.patch.object(uploads, 'IMAGE_UPLOAD_MAX_SIDE', 10):
+            session_id, response = self.upload(image_bytes(size=(20, 5)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('20x5', response.json()['detail'])
+        self.assertFalse(UploadSession.objects.filter(pk=session_id).exists())
+
+    def test_session_rejects_oversize(self):
+        with mock.patch.object(uploads, 'IMAGE_UPLOAD_MAX_SIZE', 100):
+            self.assertEqual(self.create_session(101).status_code, 413)
+        session_id = self.create_session(10).json()['id']
+        # Больше объявленного размера - отказ до записи, сессия остается
+        self.assertEqual(self.put(session_id, b'\0' * 11).status_code, 413)
+        self.assertEqual(UploadSession.objects.get(pk=session_id).offset, 0)
+
+    def test_multipart_rejects_bad_magic_bytes(self):
+        response = self.client.post('/api/v1/posts/posts/', {
+            'caption': 'fake', 'image': io.BytesIO(b'not an image at all'),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Post.objects.exists())
+
+    def test_multipart_rejects_large_dimensions(self):
+        image = io.BytesIO(image_bytes(size=(20, 20)))
+        image.name = 'photo.png'
+        with mock.patch.object(uploads, 'IMAGE_UPLOAD_MAX_PIXELS', 100):
+            response = self.client.post('/api/v1/posts/posts/', {'caption': 'big', 'image': image})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Post.objects.exists())
+
+
+class PipelineTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='mini_insta_media_')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=directory)
+        media.enable()
+        self.addCleanup(media.disable)
+        alice = User.objects.create_user('alice@example.com', 'alice', 'pw12345!!')
+        self.post = Post.objects.create(
+            author=alice, caption='photo', image=ContentFile(image_bytes(), name='photo.png'),
+        )
+
+    def test_failed_job_backs_off(self):
+        with mock.patch.object(pipeline, 'render', side_effect=OSError('broken')):
+            self.assertEqual(pipeline.drain(), {'processed': 0, 'failed': 1, 'duration': mock.ANY})
+        job = ImageJob.objects.get()
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.last_error, 'OSError: broken')
+        self.assertGreater(job.available_at, timezone.now())
+        # До конца паузы задачу не берут
+        self.assertIsNone(pipeline.claim())
+
+        ImageJob.objects.update(available_at=timezone.now())
+        self.assertEqual(pipeline.drain()['processed'], 1)
+        self.assertFalse(ImageJob.objects.exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.image_variants['source'], self.post.image.name)
+
+    def test_claimed_job_leased(self):
+        job = pipeline.claim()
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNone(pipeline.claim())
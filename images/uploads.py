@@ -0,0 +1,329 @@
+"""
+Потоковая загрузка изображений с ранней проверкой.
+
+ImageUploadHandler заменяет стандартные обработчики Django на view с
+загрузкой изображений (StreamingImageUploadMixin):
+- тело больше лимита отклоняется по Content-Length до чтения;
+- формат определяется по сигнатуре (magic bytes), а размеры - по
+  заголовку, как только он пришел, а не после чтения всего файла;
+- данные пишутся кусками во временный файл (FILE_UPLOAD_TEMP_DIR), в
+  памяти держится не больше одного куска и заголовка; при сохранении
+  в FileSystemStorage файл переносится без копирования.
+
+Для больших файлов есть сессии дозагрузки (UploadSession, images/views.py):
+клиент отправляет файл кусками и после обрыва продолжает с offset.
+"""
+import fcntl
+import io
+import os
+import shutil
+import tempfile
+import warnings
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+IMAGE_UPLOAD_MAX_SIZE = getattr(settings, 'IMAGE_UPLOAD_MAX_SIZE', 15 * 1024 * 1024)
+IMAGE_UPLOAD_MAX_SIDE = getattr(settings, 'IMAGE_UPLOAD_MAX_SIDE', 10000)
+IMAGE_UPLOAD_MAX_PIXELS = getattr(settings, 'IMAGE_UPLOAD_MAX_PIXELS', 40_000_000)
+# Сколько байт начала файла читать в поисках размеров
+IMAGE_HEADER_MAX_SIZE = getattr(settings, 'IMAGE_HEADER_MAX_SIZE', 256 * 1024)
+# Запас на заголовки multipart и текстовые поля формы
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Сессии дозагрузки: каталог для частей, максимум на один запрос, время жизни
+IMAGE_UPLOAD_SESSION_DIR = getattr(settings, 'IMAGE_UPLOAD_SESSION_DIR', None) or os.path.join(
+    getattr(settings, 'FILE_UPLOAD_TEMP_DIR', None) or tempfile.gettempdir(), 'mini_insta_uploads'
+)
+IMAGE_UPLOAD_CHUNK_MAX_SIZE = getattr(settings, 'IMAGE_UPLOAD_CHUNK_MAX_SIZE', 4 * 1024 * 1024)
+IMAGE_UPLOAD_SESSION_TTL = getattr(settings, 'IMAGE_UPLOAD_SESSION_TTL', timedelta(hours=24))
+# Кусками такого размера тело запроса читается и пишется на диск
+STREAM_CHUNK_SIZE = 64 * 1024
+
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG', 'image/png'),
+    (b'GIF87a', 'GIF', 'image/gif'),
+    (b'GIF89a', 'GIF', 'image/gif'),
+)
+
+
+class UploadRejected(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = 'Файл не является допустимым изображением.'
+    default_code = 'invalid_image'
+
+
+class UploadTooLarge(UploadRejected):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Файл слишком большой.'
+    default_code = 'too_large'
+
+
+def sniff_format(header):
+    """(формат PIL, content type) по сигнатуре или None"""
+    for signature, fmt, content_type in SIGNATURES:
+        if header.startswith(signature):
+            return fmt, content_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP', 'image/webp'
+    return None
+
+
+def read_dimensions(header, fmt):
+    """
+    Размеры из начала файла или None, если заголовок пришел не целиком.
+    PIL читает только заголовок, пиксели не декодируются.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            with Image.open(io.BytesIO(header), formats=[fmt]) as image:
+                return image.size
+    except Image.DecompressionBombError:
+        raise UploadRejected('Слишком большое разрешение изображения.')
+    except Exception:
+        return None
+
+
+def check_dimensions(width, height):
+    if max(width, height) > IMAGE_UPLOAD_MAX_SIDE or width * height > IMAGE_UPLOAD_MAX_PIXELS:
+        raise UploadRejected(
+            f'Разрешение {width}x{height} превышает допустимое '
+            f'({IMAGE_UPLOAD_MAX_SIDE}px по стороне, {IMAGE_UPLOAD_MAX_PIXELS} пикселей).'
+        )
+
+
+class ImageHeaderValidator:
+    """
+    Проверка начала файла по мере поступления данных.
+    feed() возвращает True, когда формат и размеры проверены.
+    """
+
+    def __init__(self):
+        self.buffer = b''
+        self.format = None
+        self.content_type = None
+        self.size = None
+
+    @property
+    def done(self):
+        return self.size is not None
+
+    def feed(self, data):
+        if self.done:
+            return True
+        self.buffer += data[:IMAGE_HEADER_MAX_SIZE - len(self.buffer)]
+
+        if self.format is None:
+            if len(self.buffer) < 12:
+                return False
+            sniffed = sniff_format(self.buffer)
+            if sniffed is None:
+                raise UploadRejected('Поддерживаются только JPEG, PNG, GIF и WebP.')
+            self.format, self.content_type = sniffed
+
+        size = read_dimensions(self.buffer, self.format)
+        if size is None:
+            if len(self.buffer) >= IMAGE_HEADER_MAX_SIZE:
+                raise UploadRejected('Не удалось прочитать заголовок изображения.')
+            return False
+        check_dimensions(*size)
+        self.size = size
+        self.buffer = b''
+        return True
+
+    def finish(self):
+        """Конец файла: короткий файл мог так и не дать размеры"""
+        if self.done:
+            return
+        if self.format is None:
+            raise UploadRejected()
+        size = read_dimensions(self.buffer, self.format)
+        if size is None:
+            raise UploadRejected('Не удалось прочитать заголовок изображения.')
+        check_dimensions(*size)
+        self.size = size
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Пишет файлы во временный файл кусками, проверяя их на лету"""
+
+    def __init__(self, request=None, max_size=IMAGE_UPLOAD_MAX_SIZE):
+        super().__init__(request)
+        self.max_size = max_size
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Отказ до чтения тела: Content-Length может быть занижен,
+        # поэтому размер файла проверяется еще и в receive_data_chunk
+        if content_length and content_length > self.max_size + MULTIPART_OVERHEAD:
+            raise UploadTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.validator = ImageHeaderValidator()
+        self.file = TemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+        )
+
+    def receive_data_chunk(self, raw_data, start):
+        try:
+            if start + len(raw_data) > self.max_size:
+                raise UploadTooLarge()
+            self.validator.feed(raw_data)
+        except UploadRejected:
+            self.upload_interrupted()
+            raise
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        try:
+            self.validator.finish()
+        except UploadRejected:
+            self.upload_interrupted()
+            raise
+        self.file.seek(0)
+        self.file.size = file_size
+        # Тип по содержимому, а не по заголовку клиента
+        self.file.content_type = self.validator.content_type
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            temp_location = self.file.temporary_file_path()
+            try:
+                self.file.close()
+                os.remove(temp_location)
+            except FileNotFoundError:
+                pass
+
+
+class StreamingImageUploadMixin:
+    """Подключает ImageUploadHandler до разбора тела запроса"""
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+
+class SessionUploadedFile(UploadedFile):
+    """Файл готовой сессии; FileSystemStorage переносит его без копирования"""
+
+    def __init__(self, session):
+        super().__init__(
+            open(session.path, 'rb'), session.file_name, session.content_type, session.size,
+        )
+        self._path = session.path
+        self.session = session
+
+    def temporary_file_path(self):
+        return self._path
+
+
+def create_session(user, file_name, size):
+    from .models import UploadSession
+
+    if size > IMAGE_UPLOAD_MAX_SIZE:
+        raise UploadTooLarge()
+    session = UploadSession.objects.create(user=user, file_name=os.path.basename(file_name), size=size)
+    os.makedirs(IMAGE_UPLOAD_SESSION_DIR, exist_ok=True)
+    open(session.path, 'wb').close()
+    return session
+
+
+def discard_session(session):
+    try:
+        os.remove(session.path)
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+
+def append_chunk(session, stream, length, offset):
+    """
+    Дописать кусок из stream (length байт) с позиции offset.
+
+    Тело читается во временный файл без транзакции и блокировок: медленный
+    клиент ничего не держит. Затем под flock файла части offset сдвигается
+    сравнением с ожидаемым (UPDATE ... WHERE offset = <offset>), и только
+    победивший запрос копирует кусок в часть. False - offset уже сдвинул
+    параллельный запрос, кусок отброшен.
+
+    Заголовок изображения проверяется, как только он накопился; при
+    ошибке сессия удаляется.
+    """
+    from django.db.models.functions import Now
+
+    from .models import UploadSession
+
+    if length > IMAGE_UPLOAD_CHUNK_MAX_SIZE or offset + length > session.size:
+        raise UploadTooLarge()
+
+    with tempfile.TemporaryFile(dir=IMAGE_UPLOAD_SESSION_DIR) as staged:
+        received = 0
+        while received < length:
+            data = stream.read(min(STREAM_CHUNK_SIZE, length - received))
+            if not data:
+                break
+            staged.write(data)
+            received += len(data)
+        staged.seek(0)
+
+        with open(session.path, 'r+b') as part:
+            # Держится только на время копирования, закрытие файла снимает flock
+            fcntl.flock(part, fcntl.LOCK_EX)
+            if os.fstat(part.fileno()).st_size < offset:
+                # Часть короче принятого offset (процесс упал после UPDATE)
+                discard_session(session)
+                raise UploadRejected('Загрузка повреждена, начните заново.')
+            updated = UploadSession.objects.filter(pk=session.pk, offset=offset).update(
+                offset=offset + received, updated_at=Now(),
+            )
+            if not updated:
+                return False
+            # Обрезаем недописанный хвост прошлого оборванного запроса
+            part.truncate(offset)
+            part.seek(offset)
+            shutil.copyfileobj(staged, part)
+
+    session.offset = offset + received
+    if session.width is None:
+        try:
+            _validate_session_header(session)
+        except UploadRejected:
+            discard_session(session)
+            raise
+        if session.width is not None:
+            session.save(update_fields=['content_type', 'width', 'height'])
+    return True
+
+
+def _validate_session_header(session):
+    with open(session.path, 'rb') as part:
+        header = part.read(IMAGE_HEADER_MAX_SIZE)
+    validator = ImageHeaderValidator()
+    validator.feed(header)
+    if not validator.done and session.offset == session.size:
+        validator.finish()
+    if validator.done:
+        session.content_type = validator.content_type
+        session.width, session.height = validator.size
+
+
+def expire_sessions(ttl=IMAGE_UPLOAD_SESSION_TTL):
+    """Удалить брошенные сессии вместе с частями файлов"""
+    from django.utils import timezone
+
+    from .models import UploadSession
+
+    expired = UploadSession.objects.filter(updated_at__lt=timezone.now() - ttl)
+    total = 0
+    for session in expired.iterator():
+        discard_session(session)
+        total += 1
+    return total
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import UploadSessionCreateView, UploadSessionView
+
+urlpatterns = [
+    path('', UploadSessionCreateView.as_view(), name='upload-session-create'),
+    path('<uuid:pk>/', UploadSessionView.as_view(), name='upload-session'),
+]
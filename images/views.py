@@ -0,0 +1,79 @@
+from rest_framework import permissions, serializers, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.shortcuts import get_object_or_404
+
+from . import uploads
+from .models import UploadSession
+
+
+class UploadSessionCreateSerializer(serializers.Serializer):
+    file_name = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+
+
+def session_data(session):
+    return {
+        'id': str(session.pk),
+        'offset': session.offset,
+        'size': session.size,
+        'complete': session.is_complete,
+        'chunk_size': uploads.IMAGE_UPLOAD_CHUNK_MAX_SIZE,
+    }
+
+
+class UploadSessionCreateView(APIView):
+    """
+    Начать дозагружаемую загрузку изображения:
+    - POST /api/uploads/ {"file_name": "photo.jpg", "size": 12345678}
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = UploadSessionCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session = uploads.create_session(request.user, **serializer.validated_data)
+        return Response(session_data(session), status=status.HTTP_201_CREATED)
+
+
+class UploadSessionView(APIView):
+    """
+    Сессия загрузки:
+    - GET /api/uploads/<id>/ - сколько байт уже принято (для продолжения)
+    - PUT /api/uploads/<id>/ - следующий кусок, тело запроса - байты файла,
+      заголовок Upload-Offset - позиция куска (должна совпадать с offset)
+    - DELETE /api/uploads/<id>/ - отменить загрузку
+    Готовая сессия передается в POST /api/posts/posts/ или PUT /api/users/profile/
+    полем upload вместо файла.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
+
+    def get_session(self):
+        return get_object_or_404(UploadSession, pk=self.kwargs['pk'], user=self.request.user)
+
+    def get(self, request, pk):
+        return Response(session_data(self.get_session()))
+
+    def put(self, request, pk):
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return Response({'detail': 'Нужен заголовок Upload-Offset.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        session = self.get_session()
+        if offset != session.offset:
+            # Клиент не знает, сколько дошло после обрыва - сообщаем
+            return Response(session_data(session), status=status.HTTP_409_CONFLICT)
+
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if length and request.stream is not None:
+            if not uploads.append_chunk(session, request.stream, length, offset):
+                # Параллельный запрос с тем же offset успел раньше
+                session.refresh_from_db()
+                return Response(session_data(session), status=status.HTTP_409_CONFLICT)
+        return Response(session_data(session))
+
+    def delete(self, request, pk):
+        uploads.discard_session(self.get_session())
+        return Response(status=status.HTTP_204_NO_CONTENT)
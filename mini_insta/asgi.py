@@ -3,6 +3,9 @@ ASGI config for mini_insta project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Под ASGI работает поток уведомлений (notifications/stream.py), например:
+    uvicorn mini_insta.asgi:application --workers 4
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -0,0 +1,193 @@
+"""
+SQLite для конкурентной записи (DATABASE_SQLITE_TUNING=1, см.
+mini_insta/database.py).
+
+PRAGMA (WAL, synchronous=NORMAL, busy_timeout, mmap_size, cache_size)
+задаются через OPTIONS['init_command'], транзакции открываются как
+BEGIN IMMEDIATE - блокировка записи берется сразу, и две транзакции не
+упираются друг в друга при переходе от чтения к записи.
+
+Поверх этого:
+- запись сериализуется внутри процесса: транзакция ждет своей очереди
+  на threading.Lock файла БД, а не крутится в busy-обработчике SQLite.
+  Запись вне транзакции (QuerySet.update(), счетчики через F()) берет
+  ту же очередь на время одного запроса. Между процессами очереди нет:
+  там запись ждет только повторами ниже;
+- BEGIN и запросы вне транзакции при "database is locked" повторяются
+  с экспоненциальной задержкой (повтор безопасен - ничего не записано).
+  Запросы внутри транзакции не повторяются: блокировка уже взята.
+  С повторами busy_timeout соединения сбрасывается в 0: ждут только
+  повторы, и общее ожидание (очередь на запись, BEGIN, запрос) не
+  больше OPTIONS['timeout'], а не timeout на каждую попытку.
+
+Дополнительные ключи OPTIONS (в sqlite3.connect не передаются):
+write_retries, retry_delay, serialize_writes.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+DEFAULT_WRITE_RETRIES = 5
+DEFAULT_RETRY_DELAY = 0.02
+# Секунды, как OPTIONS['timeout'] sqlite3.connect
+DEFAULT_TIMEOUT = 5
+
+# Запросы, которые вне транзакции встают в очередь на запись
+WRITE_STATEMENTS = frozenset(('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER'))
+
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+
+def get_write_lock(name):
+    with _write_locks_guard:
+        return _write_locks.setdefault(str(name), threading.Lock())
+
+
+def is_write(query):
+    words = query.split(None, 1)
+    return bool(words) and words[0].upper() in WRITE_STATEMENTS
+
+
+def is_locked_error(exc):
+    message = str(exc).lower()
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+def with_retries(func, retries, delay, deadline):
+    """Повторять func при блокировке БД не больше retries раз и до deadline (time.monotonic())"""
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except base.Database.OperationalError as exc:
+            remaining = deadline - time.monotonic()
+            if attempt == retries or remaining <= 0 or not is_locked_error(exc):
+                raise
+        # Экспоненциальная задержка со случайной добавкой, чтобы повторы
+        # разных потоков не совпадали
+        time.sleep(min(delay * (2 ** attempt) * (1 + random.random()), remaining))
+
+
+class RetryingCursorWrapper(base.SQLiteCursorWrapper):
+    retries = DEFAULT_WRITE_RETRIES
+    delay = DEFAULT_RETRY_DELAY
+    timeout = DEFAULT_TIMEOUT
+    # Общий предел для BEGIN, который уже ждал очереди на запись
+    deadline = None
+    # Очередь на запись файла БД для записи вне транзакции
+    write_lock = None
+
+    def get_deadline(self):
+        return self.deadline if self.deadline is not None else time.monotonic() + self.timeout
+
+    @contextmanager
+    def autocommit_write(self, query, deadline):
+        if self.write_lock is None or not is_write(query):
+            yield
+            return
+        if not self.write_lock.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            raise base.Database.OperationalError('database is locked')
+        try:
+            yield
+        finally:
+            self.write_lock.release()
+
+    def execute(self, query, params=None):
+        if self.connection.in_transaction:
+            return super().execute(query, params)
+        deadline = self.get_deadline()
+        with self.autocommit_write(query, deadline):
+            return with_retries(
+                lambda: super(RetryingCursorWrapper, self).execute(query, params),
+                self.retries, self.delay, deadline,
+            )
+
+    def executemany(self, query, param_list):
+        if self.connection.in_transaction:
+            return super().executemany(query, param_list)
+        # Генератор параметров нельзя пройти дважды
+        param_list = list(param_list)
+        deadline = self.get_deadline()
+        with self.autocommit_write(query, deadline):
+            return with_retries(
+                lambda: super(RetryingCursorWrapper, self).executemany(query, param_list),
+                self.retries, self.delay, deadline,
+            )
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        options = self.settings_dict['OPTIONS']
+        self.write_retries = options.get('write_retries', DEFAULT_WRITE_RETRIES)
+        self.retry_delay = options.get('retry_delay', DEFAULT_RETRY_DELAY)
+        self.serialize_writes = options.get('serialize_writes', True)
+        # Предел ожидания блокировки: очередь на запись и повторы вместе
+        self.lock_timeout = options.get('timeout', DEFAULT_TIMEOUT)
+        params = super().get_connection_params()
+        for key in ('write_retries', 'retry_delay', 'serialize_writes'):
+            params.pop(key, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        if self.write_retries:
+            # Иначе SQLite ждал бы busy_timeout на каждой попытке
+            conn.execute('PRAGMA busy_timeout=0')
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=RetryingCursorWrapper)
+        cursor.retries = self.write_retries
+        cursor.delay = self.retry_delay
+        cursor.timeout = self.lock_timeout
+        cursor.deadline = self.__dict__.get('_begin_deadline')
+        if self.serialize_writes and not self.is_in_memory_db():
+            cursor.write_lock = get_write_lock(self.settings_dict['NAME'])
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        deadline = time.monotonic() + self.lock_timeout
+        lock = None
+        if self.serialize_writes and not self.is_in_memory_db():
+            lock = get_write_lock(self.settings_dict['NAME'])
+            if not lock.acquire(timeout=self.lock_timeout):
+                raise OperationalError('database is locked')
+        self._begin_deadline = deadline
+        try:
+            # BEGIN повторяет сам курсор (вне транзакции) до того же deadline
+            super()._start_transaction_under_autocommit()
+        except BaseException:
+            if lock is not None:
+                lock.release()
+            raise
+        finally:
+            del self._begin_deadline
+        self._write_lock = lock
+
+    def _release_write_lock(self):
+        lock = self.__dict__.pop('_write_lock', None)
+        if lock is not None:
+            lock.release()
+
+    def _commit(self):
+        try:
+            super()._commit()
+        finally:
+            if not self.connection or not self.connection.in_transaction:
+                self._release_write_lock()
+
+    def _rollback(self):
+        try:
+            super()._rollback()
+        finally:
+            self._release_write_lock()
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            self._release_write_lock()
@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+from datetime import timedelta
 from pathlib import Path
 
+from mini_insta.database import databases_from_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -43,10 +47,14 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
     'notifications.apps.NotificationsConfig',
+    'images.apps.ImagesConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.dbstats.ConnectionStatsMiddleware',
+    'api.querybudget.QueryBudgetMiddleware',
+    'api.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,12 +87,18 @@ WSGI_APPLICATION = 'mini_insta.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+# Подключение из окружения (mini_insta/database.py): DATABASE_URL,
+# DATABASE_CONN_MAX_AGE, DATABASE_CONN_HEALTH_CHECKS; пул для PostgreSQL -
+# DATABASE_POOL=1, DATABASE_POOL_MAX_CONNECTIONS на WEB_CONCURRENCY воркеров.
+# SQLite с конкурентной записью (WAL, BEGIN IMMEDIATE, повторы при
+# блокировке) - DATABASE_SQLITE_TUNING=1, DATABASE_SQLITE_BUSY_TIMEOUT (мс).
+# Реплики для чтения (api/replicas.py) - DATABASE_REPLICA_URLS через запятую:
+# GET-запросы читают с реплик, после записи клиент REPLICA_STICKY_SECONDS
+# секунд читает с default
+DATABASES = databases_from_env(f"sqlite:///{BASE_DIR / 'db.sqlite3'}")
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 5
 
 
 # Password validation
@@ -137,5 +151,128 @@ AUTH_USER_MODEL = 'users.User'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',
-    )
-}
\ No newline at end of file
+    ),
+    # Keyset пагинация без OFFSET и COUNT(*), см. api/pagination.py
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
+}
+
+# Материализованные ленты подписок (posts/timeline.py)
+TIMELINE_MAX_LENGTH = 800
+TIMELINE_BACKFILL_SIZE = 50
+# Посты авторов, у которых подписчиков больше, раскладывает
+# manage.py process_timeline_fanout, а не запрос автора
+TIMELINE_INLINE_FANOUT_LIMIT = 1000
+# ETag ленты меняется хотя бы раз в столько секунд: счетчики лайков и
+# комментариев в 304 отстают не больше (posts/views.py)
+FEED_COUNTERS_MAX_STALENESS = 60
+
+# Транзакционный outbox уведомлений (notifications/outbox.py)
+NOTIFICATIONS_OUTBOX_BATCH_SIZE = 500
+# Однотипные события по посту в пределах окна сворачиваются в одно уведомление
+NOTIFICATIONS_COALESCE_WINDOW = timedelta(hours=24)
+NOTIFICATIONS_COALESCE_TYPES = ('like', 'comment')
+NOTIFICATIONS_SAMPLE_ACTORS = 3
+# Поток уведомлений по SSE (notifications/stream.py, только под ASGI).
+# Брокер: local - один процесс, versions - несколько воркеров и отдельный
+# процесс outbox (опрос Profile.notifications_version)
+NOTIFICATIONS_BROKER = os.environ.get('NOTIFICATIONS_BROKER', 'versions')
+NOTIFICATIONS_BROKER_POLL_INTERVAL = 1.0
+NOTIFICATIONS_STREAM_HEARTBEAT = 15
+NOTIFICATIONS_STREAM_MAX_AGE = 300
+
+# Полнотекстовый поиск постов (posts/search.py); None - выбор по движку БД
+POSTS_SEARCH_BACKEND = None
+
+# Кэш подписок зрителей в памяти процесса (users/graph.py); 0 - выключен
+FOLLOW_GRAPH_CACHE_SIZE = 0
+FOLLOW_GRAPH_CACHE_TTL = 30
+FOLLOW_GRAPH_CACHE_MAX_DEGREE = 5000
+
+# Рекомендации подписок (users/suggestions.py, manage.py compute_follow_suggestions,
+# нужны numpy и scipy)
+FOLLOW_SUGGESTIONS_TOP_K = 50
+FOLLOW_SUGGESTIONS_BLOCK_SIZE = 10000
+
+# Поиск пользователей для автодополнения (users/search.py)
+USERS_SEARCH_LIMIT = 10
+USERS_SEARCH_BUDGET_MS = 50
+USERS_SEARCH_PREFIX_CACHE = False
+USERS_SEARCH_PREFIX_CACHE_TTL = 300
+
+# Бюджет запросов на эндпоинт и поиск N+1 (api/querybudget.py): одинаковая
+# форма SELECT, повторенная QUERY_BUDGET_REPEAT_THRESHOLD раз за запрос
+QUERY_BUDGET_DETECT_N_PLUS_ONE = DEBUG
+QUERY_BUDGET_REPEAT_THRESHOLD = 3
+
+# Предупреждения api.querybudget выводятся только при DEBUG: тесты
+# (DEBUG=False) и боевые процессы без своей настройки логов молчат
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'require_debug_true': {'()': 'django.utils.log.RequireDebugTrue'},
+    },
+    'handlers': {
+        'debug_console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['require_debug_true'],
+        },
+    },
+    'loggers': {
+        'api.querybudget': {'handlers': ['debug_console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
+# Рейтинг популярных постов (posts/trending.py)
+TRENDING_WINDOW = timedelta(days=3)
+TRENDING_HALF_LIFE = timedelta(hours=6)
+TRENDING_COMMENT_WEIGHT = 2.0
+
+# Кэш ответов публичных эндпоинтов (api/cache.py).
+# CACHE_URL: locmem:// (по умолчанию), file:///var/tmp/mini_insta_cache
+# или redis://host:6379/0 (нужен пакет redis)
+CACHE_URL = os.environ.get('CACHE_URL', 'locmem://')
+if CACHE_URL.startswith('redis://') or CACHE_URL.startswith('rediss://'):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}}
+elif CACHE_URL.startswith('file://'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_URL[len('file://'):],
+    }}
+else:
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }}
+API_CACHE_TIMEOUT = 60
+API_CACHE_STALE_TIMEOUT = 30
+
+# Уменьшенные копии изображений (images/pipeline.py, manage.py process_image_jobs)
+IMAGE_VARIANTS = {
+    'thumbnail': {'size': 150, 'crop': True},
+    'feed': {'size': 640},
+    'full': {'size': 1440},
+}
+IMAGE_FORMATS = ('webp', 'jpeg')
+IMAGE_QUALITY = 82
+# Упавшая задача повторяется через 30 с, 60 с, ... (не больше IMAGE_JOBS_MAX_ATTEMPTS раз)
+IMAGE_JOBS_RETRY_DELAY = timedelta(seconds=30)
+
+# Загрузка изображений (images/uploads.py): лимиты проверяются по заголовку файла
+IMAGE_UPLOAD_MAX_SIZE = 15 * 1024 * 1024
+IMAGE_UPLOAD_MAX_SIDE = 10000
+IMAGE_UPLOAD_MAX_PIXELS = 40_000_000
+# Сессии дозагрузки: максимум на один PUT и время жизни брошенной сессии
+IMAGE_UPLOAD_CHUNK_MAX_SIZE = 4 * 1024 * 1024
+IMAGE_UPLOAD_SESSION_TTL = timedelta(hours=24)
+
+# Отдача медиа (images/serving.py): django - FileResponse с Range и ETag,
+# accel - X-Accel-Redirect (nginx), sendfile - X-Sendfile (Apache, lighttpd)
+MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'django')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 3600
+MEDIA_IMMUTABLE_PREFIXES = ('variants/',)
+
+# Пакетные запросы (api/batch.py): максимум подзапросов в одном пакете
+BATCH_MAX_REQUESTS = 20
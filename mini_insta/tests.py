@@ -0,0 +1,134 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.test import SimpleTestCase
+
+from .backends.sqlite3 import base
+from .database import TUNED_SQLITE_ENGINE, sqlite_tuning
+
+
+def locked():
+    return sqlite3.OperationalError('database is locked')
+
+
+class WithRetriesTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(base.time, 'sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def deadline(self, seconds=5):
+        return base.time.monotonic() + seconds
+
+    def test_retries_until_success(self):
+        func = mock.Mock(side_effect=[locked(), locked(), 'ok'])
+        self.assertEqual(base.with_retries(func, 5, 0.01, self.deadline()), 'ok')
+        self.assertEqual(func.call_count, 3)
+        self.assertEqual(self.sleep.call_count, 2)
+
+    def test_other_errors_not_retried(self):
+        func = mock.Mock(side_effect=sqlite3.OperationalError('no such table: x'))
+        with self.assertRaises(sqlite3.OperationalError):
+            base.with_retries(func, 5, 0.01, self.deadline())
+        self.assertEqual(func.call_count, 1)
+
+    def test_retries_exhausted(self):
+        func = mock.Mock(side_effect=locked())
+        with self.assertRaises(sqlite3.OperationalError):
+            base.with_retries(func, 2, 0.01, self.deadline())
+        self.assertEqual(func.call_count, 3)
+
+    def test_deadline_bounds_retries(self):
+        func = mock.Mock(side_effect=locked())
+        with self.assertRaises(sqlite3.OperationalError):
+            base.with_retries(func, 5, 0.01, self.deadline(-1))
+        self.assertEqual(func.call_count, 1)
+        self.sleep.assert_not_called()
+
+    def test_sleep_capped_by_deadline(self):
+        func = mock.Mock(side_effect=[locked(), 'ok'])
+        base.with_retries(func, 5, 10, self.deadline(0.5))
+        self.assertLessEqual(self.sleep.call_args.args[0], 0.5)
+
+
+class WriteLockTests(SimpleTestCase):
+    """Очередь на запись отпускается при любом завершении транзакции"""
+
+    alias = 'test_tuned_sqlite'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # БД подключается внутри теста, тестовый раннер ее не создает
+        cls.databases = {*cls.databases, cls.alias}
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='mini_insta_sqlite_')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'db.sqlite3')
+        # Отдельная БД-файл, не тестовая: in-memory очередь на запись не берет
+        connections.settings[self.alias] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            self.alias: {'ENGINE': TUNED_SQLITE_ENGINE, 'NAME': self.path, 'OPTIONS': sqlite_tuning()},
+        })[self.alias]
+        self.addCleanup(self.remove_alias)
+        self.connection = connections[self.alias]
+        with self.connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+        self.lock = base.get_write_lock(self.path)
+
+    def remove_alias(self):
+        connections[self.alias].close()
+        del connections[self.alias]
+        del connections.settings[self.alias]
+
+    def atomic(self):
+        return transaction.atomic(using=self.alias)
+
+    def insert(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('INSERT INTO item DEFAULT VALUES')
+
+    def test_busy_timeout_disabled_with_retries(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_released_on_commit(self):
+        with self.atomic():
+            self.insert()
+            self.assertTrue(self.lock.locked())
+        self.assertFalse(self.lock.locked())
+
+    def test_released_on_rollback(self):
+        with self.assertRaises(ValueError), self.atomic():
+            self.insert()
+            raise ValueError
+        self.assertFalse(self.lock.locked())
+
+    def test_autocommit_write_waits_for_lock(self):
+        self.connection.ensure_connection()
+        self.connection.lock_timeout = 0.05
+        self.lock.acquire()
+        try:
+            with self.assertRaises(OperationalError):
+                self.insert()
+            # Чтение вне транзакции очередь не берет
+            with self.connection.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM item')
+                self.assertEqual(cursor.fetchone()[0], 0)
+        finally:
+            self.lock.release()
+        self.insert()
+        self.assertFalse(self.lock.locked())
+
+    def test_released_on_close(self):
+        self.connection.ensure_connection()
+        self.connection._start_transaction_under_autocommit()
+        self.assertTrue(self.lock.locked())
+        self.connection.close()
+        self.assertFalse(self.lock.locked())
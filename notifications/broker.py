@@ -0,0 +1,149 @@
+"""
+Брокер событий для потока уведомлений (notifications/stream.py).
+
+Брокер доставляет только пробуждения "у пользователя изменились
+уведомления": что именно изменилось, поток сам читает из БД по своему
+курсору. Поэтому пробуждения можно сворачивать и терять без потери
+событий, а все режимы брокера отдают клиенту одно и то же.
+
+Режим задается NOTIFICATIONS_BROKER:
+- 'local' - только внутри процесса: сигнал notifications_changed
+  (users/versions.py) будит подписчиков этого воркера. Подходит, когда
+  один процесс и outbox разбирается в нем же;
+- 'versions' - замена pub/sub для нескольких воркеров и отдельного
+  процесса outbox: в каждом воркере одна задача раз в
+  NOTIFICATIONS_BROKER_POLL_INTERVAL секунд читает
+  Profile.notifications_version всех своих подписчиков одним запросом и
+  будит тех, у кого версия изменилась. События своего процесса
+  доставляются сразу, как в 'local'.
+"""
+import asyncio
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from users.models import Profile
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATIONS_BROKER = getattr(settings, 'NOTIFICATIONS_BROKER', 'versions')
+NOTIFICATIONS_BROKER_POLL_INTERVAL = getattr(settings, 'NOTIFICATIONS_BROKER_POLL_INTERVAL', 1.0)
+
+
+class Subscription:
+    """Подписка одного соединения: wait() возвращается после пробуждения"""
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        # Одного непрочитанного пробуждения достаточно
+        self.queue = asyncio.Queue(maxsize=1)
+
+    def wake(self):
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+    async def wait(self, timeout):
+        """True - было пробуждение, False - истек timeout"""
+        try:
+            await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """Подписчики процесса по user_id"""
+
+    def __init__(self):
+        self.subscribers = {}
+        # publish() вызывается из потоков синхронных view
+        self.lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self.lock:
+            self.subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscribers.get(subscription.user_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscribers[subscription.user_id]
+
+    def publish(self, user_ids):
+        """Разбудить подписчиков; можно вызывать из любого потока"""
+        with self.lock:
+            targets = [
+                subscription
+                for user_id in user_ids
+                for subscription in self.subscribers.get(user_id, ())
+            ]
+        for subscription in targets:
+            subscription.loop.call_soon_threadsafe(subscription.wake)
+
+
+class VersionPollBroker(LocalBroker):
+    """LocalBroker плюс опрос версий уведомлений для событий других процессов"""
+
+    def __init__(self, interval=NOTIFICATIONS_BROKER_POLL_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self.versions = {}
+        self.poller = None
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        if self.poller is None or self.poller.done():
+            self.poller = asyncio.get_running_loop().create_task(self.poll())
+        return subscription
+
+    async def poll(self):
+        while True:
+            with self.lock:
+                user_ids = list(self.subscribers)
+            if not user_ids:
+                self.versions.clear()
+                return
+            try:
+                versions = await sync_to_async(self.read_versions)(user_ids)
+            except Exception:
+                # Опрос один на процесс: после сбоя БД пробуем снова, иначе
+                # события других процессов перестанут доходить до всех
+                logger.exception('Notification versions poll failed')
+                await asyncio.sleep(self.interval)
+                continue
+            changed = [
+                user_id for user_id, version in versions.items()
+                if user_id in self.versions and self.versions[user_id] != version
+            ]
+            self.versions = versions
+            if changed:
+                self.publish(changed)
+            await asyncio.sleep(self.interval)
+
+    @staticmethod
+    def read_versions(user_ids):
+        return dict(
+            Profile.objects.filter(user_id__in=user_ids).values_list('user_id', 'notifications_version')
+        )
+
+
+BROKERS = {
+    'local': LocalBroker,
+    'versions': VersionPollBroker,
+}
+
+broker = BROKERS[NOTIFICATIONS_BROKER]()
@@ -0,0 +1,51 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications import outbox
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Фоновый воркер: переносит события из outbox в уведомления пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=outbox.OUTBOX_BATCH_SIZE,
+            help='Сколько событий обрабатывать за одну транзакцию',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать текущую очередь и выйти',
+        )
+
+    def handle(self, *args, batch_size, interval, once, **options):
+        total = 0
+        while True:
+            stats = outbox.drain(batch_size=batch_size)
+            if stats['processed']:
+                total += stats['processed']
+                line = (
+                    f"processed={stats['processed']} "
+                    f"created={stats['created']} "
+                    f"coalesced={stats['coalesced']} "
+                    f"duration={stats['duration']:.3f}s "
+                    f"throughput={stats['throughput']:.0f}/s "
+                    f"max_lag={stats['max_lag']:.3f}s"
+                )
+                logger.info('notification outbox batch: %s', line)
+                if options['verbosity'] > 1:
+                    self.stdout.write(line)
+                continue
+
+            if once:
+                break
+            time.sleep(interval)
+
+        self.stdout.write(self.style.SUCCESS(f'Обработано событий: {total}'))
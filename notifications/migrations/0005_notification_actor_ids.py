@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+def fill_actor_ids(apps, schema_editor):
+    # Полный состав старых групп не сохранился - берем известных акторов
+    Notification = apps.get_model('notifications', 'Notification')
+    batch = []
+    for notification in Notification.objects.only('sample_actors', 'sender_id').iterator(chunk_size=1000):
+        ids = [actor['id'] for actor in notification.sample_actors]
+        notification.actor_ids = ids or [notification.sender_id]
+        batch.append(notification)
+        if len(batch) >= 1000:
+            Notification.objects.bulk_update(batch, ['actor_ids'])
+            batch = []
+    if batch:
+        Notification.objects.bulk_update(batch, ['actor_ids'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_notification_grouping'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_ids',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(fill_actor_ids, migrations.RunPython.noop),
+    ]
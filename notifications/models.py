@@ -46,10 +46,69 @@ class Notification(models.Model):
         related_name='notifications'
     )
 
+    # Группировка однотипных событий по посту ("alice и еще 41 ...")
+    actor_count = models.PositiveIntegerField(default=1)
+    sample_actors = models.JSONField(default=list, blank=True)
+    # id всех отправителей группы: actor_count считает разных людей, а
+    # sample_actors обрезан до NOTIFICATIONS_SAMPLE_ACTORS
+    actor_ids = models.JSONField(default=list, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Notification'
         verbose_name_plural = 'Notifications'
+        indexes = [
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notification_recipient_idx'),
+            models.Index(fields=['recipient', 'post', 'notification_type'], name='notification_group_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipient.username} - {self.notification_type}'
+
+
+class NotificationOutbox(models.Model):
+    """
+    Транзакционный outbox: событие пишется в той же транзакции, что и
+    лайк/комментарий, а уведомления создает фоновый воркер пачками
+    (manage.py process_notification_outbox).
+    """
+    recipient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        null=True,
+        blank=True
+    )
+    notification_type = models.CharField(
+        max_length=20,
+        choices=Notification.NOTIFICATION_TYPES
+    )
+    post = models.ForeignKey(
+        'posts.Post',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    comment = models.ForeignKey(
+        'posts.Comment',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Notification outbox event'
+        verbose_name_plural = 'Notification outbox'
 
     def __str__(self):
-        return f'{self.recipient.username} - {self.notification_type}'
\ No newline at end of file
+        return f'{self.notification_type} -> {self.recipient_id}'
@@ -0,0 +1,183 @@
+"""
+Доставка уведомлений через транзакционный outbox.
+
+Сигналы лайков и комментариев только добавляют события в
+NotificationOutbox, а drain() переносит их в Notification пачками
+через bulk_create вне запроса пользователя.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from users.versions import bump_notifications
+
+from .models import Notification, NotificationOutbox
+
+OUTBOX_BATCH_SIZE = getattr(settings, 'NOTIFICATIONS_OUTBOX_BATCH_SIZE', 500)
+
+# Окно, в котором однотипные события по посту сворачиваются в одно уведомление
+COALESCE_WINDOW = getattr(settings, 'NOTIFICATIONS_COALESCE_WINDOW', timedelta(hours=24))
+COALESCE_TYPES = getattr(settings, 'NOTIFICATIONS_COALESCE_TYPES', ('like', 'comment'))
+SAMPLE_ACTORS = getattr(settings, 'NOTIFICATIONS_SAMPLE_ACTORS', 3)
+
+MESSAGES = {
+    'like': '{username} лайкнул ваш пост',
+    'comment': '{username} прокомментировал ваш пост',
+    'follow': '{username} подписался на вас',
+    'mention': '{username} упомянул вас',
+}
+
+GROUPED_MESSAGES = {
+    'like': '{username} и еще {others} лайкнули ваш пост',
+    'comment': '{username} и еще {others} прокомментировали ваш пост',
+}
+
+
+def enqueue(events):
+    """Добавить события в outbox одним INSERT"""
+    events = [event for event in events if event.recipient_id != event.sender_id]
+    if events:
+        NotificationOutbox.objects.bulk_create(events)
+
+
+def format_message(notification_type, username, actor_count):
+    if actor_count > 1 and notification_type in GROUPED_MESSAGES:
+        return GROUPED_MESSAGES[notification_type].format(username=username, others=actor_count - 1)
+    return MESSAGES[notification_type].format(username=username)
+
+
+def _actor(event):
+    if event.sender is None:
+        return None
+    return {'id': event.sender_id, 'username': event.sender.username}
+
+
+def _merge(notification, events):
+    """
+    Добавить события группы в уведомление (новые акторы - первыми).
+    actor_count растет только на отправителей, которых еще нет в группе.
+    """
+    samples = list(notification.sample_actors)
+    actor_ids = list(notification.actor_ids)
+    seen = set(actor_ids)
+    for event in events:
+        actor = _actor(event)
+        if actor is not None:
+            samples = [actor] + [item for item in samples if item['id'] != actor['id']]
+        if event.sender_id not in seen:
+            seen.add(event.sender_id)
+            actor_ids.append(event.sender_id)
+            notification.actor_count += 1
+        notification.sender_id = event.sender_id
+        notification.comment_id = event.comment_id
+    last = events[-1]
+    notification.actor_ids = actor_ids
+    notification.sample_actors = samples[:SAMPLE_ACTORS]
+    notification.updated_at = timezone.now()
+    notification.message = format_message(
+        last.notification_type,
+        last.sender.username if last.sender else '',
+        notification.actor_count,
+    )
+    return notification
+
+
+def _new_notification(events):
+    first = events[0]
+    notification = Notification(
+        recipient_id=first.recipient_id,
+        notification_type=first.notification_type,
+        post_id=first.post_id,
+        actor_count=0,
+        sample_actors=[],
+        actor_ids=[],
+    )
+    return _merge(notification, events)
+
+
+def coalesce(events):
+    """
+    Разложить пачку событий на новые и обновленные уведомления.
+    Однотипные события по одному посту в пределах окна попадают в
+    одно непрочитанное уведомление вместо отдельной строки на каждое.
+    """
+    groups = {}
+    singles = []
+    for event in events:
+        if event.notification_type in COALESCE_TYPES and event.post_id is not None:
+            key = (event.recipient_id, event.notification_type, event.post_id)
+            groups.setdefault(key, []).append(event)
+        else:
+            singles.append([event])
+
+    existing = {}
+    if groups:
+        open_groups = Notification.objects.select_for_update().filter(
+            recipient_id__in={key[0] for key in groups},
+            notification_type__in={key[1] for key in groups},
+            post_id__in={key[2] for key in groups},
+            is_read=False,
+            created_at__gte=timezone.now() - COALESCE_WINDOW,
+        ).order_by('created_at')
+        for notification in open_groups:
+            existing[(notification.recipient_id, notification.notification_type, notification.post_id)] = notification
+
+    created, updated = [], []
+    for key, group_events in groups.items():
+        if key in existing:
+            updated.append(_merge(existing[key], group_events))
+        else:
+            created.append(_new_notification(group_events))
+    created.extend(_new_notification(group_events) for group_events in singles)
+    return created, updated
+
+
+def drain(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Обработать одну пачку событий.
+    Возвращает метрики пачки: processed, created, coalesced,
+    duration, throughput, max_lag.
+    """
+    started = time.monotonic()
+    with transaction.atomic():
+        events = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True).select_related(
+                'sender'
+            ).order_by('id')[:batch_size]
+        )
+        created, updated = coalesce(events)
+        if created:
+            Notification.objects.bulk_create(created, batch_size=batch_size)
+        if updated:
+            Notification.objects.bulk_update(
+                updated,
+                ['sender', 'comment', 'actor_count', 'sample_actors', 'actor_ids', 'message', 'updated_at'],
+                batch_size=batch_size,
+            )
+        if events:
+            NotificationOutbox.objects.filter(pk__in=[event.pk for event in events]).delete()
+            # bulk_create/bulk_update не шлют сигналы - версии меняем сами
+            bump_notifications({notification.recipient_id for notification in created + updated})
+
+    duration = time.monotonic() - started
+    now = timezone.now()
+    return {
+        'processed': len(events),
+        'created': len(created),
+        'coalesced': len(events) - len(created),
+        'duration': duration,
+        'throughput': len(events) / duration if duration else 0.0,
+        'max_lag': max(((now - event.created_at).total_seconds() for event in events), default=0.0),
+    }
+
+
+def backlog():
+    """Текущий размер очереди и возраст самого старого события"""
+    oldest = NotificationOutbox.objects.order_by('id').values_list('created_at', flat=True).first()
+    return {
+        'pending': NotificationOutbox.objects.count(),
+        'oldest_lag': (timezone.now() - oldest).total_seconds() if oldest else 0.0,
+    }
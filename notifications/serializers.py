@@ -10,5 +10,7 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = (
             'id', 'sender', 'notification_type', 'message', 
-            'is_read', 'created_at', 'post', 'comment'
+            'is_read', 'created_at', 'post', 'comment',
+            'actor_count', 'sample_actors'
         )
+        read_only_fields = ('actor_count', 'sample_actors')
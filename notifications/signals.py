@@ -1,41 +1,52 @@
-from django.db.models.signals import post_save, m2m_changed
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from django.contrib.auth import get_user_model
 
-from .models import Notification
+from .models import Notification, NotificationOutbox
+from . import outbox
 from posts.models import Post, Comment
+from users.versions import bump_notifications, notifications_changed
 
-User = get_user_model()
+from .broker import broker
 
 
 @receiver(m2m_changed, sender=Post.likes.through)
-def create_like_notification(sender, instance, action, pk_set, **kwargs):
-    """Создание уведомления при лайке поста"""
-    if action == 'post_add':
-        for user_id in pk_set:
-            user = User.objects.get(id=user_id)
-            if user != instance.author:  # Не уведомляем автора о своем лайке
-                Notification.objects.create(
-                    recipient=instance.author,
-                    sender=user,
-                    notification_type='like',
-                    message=f'{user.username} лайкнул ваш пост',
-                    post=instance
-                )
+def create_like_notification(sender, instance, action, reverse, pk_set, **kwargs):
+    """Ставим в outbox уведомление о лайке поста"""
+    if action != 'post_add' or not pk_set:
+        return
+
+    if reverse:
+        # user.liked_posts.add(...): instance - пользователь, pk_set - посты
+        posts = Post.objects.filter(pk__in=pk_set).values_list('id', 'author_id')
+        pairs = [(post_id, author_id, instance.pk) for post_id, author_id in posts]
+    else:
+        pairs = [(instance.pk, instance.author_id, user_id) for user_id in pk_set]
+
+    # Автора о своем лайке не уведомляем (см. outbox.enqueue)
+    outbox.enqueue([
+        NotificationOutbox(
+            recipient_id=author_id,
+            sender_id=user_id,
+            notification_type='like',
+            post_id=post_id,
+        )
+        for post_id, author_id, user_id in pairs
+    ])
 
 
 @receiver(post_save, sender=Comment)
 def create_comment_notification(sender, instance, created, **kwargs):
-    """Создание уведомления при комментарии"""
-    if created and instance.author != instance.post.author:
-        Notification.objects.create(
-            recipient=instance.post.author,
-            sender=instance.author,
-            notification_type='comment',
-            message=f'{instance.author.username} прокомментировал ваш пост',
-            post=instance.post,
-            comment=instance
-        )
+    """Ставим в outbox уведомление о комментарии"""
+    if created:
+        outbox.enqueue([
+            NotificationOutbox(
+                recipient_id=instance.post.author_id,
+                sender_id=instance.author_id,
+                notification_type='comment',
+                post_id=instance.post_id,
+                comment_id=instance.pk,
+            )
+        ])
 
 
 # Временно отключено - нужно исправить сигнал
@@ -53,3 +64,16 @@ def create_comment_notification(sender, instance, created, **kwargs):
 #                     notification_type='follow',
 #                     message=f'{instance.user.username} подписался на вас'
 #                 )
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def bump_notifications_version(sender, instance, **kwargs):
+    """Прочтение или удаление уведомления меняет версию списка получателя"""
+    bump_notifications([instance.recipient_id])
+
+
+@receiver(notifications_changed)
+def wake_notification_streams(sender, user_ids, **kwargs):
+    """Будим открытые потоки уведомлений получателей (notifications/stream.py)"""
+    broker.publish(user_ids)
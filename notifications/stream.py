@@ -0,0 +1,128 @@
+"""
+Поток уведомлений по Server-Sent Events вместо опроса списка и счетчика.
+
+Соединение подписывается на брокер (notifications/broker.py) и по
+каждому пробуждению дочитывает из БД уведомления, измененные после
+курсора (updated_at, id): новые и сгруппированные ("alice и еще 41 ...")
+приходят событием notification, счетчик непрочитанных - событием unread
+с разницей относительно прошлого значения. id события - курсор, поэтому
+EventSource после переподключения (Last-Event-ID) продолжает с места
+обрыва.
+
+Работает только под ASGI (uvicorn/daphne mini_insta.asgi:application):
+под WSGI поток занимал бы рабочий поток целиком.
+"""
+import asyncio
+import json
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from rest_framework.utils.encoders import JSONEncoder
+
+from .broker import broker
+from .models import Notification
+from .serializers import NotificationSerializer
+
+# Комментарий-пинг держит соединение через прокси; заодно перечитываем БД
+NOTIFICATIONS_STREAM_HEARTBEAT = getattr(settings, 'NOTIFICATIONS_STREAM_HEARTBEAT', 15)
+# После этого соединение закрывается, клиент переподключается с Last-Event-ID
+NOTIFICATIONS_STREAM_MAX_AGE = getattr(settings, 'NOTIFICATIONS_STREAM_MAX_AGE', 300)
+NOTIFICATIONS_STREAM_BATCH_SIZE = getattr(settings, 'NOTIFICATIONS_STREAM_BATCH_SIZE', 50)
+# Задержка переподключения для EventSource, мс
+NOTIFICATIONS_STREAM_RETRY = 3000
+
+
+def encode_cursor(updated_at, pk):
+    micros = int(updated_at.timestamp() * 1_000_000)
+    return f'{micros}-{pk}'
+
+
+def decode_cursor(value):
+    """(updated_at, id) из id события или None"""
+    try:
+        micros, pk = value.split('-')
+        updated_at = datetime.fromtimestamp(int(micros) / 1_000_000, tz=dt_timezone.utc)
+        return updated_at, int(pk)
+    except (AttributeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def format_event(event, data, event_id=None):
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append('data: ' + json.dumps(data, cls=JSONEncoder, ensure_ascii=False))
+    return '\n'.join(lines) + '\n\n'
+
+
+def read_changes(user_id, cursor):
+    """Уведомления после курсора (по возрастанию) и число непрочитанных"""
+    notifications = Notification.objects.filter(recipient_id=user_id)
+    changed = notifications.select_related('sender')
+    if cursor is not None:
+        updated_at, pk = cursor
+        changed = changed.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk))
+    changed = list(changed.order_by('updated_at', 'id')[:NOTIFICATIONS_STREAM_BATCH_SIZE])
+    unread = notifications.filter(is_read=False).count()
+    return changed, NotificationSerializer(changed, many=True).data, unread
+
+
+async def event_stream(user_id, cursor):
+    subscription = broker.subscribe(user_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + NOTIFICATIONS_STREAM_MAX_AGE
+    unread = None
+    try:
+        yield f'retry: {NOTIFICATIONS_STREAM_RETRY}\n\n'
+        if cursor is None:
+            # Новое подключение: историю отдает список, здесь - только новое
+            cursor = (timezone.now(), 0)
+        while True:
+            changed, data, count = await sync_to_async(read_changes)(user_id, cursor)
+            for notification, item in zip(changed, data):
+                cursor = (notification.updated_at, notification.pk)
+                yield format_event('notification', item, encode_cursor(*cursor))
+            if count != unread:
+                delta = count - unread if unread is not None else 0
+                yield format_event('unread', {'unread_count': count, 'delta': delta})
+                unread = count
+            if len(changed) == NOTIFICATIONS_STREAM_BATCH_SIZE:
+                # Дочитываем без ожидания
+                continue
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            woken = await subscription.wait(min(NOTIFICATIONS_STREAM_HEARTBEAT, remaining))
+            if not woken:
+                yield ': ping\n\n'
+    finally:
+        subscription.close()
+
+
+@require_GET
+async def notification_stream(request):
+    """
+    Поток уведомлений (text/event-stream):
+    - GET /notifications/stream/
+    События: notification (уведомление, id - курсор для Last-Event-ID) и
+    unread ({"unread_count": n, "delta": d}).
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'detail': 'Поток доступен только под ASGI'}, status=501)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'detail': 'Учетные данные не были предоставлены.'}, status=403)
+
+    cursor = decode_cursor(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id'))
+    response = StreamingHttpResponse(event_stream(user.pk, cursor), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx не должен буферизовать поток
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,3 +1,118 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase
+
+from posts.models import Post
+from users.models import User
+
+from . import outbox
+from .broker import LocalBroker, VersionPollBroker
+from .models import Notification, NotificationOutbox
+from .stream import decode_cursor, encode_cursor, read_changes
+
+
+class CoalesceTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice@example.com', 'alice', 'pw12345!!')
+        self.bob = User.objects.create_user('bob@example.com', 'bob', 'pw12345!!')
+        self.carol = User.objects.create_user('carol@example.com', 'carol', 'pw12345!!')
+        self.post = Post.objects.create(author=self.alice, caption='post')
+        NotificationOutbox.objects.all().delete()
+
+    def like(self, *senders):
+        outbox.enqueue([
+            NotificationOutbox(
+                recipient=self.alice, sender=sender, notification_type='like', post=self.post,
+            )
+            for sender in senders
+        ])
+        outbox.drain()
+        return Notification.objects.get(recipient=self.alice, post=self.post, notification_type='like')
+
+    def test_repeated_actor_counted_once(self):
+        # Лайк, снятие и повторный лайк - в одной пачке и в следующих
+        notification = self.like(self.bob, self.bob, self.carol)
+        self.assertEqual(notification.actor_count, 2)
+        notification = self.like(self.bob)
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual([actor['id'] for actor in notification.sample_actors], [self.bob.pk, self.carol.pk])
+        self.assertEqual(notification.message, 'bob и еще 1 лайкнули ваш пост')
+
+    def test_new_actor_extends_group(self):
+        self.like(self.bob)
+        notification = self.like(self.carol)
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(sorted(notification.actor_ids), sorted([self.bob.pk, self.carol.pk]))
+
+
+class StreamTests(TestCase):
+    def test_cursor_round_trip(self):
+        updated_at = datetime(2026, 10, 18, 12, 30, 15, 123457, tzinfo=dt_timezone.utc)
+        self.assertEqual(decode_cursor(encode_cursor(updated_at, 42)), (updated_at, 42))
+        for value in (None, '', 'abc', '1-2-3', '12-x', '99999999999999999999999-1'):
+            self.assertIsNone(decode_cursor(value), value)
+
+    def test_read_changes_order(self):
+        alice = User.objects.create_user('alice@example.com', 'alice', 'pw12345!!')
+        bob = User.objects.create_user('bob@example.com', 'bob', 'pw12345!!')
+        first, second, third = [
+            Notification.objects.create(
+                recipient=alice, sender=bob, notification_type='follow', message='bob подписался на вас',
+            )
+            for _ in range(3)
+        ]
+        # Первое уведомление сгруппировали позже остальных, у двух других
+        # одинаковый updated_at - порядок по id
+        now = datetime(2026, 10, 18, 12, 0, tzinfo=dt_timezone.utc)
+        Notification.objects.filter(pk=first.pk).update(updated_at=now + timedelta(seconds=1))
+        Notification.objects.filter(pk__in=[second.pk, third.pk]).update(updated_at=now, is_read=True)
+
+        changed, data, unread = read_changes(alice.pk, None)
+        self.assertEqual([n.pk for n in changed], [second.pk, third.pk, first.pk])
+        self.assertEqual([item['id'] for item in data], [second.pk, third.pk, first.pk])
+        self.assertEqual(unread, 1)
+
+        changed, _, _ = read_changes(alice.pk, (now, second.pk))
+        self.assertEqual([n.pk for n in changed], [third.pk, first.pk])
+        changed, _, _ = read_changes(alice.pk, (now + timedelta(seconds=1), first.pk))
+        self.assertEqual(changed, [])
+
+
+class BrokerTests(SimpleTestCase):
+    async def test_local_publish_and_unsubscribe(self):
+        broker = LocalBroker()
+        first, second, other = broker.subscribe(1), broker.subscribe(1), broker.subscribe(2)
+        # Пробуждения сворачиваются: два publish - одно пробуждение
+        broker.publish([1])
+        broker.publish([1])
+        self.assertTrue(await first.wait(1))
+        self.assertTrue(await second.wait(1))
+        self.assertFalse(await first.wait(0.01))
+        self.assertFalse(await other.wait(0.01))
+
+        first.close()
+        broker.publish([1])
+        self.assertFalse(await first.wait(0.01))
+        self.assertTrue(await second.wait(1))
+        second.close()
+        other.close()
+        self.assertEqual(broker.subscribers, {})
+
+    async def test_poll_survives_read_errors(self):
+        broker = VersionPollBroker(interval=0)
+        results = [OperationalError('database is locked'), {1: 1}, {1: 2}]
+
+        def read_versions(user_ids):
+            result = results.pop(0) if len(results) > 1 else results[0]
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        broker.read_versions = read_versions
+        with self.assertLogs('notifications.broker', 'ERROR'):
+            subscription = broker.subscribe(1)
+            self.assertTrue(await subscription.wait(1))
+        self.assertFalse(broker.poller.done())
+        subscription.close()
+        await broker.poller
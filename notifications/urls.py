@@ -3,10 +3,12 @@ from .views import (
     NotificationListView, NotificationDetailView, 
     MarkAllReadView, UnreadCountView
 )
+from .stream import notification_stream
 
 urlpatterns = [
     path('', NotificationListView.as_view(), name='notification-list'),
     path('<int:pk>/', NotificationDetailView.as_view(), name='notification-detail'),
     path('mark-all-read/', MarkAllReadView.as_view(), name='mark-all-read'),
     path('unread-count/', UnreadCountView.as_view(), name='unread-count'),
+    path('stream/', notification_stream, name='notification-stream'),
 ]
@@ -1,24 +1,37 @@
+from functools import partial
+
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
 
+from api.conditional import ConditionalGetMixin
+from users.versions import bump_notifications, get_versions
+
 from .models import Notification
 from .serializers import NotificationSerializer
 
 
-class NotificationListView(generics.ListAPIView):
+class NotificationListView(ConditionalGetMixin, generics.ListAPIView):
     """
     Список уведомлений пользователя:
     - GET /notifications/
     """
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 4
 
     def get_queryset(self):
         return Notification.objects.filter(
             recipient=self.request.user
-        ).select_related('sender', 'post', 'comment')
+        ).select_related('sender', 'post', 'comment').order_by('-created_at', '-id')
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, partial(super().list, request, *args, **kwargs))
+
+    def get_validators(self):
+        _, notifications_version = get_versions(self.request.user.pk)
+        return f'{self.request.user.pk}:{notifications_version}', None
 
 
 class NotificationDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -30,9 +43,10 @@ class NotificationDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
+        return Notification.objects.filter(recipient=self.request.user).select_related('sender')
 
     def patch(self, request, *args, **kwargs):
         notification = self.get_object()
@@ -49,22 +63,32 @@ class MarkAllReadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
-        Notification.objects.filter(
+        updated = Notification.objects.filter(
             recipient=request.user,
             is_read=False
         ).update(is_read=True)
+        if updated:
+            bump_notifications([request.user.pk])
         
         return Response({'message': 'Все уведомления отмечены как прочитанные'})
 
 
-class UnreadCountView(APIView):
+class UnreadCountView(ConditionalGetMixin, APIView):
     """
     Количество непрочитанных уведомлений:
     - GET /notifications/unread-count/
     """
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 4
 
     def get(self, request):
+        return self.conditional_response(request, partial(self.count_unread, request))
+
+    def get_validators(self):
+        _, notifications_version = get_versions(self.request.user.pk)
+        return f'{self.request.user.pk}:{notifications_version}', None
+
+    def count_unread(self, request):
         count = Notification.objects.filter(
             recipient=request.user,
             is_read=False
@@ -0,0 +1,12 @@
+"""
+Общие помощники бенчмарков (manage.py benchmark_api,
+benchmark_sqlite_concurrency): перцентили в отчетах считаются одинаково.
+"""
+
+
+def percentile(values, fraction):
+    """Ближайший ранг: значение, не меньше которого fraction выборки"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
@@ -0,0 +1,109 @@
+"""
+Денормализованные счетчики лайков и комментариев на Post и ответов
+на Comment.
+
+Счетчики меняются атомарно через F(), без чтения строки в Python,
+а reconcile() пересчитывает их пачками и чинит расхождения.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest, Now
+from django.utils import timezone
+
+from api.cache import invalidate_posts
+
+from .models import Post, Comment
+
+Like = Post.likes.through
+
+
+def change_likes(post_ids, delta):
+    """Изменить likes_count у постов на delta"""
+    if not post_ids or not delta:
+        return
+    Post.objects.filter(pk__in=post_ids).update(
+        likes_count=Greatest(F('likes_count') + delta, 0),
+        updated_at=Now(),
+    )
+    invalidate_posts(post_ids)
+
+
+def change_comments(post_id, delta):
+    """Изменить comments_count у поста на delta"""
+    Post.objects.filter(pk=post_id).update(
+        comments_count=Greatest(F('comments_count') + delta, 0),
+        updated_at=Now(),
+    )
+    invalidate_posts([post_id])
+
+
+def change_replies(comment_id, delta):
+    """Изменить replies_count у комментария на delta"""
+    Comment.objects.filter(pk=comment_id).update(
+        replies_count=Greatest(F('replies_count') + delta, 0)
+    )
+
+
+def _count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+            c=Count('pk')
+        ).values('c')
+    ), 0)
+
+
+def reconcile(batch_size=1000):
+    """
+    Пересчитать счетчики всех постов пачками по id.
+    Возвращает количество исправленных постов.
+    """
+    fixed = 0
+    last_id = 0
+    while True:
+        batch = list(
+            Post.objects.filter(pk__gt=last_id).order_by('pk').annotate(
+                real_likes=_count_subquery(Like, 'post_id'),
+                real_comments=_count_subquery(Comment, 'post_id'),
+            ).only('pk', 'likes_count', 'comments_count', 'updated_at')[:batch_size]
+        )
+        if not batch:
+            return fixed
+
+        drifted = []
+        now = timezone.now()
+        for post in batch:
+            if post.likes_count != post.real_likes or post.comments_count != post.real_comments:
+                post.likes_count = post.real_likes
+                post.comments_count = post.real_comments
+                post.updated_at = now
+                drifted.append(post)
+        Post.objects.bulk_update(drifted, ['likes_count', 'comments_count', 'updated_at'])
+
+        fixed += len(drifted)
+        last_id = batch[-1].pk
+
+
+def reconcile_replies(batch_size=1000):
+    """
+    Пересчитать replies_count всех комментариев пачками по id.
+    Возвращает количество исправленных комментариев.
+    """
+    fixed = 0
+    last_id = 0
+    while True:
+        batch = list(
+            Comment.objects.filter(pk__gt=last_id).order_by('pk').annotate(
+                real_replies=_count_subquery(Comment, 'parent_id'),
+            ).only('pk', 'replies_count')[:batch_size]
+        )
+        if not batch:
+            return fixed
+
+        drifted = []
+        for comment in batch:
+            if comment.replies_count != comment.real_replies:
+                comment.replies_count = comment.real_replies
+                drifted.append(comment)
+        Comment.objects.bulk_update(drifted, ['replies_count'])
+
+        fixed += len(drifted)
+        last_id = batch[-1].pk
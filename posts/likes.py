@@ -0,0 +1,43 @@
+"""
+Идемпотентные лайки за O(1).
+
+Запись идет напрямую в таблицу Post.likes.through: одна проверка по
+уникальному индексу (post_id, user_id) и insert-or-ignore / delete,
+без загрузки списка лайкнувших.
+"""
+from django.contrib.auth import get_user_model
+from django.db import router, transaction
+from django.db.models.signals import m2m_changed
+
+from . import counters
+from .counters import Like
+
+
+def is_liked(post, user):
+    return Like.objects.filter(post_id=post.pk, user_id=user.pk).exists()
+
+
+def add_like(post, user):
+    """Поставить лайк. True, если лайк поставлен именно этим вызовом"""
+    using = router.db_for_write(Like, instance=post)
+    with transaction.atomic(using=using):
+        _, created = Like.objects.using(using).get_or_create(post_id=post.pk, user_id=user.pk)
+        if created:
+            # Тот же сигнал, что шлет post.likes.add(): счетчики и уведомления
+            m2m_changed.send(
+                sender=Like, instance=post, action='post_add', reverse=False,
+                model=get_user_model(), pk_set={user.pk}, using=using,
+            )
+    return created
+
+
+def remove_like(post, user):
+    """Убрать лайк. True, если лайк снят именно этим вызовом"""
+    using = router.db_for_write(Like, instance=post)
+    with transaction.atomic(using=using):
+        deleted, _ = Like.objects.using(using).filter(post_id=post.pk, user_id=user.pk).delete()
+        if deleted:
+            # Число удаленных строк точное даже при параллельных запросах,
+            # поэтому счетчик обновляем сами, а не через pre_remove-пробу
+            counters.change_likes([post.pk], -deleted)
+    return bool(deleted)
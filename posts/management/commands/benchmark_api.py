@@ -0,0 +1,235 @@
+import json
+import random
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+
+from api.querybudget import record_queries
+from notifications.models import Notification
+from posts.benchmarks import percentile
+from posts.models import Comment, Post, TimelineEntry
+from posts.synthetic import VOCABULARY
+from users.counters import Follow
+from users.models import User
+
+SCENARIOS = ('feed', 'trending', 'search', 'profile', 'like', 'notifications')
+PREFIX = '/api/v1'
+# Отношения времени/пропускной способности к базовому прогону (--compare)
+COMPARED = ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'queries_mean')
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def sample_ids(queryset, count, rng):
+    """count случайных id без ORDER BY RANDOM() по всей таблице"""
+    ids = list(queryset.values_list('id', flat=True)[:count * 20])
+    rng.shuffle(ids)
+    return ids[:count]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон эндпоинтов ленты, популярного, поиска, профиля, лайков '
+        'и уведомлений на текущей БД (см. seed_synthetic_data): p50/p95/p99, '
+        'пропускная способность и число запросов к БД в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на сценарий')
+        parser.add_argument('--warmup', type=int, default=20, help='Запросов на прогрев, не учитываются')
+        parser.add_argument('--concurrency', type=int, default=1, help='Потоков на сценарий')
+        parser.add_argument('--viewers', type=int, default=50, help='Сколько пользователей делают запросы')
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--cold', action='store_true', help='Очищать кэши перед каждым запросом')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Записать JSON в файл')
+        parser.add_argument('--compare', help='JSON прошлого прогона: добавить отношения к нему')
+
+    def handle(self, *args, scenarios, requests, warmup, concurrency, viewers, page_size, cold, seed,
+               output, compare, **options):
+        baseline = None
+        if compare:
+            with open(compare) as fp:
+                baseline = json.load(fp)
+
+        rng = random.Random(seed)
+        self.page_size = page_size
+        self.cold = cold
+        self.concurrency = concurrency
+        self.viewers = self.pick_viewers(viewers, rng)
+        self.post_ids = sample_ids(Post.objects.order_by('-likes_count', '-id'), 500, rng)
+        self.usernames = list(User.objects.filter(pk__in=sample_ids(
+            User.objects.filter(is_active=True).order_by('-profile__followers_count'), 200, rng,
+        )).values_list('username', flat=True))
+        if not (self.viewers and self.post_ids and self.usernames):
+            raise CommandError('Нет данных: сначала manage.py seed_synthetic_data')
+
+        result = {
+            'meta': {
+                'commit': git_commit(),
+                'started_at': datetime.now(dt_timezone.utc).isoformat(),
+                'database': connections['default'].vendor,
+                'engine': settings.DATABASES['default']['ENGINE'],
+                'debug': settings.DEBUG,
+                'dataset': self.dataset(),
+                'options': {
+                    'requests': requests, 'warmup': warmup, 'concurrency': concurrency,
+                    'viewers': len(self.viewers), 'page_size': page_size, 'cold': cold, 'seed': seed,
+                },
+            },
+            'scenarios': {},
+        }
+        # Клиент ходит с Host: testserver, как в тестах
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for name in scenarios:
+                self.stderr.write(f'{name}...')
+                result['scenarios'][name] = self.run_scenario(name, requests, warmup, concurrency, seed)
+
+        if baseline is not None:
+            for name, stats in result['scenarios'].items():
+                before = baseline.get('scenarios', {}).get(name)
+                if before:
+                    stats['change'] = {
+                        key: round(stats[key] / before[key], 3) if before.get(key) else None
+                        for key in COMPARED
+                    }
+            result['meta']['baseline_commit'] = baseline.get('meta', {}).get('commit')
+
+        data = json.dumps(result, indent=2)
+        if output:
+            with open(output, 'w') as fp:
+                fp.write(data + '\n')
+        self.stdout.write(data)
+
+    def pick_viewers(self, count, rng):
+        # Лента собрана не у всех (seed_synthetic_data --timelines)
+        owner_ids = list(
+            TimelineEntry.objects.order_by('owner_id').values_list('owner_id', flat=True).distinct()[:count * 20]
+        )
+        if not owner_ids:
+            owner_ids = sample_ids(User.objects.filter(is_active=True).order_by('id'), count, rng)
+        rng.shuffle(owner_ids)
+        return list(User.objects.filter(pk__in=owner_ids[:count]))
+
+    def dataset(self):
+        return {
+            'users': User.objects.count(),
+            'follows': Follow.objects.count(),
+            'posts': Post.objects.count(),
+            'likes': Post.likes.through.objects.count(),
+            'comments': Comment.objects.count(),
+            'notifications': Notification.objects.count(),
+            'timeline_entries': TimelineEntry.objects.count(),
+        }
+
+    def request_for(self, name, thread, number, rng):
+        """(метод, путь, параметры) number-го запроса потока thread"""
+        page = {'page_size': self.page_size}
+        if name == 'feed':
+            return 'get', f'{PREFIX}/posts/feed/', page
+        if name == 'trending':
+            return 'get', f'{PREFIX}/posts/posts/trending/', page
+        if name == 'search':
+            return 'get', f'{PREFIX}/posts/posts/search/', {**page, 'q': rng.choice(VOCABULARY)}
+        if name == 'profile':
+            return 'get', f'{PREFIX}/users/{rng.choice(self.usernames)}/', {}
+        if name == 'like':
+            # Пары PUT/DELETE одного поста одним клиентом: набор данных не
+            # меняется от прогона
+            post_id = self.post_ids[(number // 2 * self.concurrency + thread) % len(self.post_ids)]
+            return ('put' if number % 2 == 0 else 'delete'), f'{PREFIX}/posts/posts/{post_id}/like/', {}
+        return 'get', f'{PREFIX}/notifications/', page
+
+    def run_scenario(self, name, requests, warmup, concurrency, seed):
+        samples = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker(thread, count, record):
+            rng = random.Random(f'{seed}-{name}-{thread}')
+            clients = []
+            for viewer in self.viewers[thread::concurrency] or self.viewers:
+                # Исключения view (например, "database is locked") - это 500 в статистике
+                client = Client(raise_request_exception=False)
+                client.force_login(viewer)
+                clients.append(client)
+            local, failed = [], 0
+            try:
+                for number in range(count):
+                    client = clients[number // 2 % len(clients)]
+                    method, path, params = self.request_for(name, thread, number, rng)
+                    if self.cold:
+                        for cache in caches.all(initialized_only=True):
+                            cache.clear()
+                    with record_queries() as recorder:
+                        started = time.perf_counter()
+                        if method == 'get':
+                            response = client.get(path, params)
+                        else:
+                            response = getattr(client, method)(path)
+                        elapsed = time.perf_counter() - started
+                    if response.status_code >= 400:
+                        failed += 1
+                    local.append((elapsed, recorder.count, recorder.duration))
+                if name == 'like' and count % 2:
+                    # Снять последний непарный лайк, в статистику не входит
+                    method, path, _ = self.request_for(name, thread, count, rng)
+                    getattr(clients[count // 2 % len(clients)], method)(path)
+            finally:
+                connections.close_all()
+            if record:
+                with lock:
+                    samples.extend(local)
+                    errors.append(failed)
+
+        def run(total, record):
+            per_thread = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+            threads = [
+                threading.Thread(target=worker, args=(i, count, record)) for i, count in enumerate(per_thread)
+            ]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return time.perf_counter() - started
+
+        if warmup:
+            run(warmup, record=False)
+        wall = run(requests, record=True)
+
+        latencies = [elapsed * 1000 for elapsed, _, _ in samples]
+        queries = [count for _, count, _ in samples]
+        return {
+            'requests': len(samples),
+            'errors': sum(errors),
+            'p50_ms': _round(percentile(latencies, 0.50)),
+            'p95_ms': _round(percentile(latencies, 0.95)),
+            'p99_ms': _round(percentile(latencies, 0.99)),
+            'mean_ms': _round(sum(latencies) / len(latencies)) if latencies else None,
+            'max_ms': _round(max(latencies)) if latencies else None,
+            'throughput_rps': _round(len(samples) / wall) if wall else None,
+            'queries_mean': _round(sum(queries) / len(queries)) if queries else None,
+            'queries_max': max(queries) if queries else None,
+            'query_time_mean_ms': _round(sum(duration for _, _, duration in samples) * 1000 / len(samples))
+            if samples else None,
+        }
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
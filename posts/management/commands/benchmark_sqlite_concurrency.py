@@ -0,0 +1,154 @@
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections, transaction
+
+from mini_insta.database import TUNED_SQLITE_ENGINE, sqlite_tuning
+from posts.benchmarks import percentile
+
+SCHEMA = (
+    'CREATE TABLE bench_post (id INTEGER PRIMARY KEY, likes_count INTEGER NOT NULL DEFAULT 0,'
+    ' comments_count INTEGER NOT NULL DEFAULT 0)',
+    'CREATE TABLE bench_like (id INTEGER PRIMARY KEY, post_id INTEGER NOT NULL, user_id INTEGER NOT NULL,'
+    ' UNIQUE (post_id, user_id))',
+    'CREATE TABLE bench_comment (id INTEGER PRIMARY KEY, post_id INTEGER NOT NULL, user_id INTEGER NOT NULL,'
+    ' text TEXT NOT NULL)',
+    'CREATE INDEX bench_comment_post ON bench_comment (post_id)',
+)
+
+MODES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}},
+    'tuned': {'ENGINE': TUNED_SQLITE_ENGINE, 'OPTIONS': sqlite_tuning()},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк конкурентных лайков/комментариев и чтений на SQLite: '
+        'стандартные настройки против DATABASE_SQLITE_TUNING, результат - JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Потоков записи')
+        parser.add_argument('--readers', type=int, default=8, help='Потоков чтения')
+        parser.add_argument('--duration', type=float, default=5.0, help='Секунд на режим')
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['default', 'tuned'])
+
+    def handle(self, *args, writers, readers, duration, posts, modes, **options):
+        directory = tempfile.mkdtemp(prefix='mini_insta_sqlite_bench_')
+        try:
+            results = {
+                mode: self.run_mode(mode, os.path.join(directory, f'{mode}.sqlite3'), writers, readers, duration, posts)
+                for mode in modes
+            }
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        if 'default' in results and 'tuned' in results:
+            results['speedup'] = {
+                key: round(results['tuned'][key] / results['default'][key], 2) if results['default'][key] else None
+                for key in ('writes_per_second', 'reads_per_second')
+            }
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run_mode(self, mode, path, writers, readers, duration, posts):
+        alias = f'sqlite_bench_{mode}'
+        connections.settings[alias] = connections.configure_settings({
+            'default': connections.settings['default'],
+            alias: {**MODES[mode], 'NAME': path},
+        })[alias]
+        try:
+            with connections[alias].cursor() as cursor:
+                for statement in SCHEMA:
+                    cursor.execute(statement)
+                cursor.executemany('INSERT INTO bench_post (id) VALUES (%s)', [(pk,) for pk in range(1, posts + 1)])
+            connections[alias].close()
+
+            stats = {'write': [], 'read': [], 'write_errors': 0, 'read_errors': 0}
+            lock = threading.Lock()
+            deadline = time.monotonic() + duration
+            threads = [
+                threading.Thread(target=self.worker, args=(alias, kind, number, posts, deadline, stats, lock))
+                for kind, count in (('write', writers), ('read', readers))
+                for number in range(count)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+
+        return {
+            'writes_per_second': round(len(stats['write']) / duration, 1),
+            'reads_per_second': round(len(stats['read']) / duration, 1),
+            'write_errors': stats['write_errors'],
+            'read_errors': stats['read_errors'],
+            'write_p50_ms': _ms(statistics.median(stats['write']) if stats['write'] else None),
+            'write_p95_ms': _ms(percentile(stats['write'], 0.95)),
+            'read_p50_ms': _ms(statistics.median(stats['read']) if stats['read'] else None),
+            'read_p95_ms': _ms(percentile(stats['read'], 0.95)),
+        }
+
+    def worker(self, alias, kind, number, posts, deadline, stats, lock):
+        rng = random.Random(f'{kind}-{number}')
+        operation = self.write if kind == 'write' else self.read
+        latencies, errors = [], 0
+        try:
+            while time.monotonic() < deadline:
+                started = time.monotonic()
+                try:
+                    operation(alias, rng, posts)
+                except DatabaseError:
+                    errors += 1
+                    continue
+                latencies.append(time.monotonic() - started)
+        finally:
+            connections[alias].close()
+        with lock:
+            stats[kind].extend(latencies)
+            stats[f'{kind}_errors'] += errors
+
+    @staticmethod
+    def write(alias, rng, posts):
+        """Лайк или комментарий со счетчиком: проверка, вставка, UPDATE в одной транзакции"""
+        post_id = rng.randint(1, posts)
+        user_id = rng.randint(1, 1_000_000)
+        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+            if rng.random() < 0.7:
+                cursor.execute('SELECT 1 FROM bench_like WHERE post_id = %s AND user_id = %s', [post_id, user_id])
+                if cursor.fetchone() is None:
+                    cursor.execute('INSERT INTO bench_like (post_id, user_id) VALUES (%s, %s)', [post_id, user_id])
+                    cursor.execute('UPDATE bench_post SET likes_count = likes_count + 1 WHERE id = %s', [post_id])
+            else:
+                cursor.execute(
+                    'INSERT INTO bench_comment (post_id, user_id, text) VALUES (%s, %s, %s)',
+                    [post_id, user_id, 'benchmark comment'],
+                )
+                cursor.execute('UPDATE bench_post SET comments_count = comments_count + 1 WHERE id = %s', [post_id])
+
+    @staticmethod
+    def read(alias, rng, posts):
+        """Популярные посты и комментарии поста"""
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT id, likes_count FROM bench_post ORDER BY likes_count DESC, id LIMIT 20')
+            cursor.fetchall()
+            cursor.execute(
+                'SELECT id, text FROM bench_comment WHERE post_id = %s ORDER BY id DESC LIMIT 20',
+                [rng.randint(1, posts)],
+            )
+            cursor.fetchall()
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
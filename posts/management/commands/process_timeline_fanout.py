@@ -0,0 +1,48 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Фоновый воркер: раскладывает посты авторов с большим числом подписчиков по лентам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=timeline.TIMELINE_BATCH_SIZE,
+            help='Сколько подписчиков обрабатывать за одну транзакцию',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать текущую очередь и выйти',
+        )
+
+    def handle(self, *args, batch_size, interval, once, **options):
+        total = 0
+        while True:
+            stats = timeline.drain_fan_out(batch_size=batch_size)
+            if stats['jobs']:
+                total += stats['owners']
+                line = (
+                    f"jobs={stats['jobs']} "
+                    f"owners={stats['owners']} "
+                    f"duration={stats['duration']:.3f}s"
+                )
+                logger.info('timeline fan-out batch: %s', line)
+                if options['verbosity'] > 1:
+                    self.stdout.write(line)
+                continue
+
+            if once:
+                break
+            time.sleep(interval)
+
+        self.stdout.write(self.style.SUCCESS(f'Добавлено записей в ленты: {total}'))
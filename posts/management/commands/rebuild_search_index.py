@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс по подписям постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько постов индексировать за один запрос',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        backend = get_backend()
+        total = backend.rebuild(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'{type(backend).__name__}: проиндексировано постов: {total}'
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='usernames', default=[],
+            help='Пересобрать ленту только для указанного пользователя (можно несколько раз)',
+        )
+        parser.add_argument(
+            '--trim-only', action='store_true',
+            help='Только обрезать ленты до TIMELINE_MAX_LENGTH',
+        )
+
+    def handle(self, *args, usernames, trim_only, **options):
+        users = User.objects.all()
+        if usernames:
+            users = users.filter(username__in=usernames)
+
+        processed = trimmed = 0
+        for user_id in users.values_list('id', flat=True).iterator():
+            if trim_only:
+                trimmed += timeline.trim(user_id)
+            else:
+                timeline.rebuild(user_id)
+            processed += 1
+
+        if trim_only:
+            self.stdout.write(self.style.SUCCESS(
+                f'Обрезано лент: {processed}, удалено записей: {trimmed}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Пересобрано лент: {processed}'))
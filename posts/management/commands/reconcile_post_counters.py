@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает Post.likes_count, Post.comments_count, Comment.replies_count и чинит расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько постов пересчитывать за один запрос',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        fixed = counters.reconcile(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Исправлено постов: {fixed}'))
+        fixed = counters.reconcile_replies(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Исправлено комментариев: {fixed}'))
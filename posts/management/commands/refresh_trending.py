@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинг популярных постов с затуханием по времени'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать все посты окна (например, после смены TRENDING_HALF_LIFE)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько постов пересчитывать за один запрос',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Повторять пересчет каждые N секунд',
+        )
+
+    def handle(self, *args, full, batch_size, interval, **options):
+        while True:
+            stats = trending.refresh(full=full, batch_size=batch_size)
+            self.stdout.write(self.style.SUCCESS(
+                f"Обновлено: {stats['updated']}, удалено: {stats['removed']}, "
+                f"время: {stats['duration']:.3f}s"
+            ))
+            if interval is None:
+                break
+            full = False
+            time.sleep(interval)
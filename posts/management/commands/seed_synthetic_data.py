@@ -0,0 +1,63 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет БД синтетическими пользователями, подписками (степенной закон), '
+        'постами, лайками, комментариями и уведомлениями; итог - JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--preset', choices=sorted(synthetic.PRESETS), default='small')
+        for name in synthetic.PRESETS['small']:
+            parser.add_argument(f'--{name}', type=int, default=None, help=f'Число строк {name} вместо пресета')
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Строк в одном bulk_create')
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного закона популярности аккаунтов и постов',
+        )
+        parser.add_argument('--days', type=int, default=30, help='За сколько дней разбросать даты')
+        parser.add_argument(
+            '--timelines', type=int, default=1000,
+            help='Для скольких пользователей собрать ленты (зрители ленты в benchmark_api)',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересобирать счетчики, ленты, рейтинг и поисковые индексы',
+        )
+
+    def handle(self, *args, preset, batch_size, exponent, days, timelines, seed, skip_derived, **options):
+        counts = {
+            name: options[name] if options[name] is not None else default
+            for name, default in synthetic.PRESETS[preset].items()
+        }
+        reported = {}
+
+        def progress(model, written):
+            # Не чаще раза на ~10 пачек, чтобы не засорять вывод
+            step = batch_size * 10
+            if written // step != reported.get(model, 0) // step:
+                self.stderr.write(f'{model._meta.label}: {written}')
+            reported[model] = written
+
+        started = time.monotonic()
+        generator = synthetic.Generator(
+            counts, batch_size=batch_size, exponent=exponent, days=days, timelines=timelines, seed=seed,
+            progress=progress,
+        )
+        stages = generator.run(derived=not skip_derived)
+        self.stdout.write(json.dumps({
+            'preset': preset,
+            'counts': counts,
+            'seed': seed,
+            'exponent': exponent,
+            'first_user_id': generator.first_user,
+            'stages': stages,
+            'seconds': round(time.monotonic() - started, 3),
+        }, indent=2))
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:56
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def encode_segment(value):
+    # Копия posts.threads.encode_segment на момент миграции
+    alphabet = '0123456789abcdefghijklmnopqrstuvwxyz'
+    digits = []
+    while value:
+        value, remainder = divmod(value, 36)
+        digits.append(alphabet[remainder])
+    return ''.join(reversed(digits)).rjust(8, '0')
+
+
+def fill_threads(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+
+    # Пути проставляем по уровням: сначала корни, затем их ответы и т.д.
+    paths = {}
+    level = list(Comment.objects.filter(parent=None).values_list('id', flat=True))
+    depth = 0
+    while level:
+        next_level = []
+        for start in range(0, len(level), 1000):
+            chunk = level[start:start + 1000]
+            batch = []
+            for comment in Comment.objects.filter(id__in=chunk).only('id', 'parent_id'):
+                comment.path = paths.get(comment.parent_id, '') + encode_segment(comment.id)
+                comment.depth = depth
+                paths[comment.id] = comment.path
+                batch.append(comment)
+            Comment.objects.bulk_update(batch, ['path', 'depth'])
+            next_level += Comment.objects.filter(parent_id__in=chunk).values_list('id', flat=True)
+        level = next_level
+        depth += 1
+
+    replies = Comment.objects.filter(parent_id=OuterRef('pk')).order_by().values('parent_id').annotate(
+        c=Count('id')
+    ).values('c')
+    Comment.objects.update(replies_count=Coalesce(Subquery(replies), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_post_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='replies_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+        migrations.RunPython(fill_threads, migrations.RunPython.noop),
+    ]
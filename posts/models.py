@@ -26,14 +26,38 @@ class Post(models.Model):
         blank=True,
     )
 
+    # Денормализованные счетчики, обновляются через F() в posts/signals.py
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Уменьшенные копии image, их пишет фоновый воркер (images/pipeline.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Поля, которые меняются только через update() в обход save()
+    DERIVED_FIELDS = ('likes_count', 'comments_count', 'image_variants')
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Post'
         verbose_name_plural = 'Posts'
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+            models.Index(fields=['-likes_count', '-id'], name='post_likes_count_idx'),
+        ]
 
     def __str__(self):
         return f'{self.author} - {self.created_at}'
 
+    def save(self, *args, **kwargs):
+        # Обычное сохранение не должно затирать эти поля устаревшими значениями
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DERIVED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -59,10 +83,163 @@ class Comment(models.Model):
         related_name='replies'
     )
 
+    # Материализованный путь: id предков и самого комментария сегментами
+    # фиксированной ширины (posts/threads.py). Поддерево комментария -
+    # диапазон path по индексу (post, path), сортировка по path - обход
+    # ветки в глубину.
+    path = models.CharField(max_length=255, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Денормализованное число прямых ответов, обновляется через F() в posts/signals.py
+    replies_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Поля, которые меняются только через update() в обход save()
+    DERIVED_FIELDS = ('path', 'depth', 'replies_count')
+
     class Meta:
         ordering = ['created_at']
         verbose_name = 'Comment'
         verbose_name_plural = 'Comments'
+        indexes = [
+            models.Index(fields=['post', 'parent', 'created_at', 'id'], name='comment_post_created_idx'),
+            models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.author} - {self.text[:50]}...'
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if not adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DERIVED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+        if adding and not self.path:
+            # Путь включает собственный id, поэтому пишется после INSERT
+            from .threads import assign_path
+            assign_path(self)
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок (fan-out on write)"""
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    # Копия Post.created_at, чтобы лента читалась по одному индексу
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        verbose_name = 'Timeline entry'
+        verbose_name_plural = 'Timeline entries'
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'post'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-id'], name='timeline_owner_created_idx'),
+            models.Index(fields=['owner', 'author'], name='timeline_owner_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.owner} <- {self.post_id}'
+
+
+class FanOutJob(models.Model):
+    """
+    Отложенная раскладка поста автора с большим числом подписчиков
+    (posts/timeline.py, manage.py process_timeline_fanout). Подписчики
+    обходятся по возрастанию user_id, last_owner_id - где остановились.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    last_owner_id = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Fan-out job'
+        verbose_name_plural = 'Fan-out jobs'
+
+    def __str__(self):
+        return f'{self.post_id} > {self.last_owner_id}'
+
+
+class FTSMatchField(models.TextField):
+    """Скрытый столбец FTS5 с именем таблицы: по нему пишется MATCH"""
+
+
+@FTSMatchField.register_lookup
+class FTSMatch(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
+
+
+class PostSearchEntry(models.Model):
+    """
+    Строка FTS5-индекса подписей (только SQLite, posts/search.py). Таблицу
+    создает миграция 0006_post_search_index, модель нужна, чтобы поиск
+    присоединял индекс одним JOIN и брал rank из того же MATCH.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        db_constraint=False,
+        related_name='search_entry'
+    )
+    caption = models.TextField()
+    fts = FTSMatchField(db_column='posts_post_fts')
+    # bm25() строки для текущего MATCH: меньше - релевантнее
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_post_fts'
+
+
+class TrendingScore(models.Model):
+    """Предрасчитанный рейтинг поста с затуханием по времени (posts/trending.py)"""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending_score'
+    )
+    score = models.FloatField()
+    # Снимок счетчиков, по которому пересчет находит изменившиеся посты
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    post_created_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Trending score'
+        verbose_name_plural = 'Trending scores'
+        indexes = [
+            models.Index(fields=['-score', '-post'], name='trending_score_idx'),
+            models.Index(fields=['post_created_at'], name='trending_created_idx'),
+        ]
 
     def __str__(self):
-        return f'{self.author} - {self.text[:50]}...'
\ No newline at end of file
+        return f'{self.post_id}: {self.score:.3f}'
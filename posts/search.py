@@ -0,0 +1,158 @@
+"""
+Полнотекстовый поиск по подписям постов.
+
+Бэкенд выбирается настройкой POSTS_SEARCH_BACKEND, по умолчанию - по
+движку БД: FTS5 для SQLite, tsvector для PostgreSQL, icontains для
+остальных. Каждый бэкенд фильтрует queryset и добавляет аннотацию
+search_rank (меньше - релевантнее), по которой работает keyset пагинация.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, FloatField, Value
+from django.utils.module_loading import import_string
+
+from .models import Post
+
+# Сколько слов запроса учитывать
+MAX_QUERY_TERMS = 10
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def query_terms(query):
+    return _TERM_RE.findall(query or '')[:MAX_QUERY_TERMS]
+
+
+class BaseSearchBackend:
+    def filter(self, queryset, query):
+        """Отфильтровать посты по запросу и добавить аннотацию search_rank"""
+        raise NotImplementedError
+
+    def empty(self, queryset):
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+
+    def index(self, post):
+        """Обновить пост в индексе (создание и редактирование)"""
+
+    def remove(self, post_id):
+        """Удалить пост из индекса"""
+
+    def rebuild(self, batch_size=1000):
+        """Перестроить индекс целиком, возвращает количество постов"""
+        return 0
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Без индекса: LIKE по подписи, без ранжирования по релевантности"""
+
+    def filter(self, queryset, query):
+        terms = query_terms(query)
+        if not terms:
+            return self.empty(queryset)
+        for term in terms:
+            queryset = queryset.filter(caption__icontains=term)
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    SQLite FTS5: виртуальная таблица posts_post_fts(rowid = Post.id),
+    в запросах - через PostSearchEntry. Индекс обновляется из сигналов
+    posts/signals.py.
+    """
+    table = 'posts_post_fts'
+
+    def match_expression(self, query):
+        terms = query_terms(query)
+        if not terms:
+            return None
+        # Последнее слово ищем по префиксу - запрос набирается по мере ввода
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def filter(self, queryset, query):
+        expression = self.match_expression(query)
+        if expression is None:
+            return self.empty(queryset)
+        # Один MATCH в JOIN: rank (bm25) берется из той же выборки индекса
+        return queryset.filter(search_entry__fts__match=expression).annotate(
+            search_rank=F('search_entry__rank'),
+        )
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [post.pk])
+            if post.caption:
+                cursor.execute(
+                    f'INSERT INTO {self.table} (rowid, caption) VALUES (%s, %s)',
+                    [post.pk, post.caption],
+                )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [post_id])
+
+    def rebuild(self, batch_size=1000):
+        total = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            posts = Post.objects.exclude(caption__isnull=True).exclude(caption='').order_by('pk')
+            rows = []
+            for row in posts.values_list('pk', 'caption').iterator(chunk_size=batch_size):
+                rows.append(row)
+                if len(rows) >= batch_size:
+                    cursor.executemany(f'INSERT INTO {self.table} (rowid, caption) VALUES (%s, %s)', rows)
+                    total += len(rows)
+                    rows = []
+            if rows:
+                cursor.executemany(f'INSERT INTO {self.table} (rowid, caption) VALUES (%s, %s)', rows)
+                total += len(rows)
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+        return total
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    PostgreSQL: to_tsvector по подписи с GIN-индексом по выражению
+    (создается миграцией), индекс поддерживает сама БД.
+    """
+    config = 'simple'
+
+    def filter(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        terms = query_terms(query)
+        if not terms:
+            return self.empty(queryset)
+        # Последнее слово ищем по префиксу, как и в FTS5
+        raw = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+        search_query = SearchQuery(raw, config=self.config, search_type='raw')
+        vector = SearchVector('caption', config=self.config)
+        return queryset.annotate(
+            search_vector=vector,
+        ).filter(
+            search_vector=search_query
+        ).annotate(
+            search_rank=-SearchRank(vector, search_query)
+        )
+
+
+DEFAULT_BACKENDS = {
+    'sqlite': 'posts.search.SQLiteFTSBackend',
+    'postgresql': 'posts.search.PostgresSearchBackend',
+}
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'POSTS_SEARCH_BACKEND', None) or DEFAULT_BACKENDS.get(
+            connection.vendor, 'posts.search.SimpleSearchBackend'
+        )
+        _backend = import_string(path)()
+    return _backend
@@ -1,34 +1,33 @@
 from rest_framework import serializers
 from .models import Post, Comment
+from .threads import validate_parent
 from users.models import User
+from images.serializers import ImageVariantsField, UploadSessionField, UploadSessionSerializerMixin
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(UploadSessionSerializerMixin, serializers.ModelSerializer):
     author = serializers.StringRelatedField(read_only=True)
-    likes_count = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
+    # Файл из сессии дозагрузки вместо image (images/views.py)
+    upload = UploadSessionField()
+    upload_target = 'image'
 
     class Meta:
         model = Post
-        fields = ('id', 'author', 'image', 'caption', 'likes_count', 'comments_count', 'created_at')
-
-    def get_likes_count(self, obj):
-        return obj.likes.count()
-    
-    def get_comments_count(self, obj):
-        return obj.comments.count()
+        fields = (
+            'id', 'author', 'image', 'image_variants', 'upload', 'caption',
+            'likes_count', 'comments_count', 'created_at'
+        )
 
 
 class CommentSerializer(serializers.ModelSerializer):
     author = serializers.StringRelatedField(read_only=True)
-    replies_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
-        fields = ('id', 'author', 'text', 'created_at', 'updated_at', 'parent', 'replies_count')
-
-    def get_replies_count(self, obj):
-        return obj.replies.count()
+        fields = ('id', 'author', 'text', 'created_at', 'updated_at', 'parent', 'depth', 'replies_count')
+        # Перенос в другую ветку сломал бы материализованные пути
+        read_only_fields = ('parent',)
 
 
 class CommentCreateSerializer(serializers.ModelSerializer):
@@ -36,7 +35,11 @@ class CommentCreateSerializer(serializers.ModelSerializer):
         model = Comment
         fields = ('text', 'parent')
 
+    def validate(self, attrs):
+        validate_parent(attrs.get('parent'), int(self.context['view'].kwargs['post_id']))
+        return attrs
+
     def create(self, validated_data):
+        # post передается из view через serializer.save(post=...)
         validated_data['author'] = self.context['request'].user
-        validated_data['post'] = self.context['post']
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
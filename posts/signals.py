@@ -0,0 +1,139 @@
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.db.models.functions import Now
+from django.dispatch import receiver
+
+from .models import Post, Comment, TimelineEntry
+from . import counters, timeline
+from .search import get_backend as get_search_backend
+from users.models import Profile, User
+from users.versions import bump_feed
+from api.cache import invalidate
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    """Раскладываем новый пост по лентам подписчиков"""
+    if created:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def bump_feeds_on_post_edit(sender, instance, created, **kwargs):
+    """Содержимое поста изменилось - меняем версии лент, где он лежит"""
+    if not created:
+        timeline.bump_post_readers([instance.pk])
+
+
+@receiver(post_save, sender=Post)
+def index_post_caption(sender, instance, update_fields=None, **kwargs):
+    """Обновляем поисковый индекс при создании и редактировании поста"""
+    if update_fields is None or 'caption' in update_fields:
+        get_search_backend().index(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_cache(sender, instance, **kwargs):
+    """Сбрасываем кэш ответов поста и страниц автора"""
+    invalidate(f'post:{instance.pk}', f'user:{instance.author_id}')
+
+
+@receiver(pre_delete, sender=Post)
+def bump_feeds_on_post_delete(sender, instance, **kwargs):
+    """Пост уходит из лент каскадом - меняем версии этих лент"""
+    timeline.bump_post_readers([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    """Убираем удаленный пост из поискового индекса"""
+    get_search_backend().remove(instance.pk)
+
+
+@receiver(m2m_changed, sender=Profile.following.through)
+def sync_timeline_on_follow(sender, instance, action, reverse, pk_set, **kwargs):
+    """Дополняем или чистим ленту при подписке/отписке"""
+    if action == 'post_clear':
+        if reverse:
+            entries = TimelineEntry.objects.filter(author_id=instance.user_id)
+        else:
+            entries = TimelineEntry.objects.filter(owner_id=instance.user_id)
+        bump_feed(list(entries.values_list('owner_id', flat=True).distinct()))
+        entries.delete()
+        return
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+
+    other_user_ids = Profile.objects.filter(pk__in=pk_set).values_list('user_id', flat=True)
+    if reverse:
+        # instance - тот, на кого подписываются; pk_set - подписчики
+        pairs = [(owner_id, instance.user_id) for owner_id in other_user_ids]
+    else:
+        pairs = [(instance.user_id, author_id) for author_id in other_user_ids]
+
+    for owner_id, author_id in pairs:
+        if action == 'post_add':
+            timeline.backfill(owner_id, author_id)
+        else:
+            timeline.remove_author(owner_id, author_id)
+
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def sync_likes_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """Обновляем Post.likes_count при лайке/анлайке"""
+    if action in ('pre_remove', 'pre_clear'):
+        # Запоминаем, какие лайки реально существуют, чтобы не уйти в минус
+        if reverse:
+            likes = counters.Like.objects.filter(user_id=instance.pk)
+            if pk_set is not None:
+                likes = likes.filter(post_id__in=pk_set)
+        else:
+            likes = counters.Like.objects.filter(post_id=instance.pk)
+            if pk_set is not None:
+                likes = likes.filter(user_id__in=pk_set)
+        instance._removed_like_post_ids = list(likes.values_list('post_id', flat=True))
+
+    elif action == 'post_add' and pk_set:
+        if reverse:
+            counters.change_likes(pk_set, 1)
+        else:
+            counters.change_likes([instance.pk], len(pk_set))
+
+    elif action in ('post_remove', 'post_clear'):
+        post_ids = instance.__dict__.pop('_removed_like_post_ids', [])
+        if reverse:
+            counters.change_likes(post_ids, -1)
+        else:
+            counters.change_likes([instance.pk], -len(post_ids))
+
+
+@receiver(post_save, sender=Comment)
+def increment_comments_count(sender, instance, created, **kwargs):
+    """Увеличиваем Post.comments_count и replies_count родителя при новом комментарии"""
+    if created:
+        counters.change_comments(instance.post_id, 1)
+        if instance.parent_id is not None:
+            counters.change_replies(instance.parent_id, 1)
+
+
+@receiver(post_save, sender=Comment)
+def touch_post_on_comment_edit(sender, instance, created, **kwargs):
+    """Правка комментария меняет Post.updated_at - по нему проверяется список комментариев"""
+    if not created:
+        Post.objects.filter(pk=instance.post_id).update(updated_at=Now())
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comments_count(sender, instance, **kwargs):
+    """Уменьшаем Post.comments_count и replies_count родителя при удалении комментария"""
+    counters.change_comments(instance.post_id, -1)
+    if instance.parent_id is not None:
+        counters.change_replies(instance.parent_id, -1)
+
+
+@receiver(pre_delete, sender=User)
+def release_user_likes(sender, instance, **kwargs):
+    """Лайки удаляемого пользователя уходят каскадом без m2m_changed"""
+    post_ids = list(counters.Like.objects.filter(user_id=instance.pk).values_list('post_id', flat=True))
+    counters.change_likes(post_ids, -1)
@@ -0,0 +1,316 @@
+"""
+Синтетические данные для бенчмарков (manage.py seed_synthetic_data,
+manage.py benchmark_api).
+
+Строки генерируются потоком и пишутся bulk_create пачками, в памяти
+держится одна пачка и массив авторов постов. id задаются явно (после
+текущего максимума таблицы), поэтому подписки, лайки и комментарии
+ссылаются на пользователей и посты без чтения из БД, а пути комментариев
+(posts/threads.py) известны до вставки.
+
+Популярность аккаунтов и постов - степенной закон, как в
+users/suggestions.synthetic_graph: немного знаменитостей и вирусных
+постов, длинный хвост остальных. Денормализованные данные (счетчики,
+рейтинг, поисковые индексы) после вставки пересобираются штатными
+командами. Ленты (posts/timeline.py) собираются только для первых
+timelines пользователей набора: лента - до TIMELINE_MAX_LENGTH строк на
+пользователя, на миллионе это сотни миллионов строк. benchmark_api
+берет зрителей ленты из тех, у кого она есть.
+"""
+import io
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from notifications.models import Notification
+from notifications.outbox import format_message
+from users.counters import Follow
+from users.models import Profile, User
+
+from .counters import Like
+from . import timeline
+from .models import Comment, Post
+from .threads import encode_segment
+
+PRESETS = {
+    'small': {
+        'users': 10_000, 'follows': 100_000, 'posts': 50_000,
+        'likes': 500_000, 'comments': 100_000, 'notifications': 100_000,
+    },
+    'medium': {
+        'users': 100_000, 'follows': 1_000_000, 'posts': 500_000,
+        'likes': 5_000_000, 'comments': 1_000_000, 'notifications': 1_000_000,
+    },
+    'large': {
+        'users': 1_000_000, 'follows': 10_000_000, 'posts': 5_000_000,
+        'likes': 50_000_000, 'comments': 5_000_000, 'notifications': 5_000_000,
+    },
+}
+
+# Слова подписей; benchmark_api ищет по ним же
+VOCABULARY = (
+    'sunset', 'beach', 'coffee', 'morning', 'city', 'night', 'mountains', 'forest', 'friends', 'family',
+    'travel', 'summer', 'winter', 'autumn', 'spring', 'food', 'pizza', 'dinner', 'breakfast', 'cat',
+    'dog', 'puppy', 'art', 'music', 'concert', 'festival', 'wedding', 'birthday', 'party', 'weekend',
+    'workout', 'running', 'yoga', 'bike', 'road', 'lake', 'river', 'ocean', 'snow', 'rain',
+    'flowers', 'garden', 'street', 'architecture', 'museum', 'book', 'reading', 'design', 'fashion', 'style',
+    'selfie', 'portrait', 'landscape', 'vacation', 'holiday', 'home', 'kitchen', 'baking', 'cake', 'tea',
+)
+COMMENTS = ('Класс!', 'Очень красиво', 'Где это?', 'Супер', 'Вау', 'Отличное фото', 'Хочу туда же')
+SYNTHETIC_PASSWORD = 'synthetic'
+# Доля комментариев, которые отвечают на комментарий из той же пачки
+REPLY_RATE = 0.2
+# Множитель для перестановки номеров: знаменитости не идут подряд по id
+_SPREAD = 2654435761
+
+
+class PowerLaw:
+    """
+    Номер из [0, n) с вероятностью ~ 1/(k+1)^exponent. Обратная функция
+    распределения непрерывного закона, без таблицы весов в памяти.
+    """
+
+    def __init__(self, n, exponent, rng):
+        self.n = n
+        self.exponent = exponent
+        self.rng = rng
+        self.tail = n ** (1 - exponent) - 1 if exponent != 1 else None
+
+    def __call__(self):
+        u = self.rng.random()
+        if self.tail is None:
+            rank = self.n ** u
+        else:
+            rank = (self.tail * u + 1) ** (1 / (1 - self.exponent))
+        index = min(int(rank) - 1, self.n - 1)
+        # Биекция на [0, n), пока n не кратно _SPREAD (простое число)
+        return (index * _SPREAD) % self.n
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Отключить auto_now/auto_now_add, чтобы даты разнесло по периоду"""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field, _, _ in saved:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def next_id(model):
+    return (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+
+def reset_sequences(*models):
+    """После явных id сдвинуть последовательности (PostgreSQL), как loaddata"""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+def bulk_insert(model, rows, batch_size, ignore_conflicts=False, progress=None):
+    """Записать поток объектов пачками; возвращает число отправленных строк"""
+    rows = iter(rows)
+    written = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return written
+        with transaction.atomic():
+            model.objects.bulk_create(batch, ignore_conflicts=ignore_conflicts)
+        written += len(batch)
+        if progress is not None:
+            progress(model, written)
+
+
+class Generator:
+    """Генерация одного набора данных; seed делает его воспроизводимым"""
+
+    def __init__(self, counts, batch_size=10_000, exponent=1.1, days=30, timelines=1000, seed=0, progress=None):
+        self.counts = counts
+        self.timelines = timelines
+        self.batch_size = batch_size
+        self.exponent = exponent
+        self.progress = progress
+        self.now = timezone.now()
+        self.period = timedelta(days=days).total_seconds()
+        self.rng = random.Random(seed)
+
+    def timestamp(self):
+        return self.now - timedelta(seconds=self.rng.random() * self.period)
+
+    def username(self, index):
+        return f'synth{self.first_user + index}'
+
+    def run(self, derived=True):
+        self.first_user = next_id(User)
+        self.first_post = next_id(Post)
+        self.first_comment = next_id(Comment)
+        self.first_profile = next_id(Profile)
+
+        stages = {}
+        stages_order = (
+            ('users', User, self.users, False),
+            ('profiles', Profile, self.profiles, False),
+            ('follows', Follow, self.follows, True),
+            ('posts', Post, self.posts, False),
+            ('likes', Like, self.likes, True),
+            ('comments', Comment, self.comments, False),
+            ('notifications', Notification, self.notifications, False),
+        )
+        timestamps = (
+            User._meta.get_field('date_joined'),
+            Post._meta.get_field('created_at'), Post._meta.get_field('updated_at'),
+            Comment._meta.get_field('created_at'), Comment._meta.get_field('updated_at'),
+            Notification._meta.get_field('created_at'), Notification._meta.get_field('updated_at'),
+        )
+        with explicit_timestamps(*timestamps):
+            for name, model, rows, ignore_conflicts in stages_order:
+                started = time.monotonic()
+                written = bulk_insert(model, rows(), self.batch_size, ignore_conflicts, self.progress)
+                stages[name] = {'rows': written, 'seconds': round(time.monotonic() - started, 3)}
+        reset_sequences(User, Profile, Post, Comment)
+
+        if derived:
+            stages.update(self.rebuild_derived())
+        return stages
+
+    def rebuild_derived(self):
+        """Счетчики, ленты, рейтинг и индексы - штатными командами"""
+        stages = {}
+        for name, command, options in (
+            ('profile_counters', 'reconcile_profile_counters', {}),
+            ('post_counters', 'reconcile_post_counters', {}),
+            ('trending', 'refresh_trending', {'full': True}),
+            ('post_search_index', 'rebuild_search_index', {}),
+            ('user_search_index', 'rebuild_user_search_index', {}),
+        ):
+            started = time.monotonic()
+            call_command(command, stdout=io.StringIO(), **options)
+            stages[name] = {'seconds': round(time.monotonic() - started, 3)}
+
+        started = time.monotonic()
+        owners = min(self.timelines, self.counts['users'])
+        for index in range(owners):
+            timeline.rebuild(self.first_user + index)
+        stages['timelines'] = {'rows': owners, 'seconds': round(time.monotonic() - started, 3)}
+        return stages
+
+    def users(self):
+        # Хэш один на всех: PBKDF2 на каждого пользователя - часы на миллионе
+        password = make_password(SYNTHETIC_PASSWORD)
+        for index in range(self.counts['users']):
+            username = self.username(index)
+            yield User(
+                id=self.first_user + index,
+                email=f'{username}@example.com',
+                username=username,
+                first_name=self.rng.choice(VOCABULARY).capitalize(),
+                password=password,
+                date_joined=self.timestamp(),
+            )
+
+    def profiles(self):
+        # Номер профиля в наборе совпадает с номером пользователя
+        for index in range(self.counts['users']):
+            yield Profile(id=self.first_profile + index, user_id=self.first_user + index)
+
+    def follows(self):
+        users = self.counts['users']
+        popular = PowerLaw(users, self.exponent, self.rng)
+        for _ in range(self.counts['follows']):
+            source, target = self.rng.randrange(users), popular()
+            if source != target:
+                # Повторы отбрасывает уникальный индекс (ignore_conflicts)
+                yield Follow(
+                    from_profile_id=self.first_profile + source, to_profile_id=self.first_profile + target,
+                )
+
+    def posts(self):
+        users = self.counts['users']
+        authors = PowerLaw(users, self.exponent, self.rng)
+        # Автор и дата каждого поста - для уведомлений без чтения из БД
+        self.post_authors = array('L')
+        for index in range(self.counts['posts']):
+            author = authors()
+            self.post_authors.append(author)
+            created_at = self.timestamp()
+            words = self.rng.sample(VOCABULARY, self.rng.randint(2, 6))
+            yield Post(
+                id=self.first_post + index,
+                author_id=self.first_user + author,
+                caption=' '.join(words),
+                created_at=created_at,
+                updated_at=created_at,
+            )
+
+    def likes(self):
+        users = self.counts['users']
+        posts = PowerLaw(self.counts['posts'], self.exponent, self.rng)
+        for _ in range(self.counts['likes']):
+            yield Like(post_id=self.first_post + posts(), user_id=self.first_user + self.rng.randrange(users))
+
+    def comments(self):
+        users = self.counts['users']
+        posts = PowerLaw(self.counts['posts'], self.exponent, self.rng)
+        recent = []
+        for index in range(self.counts['comments']):
+            pk = self.first_comment + index
+            created_at = self.timestamp()
+            parent = self.rng.choice(recent) if recent and self.rng.random() < REPLY_RATE else None
+            if parent is None:
+                comment = Comment(
+                    id=pk, post_id=self.first_post + posts(), path=encode_segment(pk), depth=0,
+                )
+            else:
+                comment = Comment(
+                    id=pk, post_id=parent.post_id, parent_id=parent.pk,
+                    path=parent.path + encode_segment(pk), depth=parent.depth + 1,
+                )
+            comment.author_id = self.first_user + self.rng.randrange(users)
+            comment.text = self.rng.choice(COMMENTS)
+            comment.created_at = comment.updated_at = created_at
+            # Ответы только на неглубокие комментарии из текущей пачки
+            if comment.depth < 3:
+                recent.append(comment)
+            if len(recent) > self.batch_size:
+                recent = recent[-self.batch_size // 2:]
+            yield comment
+
+    def notifications(self):
+        users = self.counts['users']
+        posts = PowerLaw(self.counts['posts'], self.exponent, self.rng)
+        for _ in range(self.counts['notifications']):
+            post = posts()
+            sender = self.rng.randrange(users)
+            username = self.username(sender)
+            notification_type = self.rng.choice(('like', 'like', 'like', 'comment', 'follow'))
+            created_at = self.timestamp()
+            yield Notification(
+                recipient_id=self.first_user + self.post_authors[post],
+                sender_id=self.first_user + sender,
+                notification_type=notification_type,
+                message=format_message(notification_type, username, 1),
+                post_id=None if notification_type == 'follow' else self.first_post + post,
+                is_read=self.rng.random() < 0.7,
+                actor_count=1,
+                sample_actors=[{'id': self.first_user + sender, 'username': username}],
+                actor_ids=[self.first_user + sender],
+                created_at=created_at,
+                updated_at=created_at,
+            )
@@ -1,3 +1,194 @@
+import time
+from unittest import mock
+
 from django.test import TestCase
 
-# Create your tests here.
+from notifications.models import Notification
+from users.models import Profile, User
+
+from . import synthetic, timeline, views
+from .likes import add_like
+from .models import Comment, FanOutJob, Post, TimelineEntry
+from .threads import subtree
+
+COUNTS = {'users': 40, 'follows': 300, 'posts': 80, 'likes': 400, 'comments': 120, 'notifications': 60}
+
+
+class SyntheticDataTests(TestCase):
+    def seed(self, seed=0):
+        generator = synthetic.Generator(COUNTS, batch_size=25, timelines=5, seed=seed)
+        return generator, generator.run()
+
+    def posts(self, generator):
+        # id идут после уже существующих строк, сравниваем смещения
+        return [
+            (author_id - generator.first_user, caption, created_at - generator.now)
+            for author_id, caption, created_at in Post.objects.filter(
+                id__gte=generator.first_post, id__lt=generator.first_post + COUNTS['posts'],
+            ).order_by('id').values_list('author_id', 'caption', 'created_at')
+        ]
+
+    def test_seed_is_consistent(self):
+        _, stages = self.seed()
+        self.assertEqual(stages['posts']['rows'], COUNTS['posts'])
+        self.assertEqual(Profile.objects.count(), COUNTS['users'])
+
+        # Счетчики пересчитаны по вставленным строкам
+        post = Post.objects.order_by('-likes_count').first()
+        self.assertEqual(post.likes_count, post.likes.count())
+        profile = Profile.objects.order_by('-followers_count').first()
+        self.assertEqual(profile.followers_count, profile.followers.count())
+
+        # Пути ответов согласованы с posts/threads.py
+        reply = Comment.objects.filter(parent__isnull=False).select_related('parent').first()
+        self.assertIn(reply, subtree(reply.parent))
+        self.assertEqual(reply.depth, reply.parent.depth + 1)
+
+        self.assertEqual(TimelineEntry.objects.values('owner').distinct().count(), 5)
+        self.assertTrue(Notification.objects.filter(recipient__posts__isnull=False).exists())
+
+    def test_same_seed_same_data(self):
+        first, _ = self.seed(seed=7)
+        second, _ = self.seed(seed=7)
+        self.assertEqual(self.posts(first), self.posts(second))
+        other, _ = self.seed(seed=8)
+        self.assertNotEqual(self.posts(first), self.posts(other))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice@example.com', 'alice', 'pw12345!!')
+        self.bob = User.objects.create_user('bob@example.com', 'bob', 'pw12345!!')
+        self.bob.profile.following.add(self.alice.profile)
+        self.post = Post.objects.create(author=self.alice, caption='orig')
+        self.client.force_login(self.bob)
+
+    def etag(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        return response['ETag']
+
+    def test_feed_etag_changes_on_post_edit(self):
+        path = '/api/v1/posts/feed/'
+        before = self.etag(path)
+        self.post.caption = 'edited'
+        self.post.save()
+        self.assertNotEqual(self.etag(path), before)
+
+    def test_feed_etag_expires_for_counters(self):
+        path = '/api/v1/posts/feed/'
+        before = self.etag(path)
+        later = time.time() + views.FEED_COUNTERS_MAX_STALENESS
+        with mock.patch('posts.views.time.time', return_value=later):
+            self.assertNotEqual(self.etag(path), before)
+
+    def test_comments_etag_changes_on_comment_edit(self):
+        path = f'/api/v1/posts/posts/{self.post.pk}/comments/'
+        comment = Comment.objects.create(post=self.post, author=self.bob, text='first')
+        before = self.etag(path)
+        # Правка в ту же секунду: ETag из Post.updated_at с микросекундами
+        comment.text = 'edited'
+        comment.save()
+        self.assertNotEqual(self.etag(path), before)
+
+
+class LikesListTests(TestCase):
+    def test_likes_paginated_newest_first(self):
+        alice = User.objects.create_user('alice@example.com', 'alice', 'pw12345!!')
+        users = [User.objects.create_user(f'u{n}@example.com', f'u{n}', 'pw12345!!') for n in range(3)]
+        post = Post.objects.create(author=alice, caption='post')
+        for user in users:
+            add_like(post, user)
+        path = f'/api/v1/posts/posts/{post.pk}/likes/'
+        response = self.client.get(path, {'page_size': 2})
+        self.assertEqual(response.data['likes_count'], 3)
+        self.assertEqual([u['username'] for u in response.data['results']], ['u2', 'u1'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([u['username'] for u in response.data['results']], ['u0'])
+        self.assertIsNone(response.data['next'])
+
+
+class PostSearchTests(TestCase):
+    def test_ranked_by_relevance_across_pages(self):
+        alice = User.objects.create_user('alice@example.com', 'alice', 'pw12345!!')
+        once = Post.objects.create(author=alice, caption='sunset over a long quiet beach with friends')
+        twice = Post.objects.create(author=alice, caption='sunset sunset')
+        Post.objects.create(author=alice, caption='cat')
+        path = '/api/v1/posts/posts/search/'
+        response = self.client.get(path, {'q': 'suns', 'page_size': 1})
+        self.assertEqual([post['id'] for post in response.data['results']], [twice.pk])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([post['id'] for post in response.data['results']], [once.pk])
+        self.assertIsNone(response.data['next'])
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice@example.com', 'alice', 'pw12345!!')
+        self.bob = User.objects.create_user('bob@example.com', 'bob', 'pw12345!!')
+        self.carol = User.objects.create_user('carol@example.com', 'carol', 'pw12345!!')
+
+    def feed(self, user):
+        return list(TimelineEntry.objects.filter(owner=user).values_list('post_id', flat=True))
+
+    def post(self, author):
+        # Порядок в ленте - created_at, затем id: созданные позже идут выше
+        return Post.objects.create(author=author, caption='post')
+
+    def test_fan_out_to_followers(self):
+        self.bob.profile.following.add(self.alice.profile)
+        version = self.bob.profile.feed_version
+        post = self.post(self.alice)
+        self.assertEqual(self.feed(self.bob), [post.pk])
+        self.assertEqual(self.feed(self.carol), [])
+        self.bob.profile.refresh_from_db()
+        self.assertGreater(self.bob.profile.feed_version, version)
+
+    def test_backfill_on_follow(self):
+        posts = [self.post(self.alice) for _ in range(3)]
+        with mock.patch.object(timeline.backfill, '__defaults__', (2,)):
+            self.bob.profile.following.add(self.alice.profile)
+        self.assertEqual(self.feed(self.bob), [posts[2].pk, posts[1].pk])
+
+    def test_remove_on_unfollow(self):
+        self.bob.profile.following.add(self.alice.profile, self.carol.profile)
+        self.post(self.alice)
+        carol_post = self.post(self.carol)
+        self.bob.profile.following.remove(self.alice.profile)
+        self.assertEqual(self.feed(self.bob), [carol_post.pk])
+
+    def test_fan_out_trims_timelines(self):
+        self.bob.profile.following.add(self.alice.profile)
+        self.carol.profile.following.add(self.alice.profile)
+        posts = [self.post(self.alice) for _ in range(3)]
+        with mock.patch.object(timeline, 'TIMELINE_MAX_LENGTH', 2), \
+                mock.patch.object(timeline, 'TIMELINE_BATCH_SIZE', 1):
+            newest = self.post(self.alice)
+        expected = [newest.pk, posts[2].pk]
+        self.assertEqual(self.feed(self.bob), expected)
+        self.assertEqual(self.feed(self.carol), expected)
+
+    def test_large_fan_out_deferred_to_worker(self):
+        self.bob.profile.following.add(self.alice.profile)
+        self.carol.profile.following.add(self.alice.profile)
+        with mock.patch.object(timeline, 'TIMELINE_INLINE_FANOUT_LIMIT', 1):
+            post = self.post(self.alice)
+        self.assertEqual(self.feed(self.bob), [])
+        self.assertEqual(FanOutJob.objects.get().post_id, post.pk)
+
+        self.assertEqual(timeline.drain_fan_out(batch_size=1)['owners'], 1)
+        self.assertEqual(len(self.feed(self.bob)) + len(self.feed(self.carol)), 1)
+        self.assertEqual(timeline.drain_fan_out(batch_size=1)['owners'], 1)
+        self.assertEqual(timeline.drain_fan_out(batch_size=1)['owners'], 0)
+        self.assertEqual(self.feed(self.bob), [post.pk])
+        self.assertEqual(self.feed(self.carol), [post.pk])
+        self.assertFalse(FanOutJob.objects.exists())
+
+    def test_trim_owners(self):
+        self.bob.profile.following.add(self.alice.profile)
+        self.carol.profile.following.add(self.alice.profile)
+        posts = [self.post(self.alice) for _ in range(3)]
+        self.assertEqual(timeline.trim_owners([self.bob.pk], max_length=1), 2)
+        self.assertEqual(self.feed(self.bob), [posts[2].pk])
+        self.assertEqual(len(self.feed(self.carol)), 3)
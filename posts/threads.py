@@ -0,0 +1,72 @@
+"""
+Ветки комментариев на материализованных путях.
+
+Comment.path - id всех предков и самого комментария, каждый записан
+сегментом фиксированной ширины в base36, поэтому сравнение строк
+совпадает с порядком id, а ответы лежат сразу после родителя:
+
+    0000002s            корень (id=100)
+    0000002s00000030    ответ (id=108)
+
+Поддерево - диапазон path >= p AND path < p + '~' по индексу (post, path),
+без LIKE и рекурсивных запросов: страница ветки на любой глубине
+читается одним запросом, сколько бы комментариев ни было у поста.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from .models import Comment
+
+PATH_SEGMENT_WIDTH = 8
+_ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyz'
+# Символ больше любой цифры base36 - верхняя граница диапазона поддерева
+_RANGE_END = '~'
+
+MAX_DEPTH = min(
+    getattr(settings, 'COMMENTS_MAX_DEPTH', 30),
+    Comment._meta.get_field('path').max_length // PATH_SEGMENT_WIDTH - 1,
+)
+
+
+def encode_segment(value):
+    digits = []
+    while value:
+        value, remainder = divmod(value, 36)
+        digits.append(_ALPHABET[remainder])
+    return ''.join(reversed(digits)).rjust(PATH_SEGMENT_WIDTH, '0')
+
+
+def validate_parent(parent, post_id):
+    """Ответ возможен только в той же ветке поста и до MAX_DEPTH"""
+    if parent is None:
+        return
+    if parent.post_id != post_id:
+        raise ValidationError('Родительский комментарий относится к другому посту.')
+    if parent.depth >= MAX_DEPTH:
+        raise ValidationError(f'Слишком глубокая ветка (максимум {MAX_DEPTH} уровней ответов).')
+
+
+def assign_path(comment):
+    """Записать path и depth только что созданного комментария"""
+    if comment.parent_id is None:
+        parent_path, depth = '', 0
+    else:
+        parent_path, parent_depth = Comment.objects.filter(
+            pk=comment.parent_id
+        ).values_list('path', 'depth').get()
+        depth = parent_depth + 1
+    comment.path = parent_path + encode_segment(comment.pk)
+    comment.depth = depth
+    Comment.objects.filter(pk=comment.pk).update(path=comment.path, depth=depth)
+
+
+def subtree(comment, max_depth=None):
+    """Ответы на комментарий на всех уровнях (без него самого), порядок - по path"""
+    replies = Comment.objects.filter(
+        post_id=comment.post_id,
+        path__gt=comment.path,
+        path__lt=comment.path + _RANGE_END,
+    )
+    if max_depth is not None:
+        replies = replies.filter(depth__lte=comment.depth + max_depth)
+    return replies.order_by('path')
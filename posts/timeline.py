@@ -0,0 +1,211 @@
+"""
+Материализованные ленты подписок (fan-out on write).
+
+Каждый новый пост раскладывается в ленты подписчиков автора при создании,
+поэтому /api/feed/ читает ленту одного пользователя по индексу
+(owner, -created_at) и не зависит от количества подписок. После каждой
+пачки раскладки ленты этой пачки обрезаются до TIMELINE_MAX_LENGTH.
+
+Раскладка в запросе автора - это вставка и обрезка на каждого подписчика
+в его транзакции. Поэтому сразу раскладываются только посты авторов, у
+которых не больше TIMELINE_INLINE_FANOUT_LIMIT подписчиков: их ленты
+видят пост сразу. Для остальных ставится FanOutJob, и подписчики
+получают пост с задержкой фонового воркера (manage.py
+process_timeline_fanout), зато публикация не зависит от их числа.
+"""
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from users.versions import bump_feed
+
+from .models import FanOutJob, Post, TimelineEntry
+
+# Сколько записей хранится в ленте одного пользователя
+TIMELINE_MAX_LENGTH = getattr(settings, 'TIMELINE_MAX_LENGTH', 800)
+# Сколько последних постов автора добавляется в ленту при подписке
+TIMELINE_BACKFILL_SIZE = getattr(settings, 'TIMELINE_BACKFILL_SIZE', 50)
+# Размер пачки для bulk_create при раскладке поста
+TIMELINE_BATCH_SIZE = getattr(settings, 'TIMELINE_BATCH_SIZE', 1000)
+# Посты авторов с большим числом подписчиков раскладывает фоновый воркер
+TIMELINE_INLINE_FANOUT_LIMIT = getattr(settings, 'TIMELINE_INLINE_FANOUT_LIMIT', 1000)
+
+
+def follower_user_ids(author_id):
+    """id пользователей, подписанных на автора"""
+    from users.models import Profile
+
+    return Profile.objects.filter(
+        following__user_id=author_id
+    ).values_list('user_id', flat=True)
+
+
+def fan_out_post(post):
+    """
+    Добавить новый пост в ленты подписчиков автора: сразу или, если их
+    больше TIMELINE_INLINE_FANOUT_LIMIT, через FanOutJob
+    """
+    from users.models import Profile
+
+    followers_count = Profile.objects.filter(
+        user_id=post.author_id
+    ).values_list('followers_count', flat=True).first() or 0
+    if followers_count > TIMELINE_INLINE_FANOUT_LIMIT:
+        FanOutJob.objects.create(post=post)
+        return
+
+    batch = []
+    with transaction.atomic():
+        for owner_id in follower_user_ids(post.author_id).iterator(chunk_size=TIMELINE_BATCH_SIZE):
+            batch.append(_entry(post, owner_id))
+            if len(batch) >= TIMELINE_BATCH_SIZE:
+                _insert_and_trim(batch)
+                batch = []
+        if batch:
+            _insert_and_trim(batch)
+        bump_feed(follower_user_ids(post.author_id))
+
+
+def fan_out_step(job, batch_size=TIMELINE_BATCH_SIZE):
+    """
+    Разложить пост задачи следующей пачке подписчиков в своей транзакции.
+    Возвращает число подписчиков в пачке; пустая пачка удаляет задачу.
+    """
+    post = Post.objects.filter(pk=job.post_id).only('id', 'author_id', 'created_at').first()
+    if post is None:
+        return 0
+    owner_ids = list(
+        follower_user_ids(post.author_id).filter(
+            user_id__gt=job.last_owner_id
+        ).order_by('user_id')[:batch_size]
+    )
+    with transaction.atomic():
+        if not owner_ids:
+            job.delete()
+            return 0
+        # Пачку уже взял другой воркер
+        if not FanOutJob.objects.filter(pk=job.pk, last_owner_id=job.last_owner_id).update(
+            last_owner_id=owner_ids[-1]
+        ):
+            return 0
+        _insert_and_trim([_entry(post, owner_id) for owner_id in owner_ids])
+        bump_feed(owner_ids)
+    job.last_owner_id = owner_ids[-1]
+    return len(owner_ids)
+
+
+def drain_fan_out(batch_size=TIMELINE_BATCH_SIZE):
+    """
+    Один проход по очереди FanOutJob: по пачке подписчиков на задачу.
+    Возвращает статистику прохода.
+    """
+    started = time.perf_counter()
+    jobs = list(FanOutJob.objects.order_by('id')[:batch_size])
+    owners = sum(fan_out_step(job, batch_size) for job in jobs)
+    return {'jobs': len(jobs), 'owners': owners, 'duration': time.perf_counter() - started}
+
+
+def _entry(post, owner_id):
+    return TimelineEntry(
+        owner_id=owner_id,
+        post_id=post.pk,
+        author_id=post.author_id,
+        created_at=post.created_at,
+    )
+
+
+def _insert_and_trim(entries):
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    trim_owners([entry.owner_id for entry in entries], TIMELINE_MAX_LENGTH)
+
+
+def backfill(owner_id, author_id, limit=TIMELINE_BACKFILL_SIZE):
+    """Добавить последние посты автора в ленту после подписки"""
+    posts = Post.objects.filter(author_id=author_id).order_by('-created_at')[:limit]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                owner_id=owner_id,
+                post_id=post_id,
+                author_id=author_id,
+                created_at=created_at,
+            )
+            for post_id, created_at in posts.values_list('id', 'created_at')
+        ],
+        ignore_conflicts=True,
+    )
+    trim(owner_id)
+    bump_feed([owner_id])
+
+
+def remove_author(owner_id, author_id):
+    """Убрать посты автора из ленты после отписки"""
+    TimelineEntry.objects.filter(owner_id=owner_id, author_id=author_id).delete()
+    bump_feed([owner_id])
+
+
+def bump_post_readers(post_ids):
+    """Увеличить версию лент, в которых лежат посты (после их правки)"""
+    bump_feed(TimelineEntry.objects.filter(post_id__in=post_ids).values('owner_id'))
+
+
+def trim(owner_id, max_length=TIMELINE_MAX_LENGTH):
+    """Обрезать ленту пользователя до max_length последних записей"""
+    entries = TimelineEntry.objects.filter(owner_id=owner_id).order_by('-created_at', '-id')
+    boundary = entries.values_list('created_at', 'id')[max_length:max_length + 1].first()
+    if boundary is None:
+        return 0
+    created_at, entry_id = boundary
+    deleted, _ = TimelineEntry.objects.filter(owner_id=owner_id, created_at__lt=created_at).delete()
+    extra, _ = TimelineEntry.objects.filter(
+        owner_id=owner_id, created_at=created_at, id__lte=entry_id
+    ).delete()
+    bump_feed([owner_id])
+    return deleted + extra
+
+
+def trim_owners(owner_ids, max_length=TIMELINE_MAX_LENGTH):
+    """
+    Обрезать ленты пачки пользователей одним DELETE: в каждой остаются
+    max_length последних записей. Версии лент не меняет - это делает
+    вызывающий код.
+    """
+    overflow = TimelineEntry.objects.filter(owner_id__in=owner_ids).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=F('owner_id'),
+            order_by=(F('created_at').desc(), F('id').desc()),
+        )
+    ).filter(position__gt=max_length).values('id')
+    deleted, _ = TimelineEntry.objects.filter(id__in=overflow).delete()
+    return deleted
+
+
+def rebuild(owner_id):
+    """Пересобрать ленту пользователя с нуля по текущим подпискам"""
+    from users.models import Profile
+
+    author_ids = Profile.objects.filter(
+        followers__user_id=owner_id
+    ).values_list('user_id', flat=True)
+    with transaction.atomic():
+        TimelineEntry.objects.filter(owner_id=owner_id).delete()
+        posts = Post.objects.filter(
+            author_id__in=author_ids
+        ).order_by('-created_at')[:TIMELINE_MAX_LENGTH]
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    owner_id=owner_id,
+                    post_id=post_id,
+                    author_id=author_id,
+                    created_at=created_at,
+                )
+                for post_id, author_id, created_at in posts.values_list('id', 'author_id', 'created_at')
+            ],
+            batch_size=TIMELINE_BATCH_SIZE,
+        )
+        bump_feed([owner_id])
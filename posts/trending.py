@@ -0,0 +1,94 @@
+"""
+Рейтинг популярных постов с затуханием по времени.
+
+score = log2(1 + лайки + вес * комментарии) + (created_at - EPOCH) / half_life
+
+Это логарифм от engagement * 2 ** (-(now - created_at) / half_life) с
+точностью до общего для всех постов слагаемого, поэтому порядок
+совпадает с экспоненциальным затуханием, а пересчитывать пост нужно
+только когда изменились его счетчики. Периодическая задача
+(manage.py refresh_trending) обновляет такие посты и удаляет вышедшие
+из окна, а /api/posts/trending/ читает верх таблицы по индексу.
+"""
+import math
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from api.cache import invalidate
+
+from .models import Post, TrendingScore
+
+TRENDING_WINDOW = getattr(settings, 'TRENDING_WINDOW', timedelta(days=3))
+TRENDING_HALF_LIFE = getattr(settings, 'TRENDING_HALF_LIFE', timedelta(hours=6))
+TRENDING_COMMENT_WEIGHT = getattr(settings, 'TRENDING_COMMENT_WEIGHT', 2.0)
+
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def compute_score(likes_count, comments_count, created_at, half_life=TRENDING_HALF_LIFE):
+    engagement = likes_count + TRENDING_COMMENT_WEIGHT * comments_count
+    age = (created_at - EPOCH).total_seconds()
+    return math.log2(1 + engagement) + age / half_life.total_seconds()
+
+
+def refresh(full=False, batch_size=1000):
+    """
+    Обновить таблицу рейтинга.
+    full=True пересчитывает все посты окна (например, после смены half-life),
+    иначе - только новые и те, у которых изменились счетчики.
+    """
+    started = time.monotonic()
+    cutoff = timezone.now() - TRENDING_WINDOW
+    removed, _ = TrendingScore.objects.filter(post_created_at__lt=cutoff).delete()
+
+    posts = Post.objects.filter(created_at__gte=cutoff)
+    if not full:
+        posts = posts.filter(
+            Q(trending_score__isnull=True)
+            | ~Q(trending_score__likes_count=F('likes_count'))
+            | ~Q(trending_score__comments_count=F('comments_count'))
+        )
+
+    updated = 0
+    last_id = 0
+    while True:
+        # Пачками по id: таблица рейтинга участвует в выборке и сразу обновляется
+        rows = list(
+            posts.filter(id__gt=last_id).order_by('id').values_list(
+                'id', 'likes_count', 'comments_count', 'created_at'
+            )[:batch_size]
+        )
+        if not rows:
+            break
+        now = timezone.now()
+        TrendingScore.objects.bulk_create(
+            [
+                TrendingScore(
+                    post_id=post_id,
+                    score=compute_score(likes_count, comments_count, created_at),
+                    likes_count=likes_count,
+                    comments_count=comments_count,
+                    post_created_at=created_at,
+                    updated_at=now,
+                )
+                for post_id, likes_count, comments_count, created_at in rows
+            ],
+            update_conflicts=True,
+            unique_fields=['post'],
+            update_fields=['score', 'likes_count', 'comments_count', 'post_created_at', 'updated_at'],
+        )
+        updated += len(rows)
+        last_id = rows[-1][0]
+
+    if updated or removed:
+        invalidate('trending')
+    return {
+        'updated': updated,
+        'removed': removed,
+        'duration': time.monotonic() - started,
+    }
+
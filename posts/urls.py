@@ -2,7 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     PostViewSet, FeedView, TrendingPostsView, PostSearchView, 
-    CommentListCreateView, CommentDetailView,
+    CommentListCreateView, CommentDetailView, CommentRepliesView,
     AdminHidePostView, AdminPostListView, AdminCommentListView
 )
 
@@ -10,12 +10,14 @@ router = DefaultRouter()
 router.register(r'posts', PostViewSet, basename='posts')
 
 urlpatterns = [
-    path('', include(router.urls)),
     path('feed/', FeedView.as_view(), name='feed'),
+    # До роутера, иначе posts/<pk>/ перехватывает trending и search
     path('posts/trending/', TrendingPostsView.as_view(), name='trending-posts'),
     path('posts/search/', PostSearchView.as_view(), name='post-search'),
+    path('', include(router.urls)),
     path('posts/<int:post_id>/comments/', CommentListCreateView.as_view(), name='post-comments'),
     path('comments/<int:pk>/', CommentDetailView.as_view(), name='comment-detail'),
+    path('comments/<int:pk>/replies/', CommentRepliesView.as_view(), name='comment-replies'),
     # Административные функции
     path('admin/list/', AdminPostListView.as_view(), name='admin-post-list'),
     path('admin/hide/<int:post_id>/', AdminHidePostView.as_view(), name='admin-hide-post'),
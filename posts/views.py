@@ -1,16 +1,30 @@
+import time
+from functools import partial
+
 from rest_framework import viewsets, generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.views import APIView
-from django.db.models import Count
+from django.conf import settings
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 from .models import Post, Comment
 from .serializers import PostSerializer, CommentSerializer, CommentCreateSerializer
 from .permissions import IsAuthorOrReadOnly
+from .likes import add_like, remove_like, is_liked
+from .search import get_backend as get_search_backend
+from .threads import subtree
 from users.serializers import UserSerializer
+from users.versions import get_versions
+from api.cache import CachedResponseMixin
+from api.conditional import ConditionalGetMixin
+from images.uploads import StreamingImageUploadMixin
+
+# Сколько секунд лента может отдавать 304 с устаревшими счетчиками постов
+FEED_COUNTERS_MAX_STALENESS = getattr(settings, 'FEED_COUNTERS_MAX_STALENESS', 60)
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(StreamingImageUploadMixin, ConditionalGetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     """
     CRUD для постов:
     - POST /api/posts/
@@ -18,80 +32,149 @@ class PostViewSet(viewsets.ModelViewSet):
     - GET /api/posts/<id>/
     - PUT/PATCH/DELETE /api/posts/<id>/
     """
-    queryset = Post.objects.all().select_related("author").prefetch_related("likes")
+    queryset = Post.objects.all().select_related("author")
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    query_budget = 4
+    conditional_cache_control = "no-cache"
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def retrieve(self, request, *args, **kwargs):
+        compute = partial(super().retrieve, request, *args, **kwargs)
+        return self.conditional_response(request, partial(self.cached_response, request, compute))
+
+    def get_cache_namespaces(self):
+        return [f"post:{self.kwargs['pk']}"]
+
+    def get_validators(self):
+        # updated_at меняется и при изменении счетчиков (posts/counters.py)
+        updated_at = Post.objects.filter(pk=self.kwargs["pk"]).values_list("updated_at", flat=True).first()
+        return None if updated_at is None else (updated_at.isoformat(), updated_at)
+
     def get_queryset(self):
         qs = super().get_queryset()
-        sort_by = self.request.query_params.get("sort")
 
-        if sort_by == "popular":
-            return qs.annotate(likes_count=Count("likes")).order_by("-likes_count", "-created_at")
-        return qs.order_by("-created_at")
+        if self.is_popular_sort():
+            return qs.order_by("-likes_count", "-id")
+        return qs.order_by("-created_at", "-id")
+
+    def is_popular_sort(self):
+        return self.request.query_params.get("sort") == "popular"
+
+    def get_cursor_ordering(self):
+        if self.action == "likes":
+            # Курсор по строке связи лайка, новые лайки первыми
+            return ("-id",)
+        if self.is_popular_sort():
+            return ("-likes_count", "-id")
+        return ("-created_at", "-id")
 
-    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    @action(detail=True, methods=['post', 'put', 'delete'], permission_classes=[permissions.IsAuthenticated])
     def like(self, request, pk=None):
-        """Лайк/анлайк поста"""
+        """
+        Лайк поста:
+        - PUT /api/posts/<id>/like/ - поставить лайк (идемпотентно)
+        - DELETE /api/posts/<id>/like/ - убрать лайк (идемпотентно)
+        - POST /api/posts/<id>/like/ - лайк/анлайк
+        """
         post = self.get_object()
         user = request.user
-        
-        if user in post.likes.all():
-            post.likes.remove(user)
-            message = "Лайк убран"
+
+        if request.method == 'PUT':
+            liked = True
+            add_like(post, user)
+        elif request.method == 'DELETE':
+            liked = False
+            remove_like(post, user)
         else:
-            post.likes.add(user)
-            message = "Пост лайкнут"
-            
+            liked = not is_liked(post, user)
+            if liked:
+                add_like(post, user)
+            else:
+                remove_like(post, user)
+
+        post.refresh_from_db(fields=['likes_count'])
         return Response({
-            'message': message,
-            'likes_count': post.likes.count(),
-            'is_liked': user in post.likes.all()
+            'message': "Пост лайкнут" if liked else "Лайк убран",
+            'likes_count': post.likes_count,
+            'is_liked': liked
         })
 
-    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticatedOrReadOnly])
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticatedOrReadOnly], query_budget=4)
     def likes(self, request, pk=None):
-        """Список пользователей, лайкнувших пост"""
+        """Список пользователей, лайкнувших пост (постранично, новые лайки первыми)"""
         post = self.get_object()
-        likes = post.likes.all()
-        serializer = UserSerializer(likes, many=True)
-        return Response({
-            'likes_count': likes.count(),
-            'users': serializer.data
-        })
+        likes = Post.likes.through.objects.filter(post_id=post.pk).select_related('user')
+        page = self.paginate_queryset(likes)
+        serializer = UserSerializer([like.user for like in page], many=True)
+        response = self.get_paginated_response(serializer.data)
+        response.data['likes_count'] = post.likes_count
+        return response
 
 
-class FeedView(generics.ListAPIView):
+class FeedView(ConditionalGetMixin, generics.ListAPIView):
     """
     Лента подписок:
     - GET /api/feed/
     """
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 4
 
-    def get_queryset(self):
-        user = self.request.user
-        following_profiles = user.profile.following.all()
-        following_users = [p.user for p in following_profiles]
-
-        return Post.objects.filter(author__in=following_users).order_by("-created_at")
+    # Курсор строится по записи ленты, а не по самому посту
+    cursor_ordering = ("-feed_created_at", "-feed_entry_id")
 
-
-class TrendingPostsView(generics.ListAPIView):
+    def get_queryset(self):
+        # Лента материализуется при создании поста (см. posts/timeline.py)
+        return Post.objects.filter(
+            timeline_entries__owner=self.request.user
+        ).annotate(
+            feed_created_at=F("timeline_entries__created_at"),
+            feed_entry_id=F("timeline_entries__id"),
+        ).select_related("author").order_by(
+            "-feed_created_at", "-feed_entry_id"
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, partial(super().list, request, *args, **kwargs))
+
+    def get_validators(self):
+        # feed_version меняется и при составе ленты, и при правке постов в
+        # ней (posts/signals.py). Счетчики лайков/комментариев версию не
+        # меняют, поэтому в ETag еще входит номер окна FEED_COUNTERS_MAX_STALENESS
+        # секунд: 304 со старыми счетчиками отдается не дольше окна
+        feed_version, _ = get_versions(self.request.user.pk)
+        window = int(time.time() // FEED_COUNTERS_MAX_STALENESS)
+        return f"{self.request.user.pk}:{feed_version}:{window}", None
+
+
+class TrendingPostsView(CachedResponseMixin, generics.ListAPIView):
     """
     Популярные посты:
     - GET /api/posts/trending/
     """
     serializer_class = PostSerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = 3
+    cursor_ordering = ("-trending", "-id")
+    # Рейтинг сбрасывается после refresh_trending, счетчики в выдаче - по TTL
+    cache_timeout = 30
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, partial(super().list, request, *args, **kwargs))
+
+    def get_cache_namespaces(self):
+        return ["trending"]
 
     def get_queryset(self):
-        return Post.objects.annotate(
-            likes_count=Count("likes")
-        ).order_by("-likes_count", "-created_at")
+        # Рейтинг предрасчитан (manage.py refresh_trending, см. posts/trending.py)
+        return Post.objects.filter(
+            trending_score__isnull=False
+        ).annotate(
+            trending=F("trending_score__score")
+        ).select_related("author").order_by("-trending", "-id")
 
 
 class PostSearchView(generics.ListAPIView):
@@ -101,17 +184,18 @@ class PostSearchView(generics.ListAPIView):
     """
     serializer_class = PostSerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = 3
+    # search_rank: чем меньше, тем релевантнее (см. posts/search.py)
+    cursor_ordering = ("search_rank", "id")
 
     def get_queryset(self):
         query = self.request.query_params.get('q', '')
-        if query:
-            return Post.objects.filter(
-                caption__icontains=query
-            ).select_related("author").prefetch_related("likes").order_by("-created_at")
-        return Post.objects.none()
+        return get_search_backend().filter(
+            Post.objects.select_related("author"), query
+        ).order_by("search_rank", "id")
 
 
-class CommentListCreateView(generics.ListCreateAPIView):
+class CommentListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
     """
     Список и создание комментариев для поста:
     - GET /api/posts/<post_id>/comments/
@@ -119,13 +203,29 @@ class CommentListCreateView(generics.ListCreateAPIView):
     """
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    query_budget = 4
+    cursor_ordering = ('created_at', 'id')
+    conditional_cache_control = 'no-cache'
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, partial(super().list, request, *args, **kwargs))
+
+    def get_validators(self):
+        # Post.updated_at меняется при создании, правке и удалении
+        # комментариев (posts/counters.py, posts/signals.py)
+        updated_at = Post.objects.filter(pk=self.kwargs['post_id']).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None
+        return updated_at.isoformat(), updated_at
 
     def get_queryset(self):
         post_id = self.kwargs['post_id']
+        # Число ответов денормализовано (Comment.replies_count), сами ответы -
+        # через CommentRepliesView
         return Comment.objects.filter(
             post_id=post_id, 
             parent=None
-        ).select_related('author').prefetch_related('replies')
+        ).select_related('author').order_by('created_at', 'id')
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -137,6 +237,27 @@ class CommentListCreateView(generics.ListCreateAPIView):
         serializer.save(author=self.request.user, post=post)
 
 
+class CommentRepliesView(generics.ListAPIView):
+    """
+    Ответы на комментарий на всех уровнях, в порядке обхода ветки:
+    - GET /api/comments/<id>/replies/
+    - GET /api/comments/<id>/replies/?max_depth=1 - только прямые ответы
+    """
+    serializer_class = CommentSerializer
+    permission_classes = [permissions.AllowAny]
+    query_budget = 4
+    # path уникален и задает порядок ветки (см. posts/threads.py)
+    cursor_ordering = ('path',)
+
+    def get_queryset(self):
+        comment = get_object_or_404(Comment.objects.only('post_id', 'path', 'depth'), pk=self.kwargs['pk'])
+        try:
+            max_depth = int(self.request.query_params['max_depth'])
+        except (KeyError, ValueError):
+            max_depth = None
+        return subtree(comment, max_depth).select_related('author')
+
+
 class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     Детали, обновление и удаление комментария:
@@ -146,6 +267,7 @@ class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    query_budget = 3
 
     def get_queryset(self):
         return Comment.objects.select_related('author', 'post')
@@ -178,11 +300,12 @@ class AdminPostListView(generics.ListAPIView):
     """
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
 
     def get_queryset(self):
         if not self.request.user.is_staff:
             return Post.objects.none()
-        return Post.objects.all().select_related("author").prefetch_related("likes").order_by("-created_at")
+        return Post.objects.all().select_related("author").order_by("-created_at", "-id")
 
 
 class AdminCommentListView(generics.ListAPIView):
@@ -192,8 +315,9 @@ class AdminCommentListView(generics.ListAPIView):
     """
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
 
     def get_queryset(self):
         if not self.request.user.is_staff:
             return Comment.objects.none()
-        return Comment.objects.all().select_related('author', 'post').order_by('-created_at')
+        return Comment.objects.all().select_related('author', 'post').order_by('-created_at', '-id')
@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
 
-from .models import User, Profile
+from .models import FollowSuggestion, User, Profile
 
 class UserAdmin(BaseUserAdmin):
     """Админка для кастомного пользователя"""
@@ -31,5 +31,12 @@ class ProfileAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'gender', 'created_at')
 
 
+class FollowSuggestionAdmin(admin.ModelAdmin):
+    """Админка для рекомендаций подписок"""
+    list_display = ('id', 'user', 'suggested', 'score', 'mutual_count', 'created_at')
+    raw_id_fields = ('user', 'suggested')
+
+
 admin.site.register(Profile, ProfileAdmin)
+admin.site.register(FollowSuggestion, FollowSuggestionAdmin)
 admin.site.register(User, UserAdmin)
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""
+Денормализованные счетчики подписчиков и подписок на Profile.
+
+Счетчики меняются атомарно через F() внутри той же транзакции,
+что и запись в таблицу подписок, а reconcile() пересчитывает их пачками.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest, Now
+from django.utils import timezone
+
+from api.cache import invalidate_users
+
+from . import search
+from .models import Profile
+
+Follow = Profile.following.through
+
+
+def user_ids_for(profile_ids):
+    """{profile_id: user_id} одним запросом"""
+    return dict(Profile.objects.filter(pk__in=profile_ids).values_list('pk', 'user_id'))
+
+
+def _change(field, profile_ids, delta, user_ids):
+    """Сдвинуть счетчик field, вернуть user_id этих профилей"""
+    Profile.objects.filter(pk__in=profile_ids).update(
+        **{field: Greatest(F(field) + delta, 0)},
+        updated_at=Now(),
+    )
+    if user_ids is None:
+        user_ids = list(user_ids_for(profile_ids).values())
+    return user_ids
+
+
+def change_followers(profile_ids, delta, user_ids=None):
+    """
+    Изменить followers_count у профилей на delta.
+    user_ids - пользователи этих профилей, если вызывающий их уже знает.
+    """
+    if not profile_ids or not delta:
+        return
+    user_ids = _change('followers_count', profile_ids, delta, user_ids)
+    search.sync_followers(user_ids)
+    invalidate_users(user_ids)
+
+
+def change_following(profile_ids, delta, user_ids=None):
+    """Изменить following_count у профилей на delta, user_ids - как в change_followers"""
+    if not profile_ids or not delta:
+        return
+    invalidate_users(_change('following_count', profile_ids, delta, user_ids))
+
+
+def change_follows(follower_ids, followed_ids, delta):
+    """
+    Каждый из follower_ids подписался (delta=1) или отписался (delta=-1)
+    от каждого из followed_ids. Пользователи обеих сторон - одним запросом.
+    """
+    follower_ids, followed_ids = list(follower_ids), list(followed_ids)
+    if not follower_ids or not followed_ids or not delta:
+        return
+    user_ids = user_ids_for(follower_ids + followed_ids)
+    change_following(
+        follower_ids, delta * len(followed_ids),
+        [user_ids[pk] for pk in follower_ids if pk in user_ids],
+    )
+    change_followers(
+        followed_ids, delta * len(follower_ids),
+        [user_ids[pk] for pk in followed_ids if pk in user_ids],
+    )
+
+
+def _count_subquery(field):
+    return Coalesce(Subquery(
+        Follow.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+            c=Count('pk')
+        ).values('c')
+    ), 0)
+
+
+def find_drift(batch_size=1000):
+    """
+    Проверка инварианта: счетчики совпадают с таблицей подписок.
+    Отдает пачками профили с расхождением, real_* содержат верные значения.
+    """
+    last_id = 0
+    while True:
+        batch = list(
+            Profile.objects.filter(pk__gt=last_id).order_by('pk').annotate(
+                real_followers=_count_subquery('to_profile_id'),
+                real_following=_count_subquery('from_profile_id'),
+            ).only('pk', 'user_id', 'followers_count', 'following_count')[:batch_size]
+        )
+        if not batch:
+            return
+        yield [
+            profile for profile in batch
+            if profile.followers_count != profile.real_followers
+            or profile.following_count != profile.real_following
+        ]
+        last_id = batch[-1].pk
+
+
+def reconcile(batch_size=1000):
+    """
+    Пересчитать счетчики всех профилей.
+    Возвращает количество исправленных профилей.
+    """
+    fixed = 0
+    for drifted in find_drift(batch_size):
+        now = timezone.now()
+        for profile in drifted:
+            profile.followers_count = profile.real_followers
+            profile.following_count = profile.real_following
+            profile.updated_at = now
+        Profile.objects.bulk_update(drifted, ['followers_count', 'following_count', 'updated_at'])
+        search.sync_followers([profile.user_id for profile in drifted])
+        fixed += len(drifted)
+    return fixed
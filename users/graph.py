@@ -0,0 +1,139 @@
+"""
+Доступ к графу подписок.
+
+Все операции идут напрямую в таблицу Profile.following.through:
+- проверка "A подписан на B" - одна строка по уникальному индексу
+  (from_profile_id, to_profile_id), без загрузки списка подписок;
+- "на кого из этих N пользователей подписан зритель" - один запрос IN;
+- списки подписчиков/подписок - строки связи по убыванию id (сначала
+  новые подписки) с пользователем через select_related, под keyset
+  пагинацию (api/pagination.py).
+
+Подписки зрителей можно держать в памяти процесса (AdjacencyCache,
+FOLLOW_GRAPH_CACHE_SIZE > 0): множество id для часто запрашиваемых
+аккаунтов. Изменения в этом процессе сбрасывают запись сразу, в других
+воркерах запись живет не дольше FOLLOW_GRAPH_CACHE_TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models.signals import m2m_changed
+
+from . import counters
+from .counters import Follow
+from .models import Profile
+
+FOLLOW_GRAPH_CACHE_SIZE = getattr(settings, 'FOLLOW_GRAPH_CACHE_SIZE', 0)
+FOLLOW_GRAPH_CACHE_TTL = getattr(settings, 'FOLLOW_GRAPH_CACHE_TTL', 30)
+# Подписки больше этого размера в память не поднимаем
+FOLLOW_GRAPH_CACHE_MAX_DEGREE = getattr(settings, 'FOLLOW_GRAPH_CACHE_MAX_DEGREE', 5000)
+
+
+class AdjacencyCache:
+    """LRU: user_id зрителя -> frozenset user_id, на кого он подписан"""
+
+    def __init__(self, size, ttl, max_degree):
+        self.size = size
+        self.ttl = ttl
+        self.max_degree = max_degree
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        """Множество подписок или None (нет в кэше или слишком большое)"""
+        if not self.size:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(user_id)
+                return entry[1]
+        following = list(
+            Follow.objects.filter(from_profile__user_id=user_id).values_list(
+                'to_profile__user_id', flat=True
+            )[:self.max_degree + 1]
+        )
+        if len(following) > self.max_degree:
+            return None
+        following = frozenset(following)
+        with self.lock:
+            self.entries[user_id] = (now + self.ttl, following)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return following
+
+    def discard(self, user_ids):
+        with self.lock:
+            for user_id in user_ids:
+                self.entries.pop(user_id, None)
+
+
+adjacency_cache = AdjacencyCache(FOLLOW_GRAPH_CACHE_SIZE, FOLLOW_GRAPH_CACHE_TTL, FOLLOW_GRAPH_CACHE_MAX_DEGREE)
+
+
+def is_following(profile_id, target_profile_id):
+    return Follow.objects.filter(from_profile_id=profile_id, to_profile_id=target_profile_id).exists()
+
+
+def following_among(user_id, user_ids):
+    """Подмножество user_ids, на которых подписан пользователь user_id"""
+    user_ids = set(user_ids)
+    if user_id is None or not user_ids:
+        return set()
+    following = adjacency_cache.get(user_id)
+    if following is not None:
+        return user_ids & following
+    return set(
+        Follow.objects.filter(
+            from_profile__user_id=user_id, to_profile__user_id__in=user_ids
+        ).values_list('to_profile__user_id', flat=True)
+    )
+
+
+def followers(profile_id):
+    """Строки подписок на профиль, пользователь - edge.from_profile.user"""
+    return Follow.objects.filter(to_profile_id=profile_id).select_related('from_profile__user').order_by('-id')
+
+
+def following(profile_id):
+    """Строки подписок профиля, пользователь - edge.to_profile.user"""
+    return Follow.objects.filter(from_profile_id=profile_id).select_related('to_profile__user').order_by('-id')
+
+
+def follow(profile, target_profile_id):
+    """Подписаться. True, если подписка создана именно этим вызовом"""
+    using = router.db_for_write(Follow, instance=profile)
+    with transaction.atomic(using=using):
+        _, created = Follow.objects.using(using).get_or_create(
+            from_profile_id=profile.pk, to_profile_id=target_profile_id
+        )
+        if created:
+            # Тот же сигнал, что шлет profile.following.add(): счетчики и лента
+            m2m_changed.send(
+                sender=Follow, instance=profile, action='post_add', reverse=False,
+                model=Profile, pk_set={target_profile_id}, using=using,
+            )
+    return created
+
+
+def unfollow(profile, target_profile_id):
+    """Отписаться. True, если подписка снята именно этим вызовом"""
+    using = router.db_for_write(Follow, instance=profile)
+    with transaction.atomic(using=using):
+        deleted, _ = Follow.objects.using(using).filter(
+            from_profile_id=profile.pk, to_profile_id=target_profile_id
+        ).delete()
+        if deleted:
+            # Число удаленных строк точное, счетчики обновляем сами;
+            # сигнал нужен ленте и кэшу графа
+            counters.change_follows([profile.pk], [target_profile_id], -deleted)
+            m2m_changed.send(
+                sender=Follow, instance=profile, action='post_remove', reverse=False,
+                model=Profile, pk_set={target_profile_id}, using=using,
+            )
+    return bool(deleted)
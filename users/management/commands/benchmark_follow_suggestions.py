@@ -0,0 +1,66 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users import suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк расчета рекомендаций подписок на синтетическом графе '
+        '(без БД), результат - JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000, help='Число пользователей')
+        parser.add_argument('--edges', type=int, default=10_000_000, help='Число подписок')
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного закона популярности аккаунтов',
+        )
+        parser.add_argument('--top-k', type=int, default=suggestions.FOLLOW_SUGGESTIONS_TOP_K)
+        parser.add_argument('--block-size', type=int, default=suggestions.FOLLOW_SUGGESTIONS_BLOCK_SIZE)
+        parser.add_argument(
+            '--blocks', type=int, default=None,
+            help='Посчитать только первые N блоков и экстраполировать время на весь граф',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, users, edges, exponent, top_k, block_size, blocks, seed, **options):
+        try:
+            suggestions.require_scipy()
+        except suggestions.MissingDependency as exc:
+            raise CommandError(str(exc))
+
+        started = time.monotonic()
+        src, dst = suggestions.synthetic_graph(users, edges, exponent=exponent, seed=seed)
+        generated = time.monotonic()
+        matrix = suggestions.build_matrix(src, dst, users)
+        built = time.monotonic()
+
+        computed_blocks = candidates = 0
+        for _, rows, _, _, _ in suggestions.top_k(matrix, top_k, block_size):
+            computed_blocks += 1
+            candidates += len(rows)
+            if blocks is not None and computed_blocks >= blocks:
+                break
+        finished = time.monotonic()
+
+        total_blocks = -(-users // block_size)
+        compute = finished - built
+        result = {
+            'users': users,
+            'edges': int(matrix.nnz),
+            'top_k': top_k,
+            'block_size': block_size,
+            'blocks': computed_blocks,
+            'suggestions': candidates,
+            'generate_seconds': round(generated - started, 3),
+            'build_seconds': round(built - generated, 3),
+            'compute_seconds': round(compute, 3),
+            'compute_seconds_estimated': round(compute * total_blocks / max(computed_blocks, 1), 3),
+            'users_per_second': round(computed_blocks * block_size / compute, 1) if compute else None,
+            'matrix_bytes': int(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes),
+        }
+        self.stdout.write(json.dumps(result, indent=2))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации подписок (друзья друзей) в FollowSuggestion'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k', type=int, default=suggestions.FOLLOW_SUGGESTIONS_TOP_K,
+            help='Сколько кандидатов хранить на пользователя',
+        )
+        parser.add_argument(
+            '--block-size', type=int, default=suggestions.FOLLOW_SUGGESTIONS_BLOCK_SIZE,
+            help='Сколько пользователей считать и записывать за один блок',
+        )
+
+    def handle(self, *args, top_k, block_size, **options):
+        try:
+            stats = suggestions.compute(k=top_k, block_size=block_size)
+        except suggestions.MissingDependency as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f"Пользователей: {stats['users']}, подписок: {stats['edges']}, "
+            f"рекомендаций: {stats['suggestions']}, выгрузка: {stats['export']:.3f}s, "
+            f"расчет: {stats['compute']:.3f}s, всего: {stats['duration']:.3f}s"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from users import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает префиксный и триграммный индекс поиска пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько пользователей читать за один запрос',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        total = search.rebuild_index(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано пользователей: {total}'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает Profile.followers_count и Profile.following_count'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько профилей проверять за один запрос',
+        )
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить инвариант, ничего не исправляя',
+        )
+
+    def handle(self, *args, batch_size, check, **options):
+        if not check:
+            fixed = counters.reconcile(batch_size=batch_size)
+            self.stdout.write(self.style.SUCCESS(f'Исправлено профилей: {fixed}'))
+            return
+
+        drifted = 0
+        for batch in counters.find_drift(batch_size=batch_size):
+            for profile in batch:
+                drifted += 1
+                self.stdout.write(
+                    f'Профиль {profile.pk}: followers {profile.followers_count} != {profile.real_followers}, '
+                    f'following {profile.following_count} != {profile.real_following}'
+                )
+        if drifted:
+            raise CommandError(f'Расхождение счетчиков у профилей: {drifted}')
+        self.stdout.write(self.style.SUCCESS('Счетчики подписок согласованы'))
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_search_index(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    UserSearchTerm = apps.get_model('users', 'UserSearchTerm')
+    UserSearchTrigram = apps.get_model('users', 'UserSearchTrigram')
+
+    terms, grams = [], []
+    for user in User.objects.order_by('pk').iterator():
+        user_grams = set()
+        for field in ('username', 'first_name', 'last_name'):
+            term = ' '.join((getattr(user, field) or '').lower().split())
+            if term:
+                terms.append(UserSearchTerm(user_id=user.pk, field=field, term=term))
+                user_grams |= {term[i:i + 3] for i in range(len(term) - 2)}
+        grams.extend(UserSearchTrigram(user_id=user.pk, trigram=gram) for gram in user_grams)
+    UserSearchTerm.objects.bulk_create(terms, batch_size=1000)
+    UserSearchTrigram.objects.bulk_create(grams, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_profile_follow_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(choices=[('username', 'Username'), ('first_name', 'First name'), ('last_name', 'Last name')], max_length=20)),
+                ('term', models.CharField(max_length=255)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term'], name='user_search_term_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'field'), name='unique_user_search_term')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserSearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_trigrams', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('trigram', 'user'), name='unique_user_search_trigram')],
+            },
+        ),
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:35
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_followers_count(apps, schema_editor):
+    Profile = apps.get_model('users', 'Profile')
+    UserSearchTerm = apps.get_model('users', 'UserSearchTerm')
+
+    UserSearchTerm.objects.update(followers_count=Coalesce(Subquery(
+        Profile.objects.filter(user_id=OuterRef('user_id')).values('followers_count')[:1]
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_follow_suggestions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersearchterm',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_followers_count, migrations.RunPython.noop),
+    ]
@@ -87,8 +87,116 @@ class Profile(models.Model):
         blank=True,
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Денормализованные счетчики, обновляются через F() в users/signals.py
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Версии ленты и уведомлений пользователя для ETag (users/versions.py)
+    feed_version = models.PositiveBigIntegerField(default=0, editable=False)
+    notifications_version = models.PositiveBigIntegerField(default=0, editable=False)
+
+    # Уменьшенные копии avatar, их пишет фоновый воркер (images/pipeline.py)
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Поля, которые меняются только через update() в обход save()
+    DERIVED_FIELDS = (
+        'followers_count', 'following_count', 'feed_version', 'notifications_version', 'avatar_variants',
+    )
 
     def __str__(self):
         return f'Profile - {self.user.username}'
 
+    def save(self, *args, **kwargs):
+        # Обычное сохранение не должно затирать эти поля устаревшими значениями
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DERIVED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class UserSearchTerm(models.Model):
+    """Нормализованные имена пользователя для поиска по префиксу"""
+    FIELD_CHOICES = (
+        ('username', 'Username'),
+        ('first_name', 'First name'),
+        ('last_name', 'Last name'),
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+    )
+    field = models.CharField(
+        max_length=20,
+        choices=FIELD_CHOICES,
+    )
+    term = models.CharField(max_length=255)
+    # Копия Profile.followers_count: кандидаты отбираются по популярности
+    # до ограничения USERS_SEARCH_CANDIDATES (users/search.py)
+    followers_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'field'], name='unique_user_search_term'),
+        ]
+        indexes = [
+            models.Index(fields=['term'], name='user_search_term_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.field}: {self.term}'
+
 
+class UserSearchTrigram(models.Model):
+    """Триграммы имен пользователя для поиска по подстроке"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='search_trigrams',
+    )
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['trigram', 'user'], name='unique_user_search_trigram'),
+        ]
+
+    def __str__(self):
+        return f'{self.trigram} - {self.user_id}'
+
+
+class FollowSuggestion(models.Model):
+    """
+    "Возможно, вы знакомы": top-k кандидатов через два шага по графу
+    подписок. Таблицу целиком пересчитывает пакетная задача
+    (manage.py compute_follow_suggestions, users/suggestions.py).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions',
+    )
+    suggested = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    score = models.FloatField()
+    # Сколько подписок пользователя подписаны на кандидата
+    mutual_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'suggested'], name='unique_follow_suggestion'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-score', 'id'], name='follow_suggestion_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.suggested_id} ({self.score:.3f})'
@@ -0,0 +1,213 @@
+"""
+Поиск пользователей для автодополнения упоминаний.
+
+Индекс из двух таблиц, синхронизируемых сигналами (users/signals.py):
+- UserSearchTerm - нормализованные username/имя/фамилия с копией
+  followers_count, префиксный поиск диапазоном term >= q AND
+  term < q + '\\uffff' по B-tree индексу; из диапазона берутся самые
+  популярные активные пользователи;
+- UserSearchTrigram - триграммы тех же строк для поиска по подстроке.
+
+Выдача - top-k: точное совпадение username, префикс username, префикс
+имени, подстрока; внутри группы - по числу подписчиков. Стадия по
+триграммам выполняется, только если укладывается в бюджет по времени.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Profile, User, UserSearchTerm, UserSearchTrigram
+
+SEARCH_LIMIT = getattr(settings, 'USERS_SEARCH_LIMIT', 10)
+SEARCH_MAX_LIMIT = getattr(settings, 'USERS_SEARCH_MAX_LIMIT', 50)
+SEARCH_BUDGET_MS = getattr(settings, 'USERS_SEARCH_BUDGET_MS', 50)
+# Сколько кандидатов брать из индекса на одну стадию
+SEARCH_CANDIDATES = getattr(settings, 'USERS_SEARCH_CANDIDATES', 200)
+PREFIX_CACHE_ENABLED = getattr(settings, 'USERS_SEARCH_PREFIX_CACHE', False)
+PREFIX_CACHE_TTL = getattr(settings, 'USERS_SEARCH_PREFIX_CACHE_TTL', 300)
+
+INDEXED_FIELDS = ('username', 'first_name', 'last_name')
+
+# Группы выдачи: меньше - выше
+EXACT_USERNAME, USERNAME_PREFIX, NAME_PREFIX, SUBSTRING = range(4)
+
+_RANGE_END = '\uffff'
+
+
+def normalize(value):
+    return ' '.join((value or '').lower().split())
+
+
+def trigrams(value):
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def index_user(user):
+    """Пересобрать записи индекса для одного пользователя"""
+    terms = {}
+    for field in INDEXED_FIELDS:
+        term = normalize(getattr(user, field))
+        if term:
+            terms[field] = term
+    grams = set()
+    for term in terms.values():
+        grams |= trigrams(term)
+    followers_count = Profile.objects.filter(user_id=user.pk).values_list('followers_count', flat=True).first()
+
+    with transaction.atomic():
+        UserSearchTerm.objects.filter(user=user).delete()
+        UserSearchTrigram.objects.filter(user=user).delete()
+        UserSearchTerm.objects.bulk_create([
+            UserSearchTerm(user=user, field=field, term=term, followers_count=followers_count or 0)
+            for field, term in terms.items()
+        ])
+        UserSearchTrigram.objects.bulk_create([
+            UserSearchTrigram(user=user, trigram=gram) for gram in grams
+        ])
+    username_cache.invalidate()
+
+
+def sync_followers(user_ids):
+    """Скопировать followers_count профилей пользователей в их записи индекса"""
+    UserSearchTerm.objects.filter(user_id__in=user_ids).update(
+        followers_count=Coalesce(Subquery(
+            Profile.objects.filter(user_id=OuterRef('user_id')).values('followers_count')[:1]
+        ), 0)
+    )
+
+
+def rebuild_index(batch_size=1000):
+    """Перестроить индекс для всех пользователей, возвращает их количество"""
+    total = 0
+    users = User.objects.only(*INDEXED_FIELDS).order_by('pk')
+    for user in users.iterator(chunk_size=batch_size):
+        index_user(user)
+        total += 1
+    return total
+
+
+class UsernamePrefixCache:
+    """
+    Отсортированный список username активных пользователей в памяти
+    процесса: префиксный поиск через bisect без запроса в БД.
+    Перестраивается по TTL или после изменения пользователей в этом
+    процессе, поэтому число подписчиков в нем может отставать на TTL.
+    """
+
+    def __init__(self, ttl=PREFIX_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._keys = []
+        self._ids = []
+        self._followers = []
+        self._built_at = None
+
+    def invalidate(self):
+        self._built_at = None
+
+    def _ensure(self):
+        if self._built_at is not None and time.monotonic() - self._built_at < self.ttl:
+            return
+        with self._lock:
+            if self._built_at is not None and time.monotonic() - self._built_at < self.ttl:
+                return
+            rows = list(
+                UserSearchTerm.objects.filter(field='username', user__is_active=True).order_by(
+                    'term'
+                ).values_list('term', 'user_id', 'followers_count')
+            )
+            self._keys = [term for term, _, _ in rows]
+            self._ids = [user_id for _, user_id, _ in rows]
+            self._followers = [followers_count for _, _, followers_count in rows]
+            self._built_at = time.monotonic()
+
+    def lookup(self, prefix, limit):
+        """
+        [(username, user_id), ...] для username, начинающихся с prefix:
+        точное совпадение, затем самые популярные - как в _prefix_candidates
+        """
+        self._ensure()
+        keys, ids, followers = self._keys, self._ids, self._followers
+        start = position = bisect_left(keys, prefix)
+        while position < len(keys) and keys[position].startswith(prefix):
+            position += 1
+        best = heapq.nsmallest(
+            limit, range(start, position),
+            key=lambda i: (keys[i] != prefix, -followers[i], keys[i], ids[i]),
+        )
+        return [(keys[i], ids[i]) for i in best]
+
+
+username_cache = UsernamePrefixCache()
+
+
+def _prefix_candidates(query):
+    """
+    Кандидаты по префиксу: {user_id: группа}. Из диапазона берутся
+    SEARCH_CANDIDATES самых популярных активных пользователей.
+    """
+    ranked = {}
+    if PREFIX_CACHE_ENABLED:
+        for username, user_id in username_cache.lookup(query, SEARCH_CANDIDATES):
+            ranked[user_id] = EXACT_USERNAME if username == query else USERNAME_PREFIX
+        fields = ('first_name', 'last_name')
+    else:
+        fields = INDEXED_FIELDS
+
+    # Точное совпадение username - первым, чтобы его не отрезал лимит
+    terms = UserSearchTerm.objects.filter(
+        term__gte=query, term__lt=query + _RANGE_END, field__in=fields, user__is_active=True,
+    ).annotate(
+        exact=Case(When(field='username', term=query, then=Value(0)), default=Value(1)),
+    ).order_by('exact', '-followers_count', 'term', 'user_id').values_list(
+        'user_id', 'field', 'term'
+    )[:SEARCH_CANDIDATES]
+    for user_id, field, term in terms:
+        if field == 'username':
+            rank = EXACT_USERNAME if term == query else USERNAME_PREFIX
+        else:
+            rank = NAME_PREFIX
+        ranked[user_id] = min(rank, ranked.get(user_id, rank))
+    return ranked
+
+
+def _substring_candidates(query):
+    """
+    Кандидаты по подстроке: активные пользователи, у которых есть все
+    триграммы запроса, - SEARCH_CANDIDATES самых популярных
+    """
+    grams = trigrams(query)
+    return list(
+        UserSearchTrigram.objects.filter(trigram__in=grams, user__is_active=True).values('user_id').annotate(
+            matched=Count('id')
+        ).filter(matched=len(grams)).order_by(
+            '-user__profile__followers_count', 'user_id'
+        ).values_list('user_id', flat=True)[:SEARCH_CANDIDATES]
+    )
+
+
+def search_users(query, limit=SEARCH_LIMIT, budget_ms=SEARCH_BUDGET_MS):
+    """Top-k пользователей по запросу с учетом бюджета по времени"""
+    query = normalize(query)
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    if not query:
+        return []
+
+    deadline = time.monotonic() + budget_ms / 1000
+    ranked = _prefix_candidates(query)
+
+    if len(ranked) < limit and len(query) >= 3 and time.monotonic() < deadline:
+        for user_id in _substring_candidates(query):
+            ranked.setdefault(user_id, SUBSTRING)
+
+    users = User.objects.filter(pk__in=ranked, is_active=True).select_related('profile')
+    return sorted(
+        users,
+        key=lambda user: (ranked[user.pk], -user.profile.followers_count, user.username),
+    )[:limit]
@@ -1,7 +1,9 @@
 from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
 
-from .models import Profile, User
+from images.serializers import ImageVariantsField, UploadSessionField, UploadSessionSerializerMixin
+
+from .models import FollowSuggestion, Profile, User
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -10,24 +12,39 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'username', 'email', 'first_name', 'last_name',)
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class FollowListUserSerializer(UserSerializer):
+    """Пользователь в списке подписок; following_ids в context - подписки зрителя"""
+    is_following = serializers.SerializerMethodField()
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ('is_following',)
+
+    def get_is_following(self, obj):
+        return obj.pk in self.context.get('following_ids', ())
+
+
+class FollowSuggestionSerializer(serializers.ModelSerializer):
+    user = UserSerializer(source='suggested', read_only=True)
+
+    class Meta:
+        model = FollowSuggestion
+        fields = ('user', 'score', 'mutual_count')
+
+
+class ProfileSerializer(UploadSessionSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
+    avatar_variants = ImageVariantsField()
+    # Файл из сессии дозагрузки вместо avatar (images/views.py)
+    upload = UploadSessionField()
+    upload_target = 'avatar'
 
     class Meta:
         model = Profile
         fields = (
-            'id', 'user', 'avatar', 'bio', 'gender', 'birth_day',
+            'id', 'user', 'avatar', 'avatar_variants', 'upload', 'bio', 'gender', 'birth_day',
             'followers_count', 'following_count'
         )
 
-    def get_followers_count(self, obj):
-        return obj.followers.count()
-
-    def get_following_count(self, obj):
-        return obj.following.count()
-
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, validators=[validate_password])
@@ -1,7 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.conf import settings
 from .models import Profile
+from . import counters, graph, search
+from api.cache import forget_usernames, invalidate_users
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -12,4 +14,88 @@ def create_user_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def save_user_profile(sender, instance, **kwargs):
     """Сохранение профиля при создании"""
-    instance.profile.save()
\ No newline at end of file
+    instance.profile.save()
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def index_user_for_search(sender, instance, created, update_fields=None, **kwargs):
+    """Обновляем поисковый индекс пользователей при изменении имен"""
+    if created or update_fields is None or set(update_fields) & set(search.INDEXED_FIELDS):
+        search.index_user(instance)
+    elif 'is_active' in update_fields:
+        # В кэше префиксов только активные пользователи
+        search.username_cache.invalidate()
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def remember_old_username(sender, instance, update_fields=None, **kwargs):
+    """Запоминаем прежний username, чтобы сбросить его id в кэше"""
+    if instance.pk is not None and (update_fields is None or 'username' in update_fields):
+        instance._old_username = sender.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """Сбрасываем кэш ответов профиля и постов пользователя и его id по username"""
+    invalidate_users([instance.pk])
+    old_username = instance.__dict__.pop('_old_username', None)
+    forget_usernames(*{old_username, instance.username})
+
+@receiver(post_save, sender=Profile)
+def invalidate_profile_cache(sender, instance, **kwargs):
+    """Сбрасываем кэш ответов профиля"""
+    invalidate_users([instance.user_id])
+
+@receiver(m2m_changed, sender=Profile.following.through)
+def sync_follow_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    """Обновляем счетчики подписчиков/подписок в той же транзакции, что и подписку"""
+    if action in ('pre_remove', 'pre_clear'):
+        # Запоминаем реально существующие подписки, чтобы не уйти в минус
+        if reverse:
+            follows = counters.Follow.objects.filter(to_profile_id=instance.pk)
+            if pk_set is not None:
+                follows = follows.filter(from_profile_id__in=pk_set)
+            removed = follows.values_list('from_profile_id', flat=True)
+        else:
+            follows = counters.Follow.objects.filter(from_profile_id=instance.pk)
+            if pk_set is not None:
+                follows = follows.filter(to_profile_id__in=pk_set)
+            removed = follows.values_list('to_profile_id', flat=True)
+        instance._removed_follow_ids = list(removed)
+        return
+
+    if action == 'post_add':
+        changed, delta = pk_set, 1
+    elif action in ('post_remove', 'post_clear'):
+        changed, delta = instance.__dict__.pop('_removed_follow_ids', []), -1
+    else:
+        return
+
+    if reverse:
+        # instance.followers.add(...): pk_set - подписчики
+        counters.change_follows(changed, [instance.pk], delta)
+    else:
+        counters.change_follows([instance.pk], changed, delta)
+
+@receiver(m2m_changed, sender=Profile.following.through)
+def invalidate_follow_graph_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    """Сбрасываем подписки из кэша графа в этом процессе (users/graph.py)"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        graph.adjacency_cache.discard([instance.user_id])
+    elif pk_set:
+        graph.adjacency_cache.discard(Profile.objects.filter(pk__in=pk_set).values_list('user_id', flat=True))
+    else:
+        graph.adjacency_cache.discard(list(graph.adjacency_cache.entries))
+
+@receiver(pre_delete, sender=Profile)
+def release_profile_follows(sender, instance, **kwargs):
+    """Подписки удаляемого профиля уходят каскадом без m2m_changed"""
+    following_ids = list(
+        counters.Follow.objects.filter(from_profile_id=instance.pk).values_list('to_profile_id', flat=True)
+    )
+    follower_ids = list(
+        counters.Follow.objects.filter(to_profile_id=instance.pk).values_list('from_profile_id', flat=True)
+    )
+    user_ids = counters.user_ids_for(following_ids + follower_ids)
+    counters.change_followers(following_ids, -1, [user_ids[pk] for pk in following_ids if pk in user_ids])
+    counters.change_following(follower_ids, -1, [user_ids[pk] for pk in follower_ids if pk in user_ids])
@@ -0,0 +1,202 @@
+"""
+"Возможно, вы знакомы": кандидаты через два шага по графу подписок.
+
+Пакетная задача (manage.py compute_follow_suggestions) выгружает
+подписки в разреженную матрицу смежности A (CSR, узлы - пользователи
+по возрастанию id) и считает блоками строк:
+- mutual = A[блок] @ A - сколько подписок пользователя подписаны на
+  кандидата;
+- score = A[блок] @ (W A), W = diag(1 / ln(2 + исходящая степень)) -
+  промежуточный пользователь, подписанный на всех подряд, весит меньше
+  (Adamic-Adar).
+Сам пользователь и его текущие подписки исключаются, top-k по score
+выбирается векторно и пишется в FollowSuggestion, блок - одна
+транзакция. Память ограничена размером блока, а не всей матрицей A @ A.
+
+Нужны numpy и scipy; API отдает готовую таблицу и без них.
+"""
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .counters import Follow
+from .models import FollowSuggestion, Profile
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+FOLLOW_SUGGESTIONS_TOP_K = getattr(settings, 'FOLLOW_SUGGESTIONS_TOP_K', 50)
+# Строк матрицы на один блок вычисления и одну транзакцию записи
+FOLLOW_SUGGESTIONS_BLOCK_SIZE = getattr(settings, 'FOLLOW_SUGGESTIONS_BLOCK_SIZE', 10000)
+EXPORT_BATCH_SIZE = 100_000
+
+
+class MissingDependency(Exception):
+    pass
+
+
+def require_scipy():
+    if np is None:
+        raise MissingDependency('Для расчета рекомендаций нужны пакеты numpy и scipy')
+
+
+def export_graph(batch_size=EXPORT_BATCH_SIZE):
+    """
+    (user_ids, src, dst): id пользователей по возрастанию (узел i -
+    user_ids[i]) и номера узлов для каждой подписки. Подписки читаются
+    keyset-пачками по id строки.
+    """
+    require_scipy()
+    profiles = np.array(Profile.objects.order_by('user_id').values_list('pk', 'user_id'), dtype=np.int64)
+    profiles = profiles.reshape(-1, 2)
+    user_ids = profiles[:, 1]
+    # profile_id -> номер узла
+    by_pk = np.argsort(profiles[:, 0])
+    sorted_pks = profiles[by_pk, 0]
+
+    src_parts, dst_parts = [], []
+    last_id = 0
+    while True:
+        rows = list(
+            Follow.objects.filter(pk__gt=last_id).order_by('pk').values_list(
+                'pk', 'from_profile_id', 'to_profile_id'
+            )[:batch_size]
+        )
+        if not rows:
+            break
+        batch = np.array(rows, dtype=np.int64)
+        src_parts.append(by_pk[np.searchsorted(sorted_pks, batch[:, 1])])
+        dst_parts.append(by_pk[np.searchsorted(sorted_pks, batch[:, 2])])
+        last_id = rows[-1][0]
+
+    empty = np.empty(0, dtype=np.int64)
+    src = np.concatenate(src_parts) if src_parts else empty
+    dst = np.concatenate(dst_parts) if dst_parts else empty
+    return user_ids, src, dst
+
+
+def build_matrix(src, dst, size):
+    """Бинарная матрица смежности CSR size x size"""
+    require_scipy()
+    matrix = sparse.csr_matrix(
+        (np.ones(len(src), dtype=np.float32), (src, dst)), shape=(size, size)
+    )
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+
+def top_k(matrix, k, block_size=FOLLOW_SUGGESTIONS_BLOCK_SIZE):
+    """
+    Кандидаты блоками строк: (start, rows, cols, scores, mutual), rows -
+    номера узлов, по k лучших на строку в порядке убывания score.
+    """
+    require_scipy()
+    size = matrix.shape[0]
+    if not size:
+        return
+    out_degree = np.diff(matrix.indptr)
+    weights = 1.0 / np.log(2.0 + out_degree)
+    weighted = sparse.diags(weights.astype(np.float32)) @ matrix
+
+    for start in range(0, size, block_size):
+        stop = min(start + block_size, size)
+        block = matrix[start:stop]
+        # Текущие подписки и сам пользователь
+        exclude = block + sparse.csr_matrix(
+            (np.ones(stop - start, dtype=np.float32), (np.arange(stop - start), np.arange(start, stop))),
+            shape=block.shape,
+        )
+        exclude.data[:] = 1
+        mutual = _without(block @ matrix, exclude)
+        scores = _without(block @ weighted, exclude)
+
+        rows = np.repeat(np.arange(stop - start), np.diff(scores.indptr))
+        # По строке, затем по убыванию score, при равенстве - по номеру узла
+        order = np.lexsort((scores.indices, -scores.data, rows))
+        rank = np.arange(len(order)) - scores.indptr[rows[order]]
+        keep = order[rank < k]
+        yield (
+            start, rows[keep] + start, scores.indices[keep],
+            scores.data[keep], mutual.data[keep].astype(np.int64),
+        )
+
+
+def _without(product, exclude):
+    product = product - product.multiply(exclude)
+    product.eliminate_zeros()
+    product.sort_indices()
+    return product
+
+
+def compute(k=FOLLOW_SUGGESTIONS_TOP_K, block_size=FOLLOW_SUGGESTIONS_BLOCK_SIZE):
+    """
+    Пересчитать таблицу FollowSuggestion.
+    Возвращает метрики: users, edges, suggestions и время этапов.
+    """
+    require_scipy()
+    started = time.monotonic()
+    user_ids, src, dst = export_graph()
+    matrix = build_matrix(src, dst, len(user_ids))
+    exported = time.monotonic()
+
+    total = 0
+    compute_time = 0.0
+    blocks = top_k(matrix, k, block_size)
+    while True:
+        block_started = time.monotonic()
+        try:
+            start, rows, cols, scores, mutual = next(blocks)
+        except StopIteration:
+            break
+        compute_time += time.monotonic() - block_started
+        stop = min(start + block_size, len(user_ids))
+        total += store_block(user_ids[start], user_ids[stop - 1], user_ids[rows], user_ids[cols], scores, mutual)
+
+    return {
+        'users': len(user_ids),
+        'edges': matrix.nnz,
+        'suggestions': total,
+        'export': exported - started,
+        'compute': compute_time,
+        'duration': time.monotonic() - started,
+    }
+
+
+def store_block(first_user_id, last_user_id, users, suggested, scores, mutual):
+    """Заменить рекомендации пользователей с id в [first_user_id, last_user_id]"""
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(user_id__gte=first_user_id, user_id__lte=last_user_id).delete()
+        FollowSuggestion.objects.bulk_create(
+            [
+                FollowSuggestion(user_id=user_id, suggested_id=suggested_id, score=score, mutual_count=count)
+                for user_id, suggested_id, score, count in zip(
+                    users.tolist(), suggested.tolist(), scores.tolist(), mutual.tolist()
+                )
+            ],
+            batch_size=1000,
+        )
+    return len(users)
+
+
+def synthetic_graph(users, edges, exponent=1.1, seed=0):
+    """
+    Случайный граф для бенчмарка: популярность аккаунтов по степенному
+    закону (немного знаменитостей, много подписчиков у них), подписчики
+    выбираются равномерно. Возвращает (src, dst) номеров узлов.
+    """
+    require_scipy()
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, users + 1) ** exponent
+    popularity /= popularity.sum()
+    # Номера узлов перемешаны, чтобы знаменитости не шли подряд
+    labels = rng.permutation(users)
+    src = rng.integers(0, users, size=edges)
+    dst = labels[rng.choice(users, size=edges, p=popularity)]
+    loops = src == dst
+    dst[loops] = (dst[loops] + 1) % users
+    return src, dst
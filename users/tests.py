@@ -1,3 +1,123 @@
+from unittest import mock
+
+from django.core.cache import caches
 from django.test import TestCase
 
-# Create your tests here.
+from api.cache import user_id_for
+
+from . import search
+from .models import User, UserSearchTerm
+
+
+class UserSearchTests(TestCase):
+    def setUp(self):
+        self.fans = [
+            User.objects.create_user(f'fan{n}@example.com', f'fan{n}', 'pw12345!!') for n in range(4)
+        ]
+
+    def user(self, username, followers, is_active=True):
+        user = User.objects.create_user(f'{username}@example.com', username, 'pw12345!!', is_active=is_active)
+        for fan in self.fans[:followers]:
+            fan.profile.following.add(user.profile)
+        return user
+
+    def usernames(self, query, limit=search.SEARCH_LIMIT):
+        return [user.username for user in search.search_users(query, limit=limit)]
+
+    def test_followers_count_follows_profile(self):
+        user = self.user('anna', 2)
+        self.assertEqual(set(UserSearchTerm.objects.filter(user=user).values_list('followers_count', flat=True)), {2})
+        self.fans[0].profile.following.remove(user.profile)
+        self.assertEqual(set(UserSearchTerm.objects.filter(user=user).values_list('followers_count', flat=True)), {1})
+
+    def test_candidates_are_most_followed_active_users(self):
+        self.user('annb', 1)
+        self.user('annc', 3)
+        self.user('annd', 2)
+        self.user('anne', 4, is_active=False)
+        with mock.patch.object(search, 'SEARCH_CANDIDATES', 2):
+            # Без подстрочной стадии: кандидатов по префиксу хватает на limit
+            self.assertEqual(self.usernames('ann', limit=2), ['annc', 'annd'])
+
+    def test_substring_candidates_are_most_followed_active_users(self):
+        self.user('xannb', 1)
+        self.user('xannc', 3)
+        self.user('xannd', 2)
+        self.user('xanne', 4, is_active=False)
+        with mock.patch.object(search, 'SEARCH_CANDIDATES', 2):
+            self.assertEqual(self.usernames('ann', limit=2), ['xannc', 'xannd'])
+
+    def test_prefix_cache_candidates_are_most_followed_active_users(self):
+        self.user('ann', 0)
+        self.user('annb', 1)
+        self.user('annc', 3)
+        self.user('annd', 2)
+        self.user('anne', 4, is_active=False)
+        search.username_cache.invalidate()
+        with mock.patch.object(search, 'PREFIX_CACHE_ENABLED', True), \
+                mock.patch.object(search, 'SEARCH_CANDIDATES', 3):
+            self.assertEqual(self.usernames('ann', limit=3), ['ann', 'annc', 'annd'])
+        search.username_cache.invalidate()
+
+    def test_exact_username_outside_candidates(self):
+        self.user('ann', 0)
+        self.user('annc', 3)
+        self.user('annd', 2)
+        with mock.patch.object(search, 'SEARCH_CANDIDATES', 2):
+            self.assertEqual(self.usernames('ann', limit=2), ['ann', 'annc'])
+
+
+class UserIdCacheTests(TestCase):
+    def setUp(self):
+        for cache in caches.all(initialized_only=True):
+            cache.clear()
+        self.alice = User.objects.create_user('alice@example.com', 'alice', 'pw12345!!')
+
+    def test_rename_forgets_old_username(self):
+        self.assertEqual(user_id_for('alice'), self.alice.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice.username = 'alicia'
+            self.alice.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            other = User.objects.create_user('other@example.com', 'alice', 'pw12345!!')
+        self.assertEqual(user_id_for('alice'), other.pk)
+        self.assertEqual(user_id_for('alicia'), self.alice.pk)
+
+    def test_delete_forgets_username(self):
+        self.assertEqual(user_id_for('alice'), self.alice.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice.delete()
+        self.assertIsNone(user_id_for('alice'))
+
+
+class FollowCountersTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice@example.com', 'alice', 'pw12345!!')
+        self.bob = User.objects.create_user('bob@example.com', 'bob', 'pw12345!!')
+        self.client.force_login(self.alice)
+
+    def test_follow_toggle_updates_counters_without_repeated_queries(self):
+        response = self.client.post('/api/users/bob/follow/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Query-Count', response)
+        self.assertNotIn('X-Query-Repeated', response)
+        self.assertEqual(UserSearchTerm.objects.get(user=self.bob).followers_count, 1)
+        self.bob.profile.refresh_from_db()
+        self.assertEqual(self.bob.profile.followers_count, 1)
+
+        response = self.client.post('/api/users/bob/follow/')
+        self.assertNotIn('X-Query-Repeated', response)
+        self.alice.profile.refresh_from_db()
+        self.assertEqual(self.alice.profile.following_count, 0)
+        self.assertEqual(UserSearchTerm.objects.get(user=self.bob).followers_count, 0)
+
+
+class MyProfileTests(TestCase):
+    def test_put_saves_profile(self):
+        alice = User.objects.create_user('alice@example.com', 'alice', 'pw12345!!')
+        self.client.force_login(alice)
+        response = self.client.put('/api/users/profile/', {'bio': 'hello'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['bio'], 'hello')
+        alice.profile.refresh_from_db()
+        self.assertEqual(alice.profile.bio, 'hello')
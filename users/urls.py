@@ -3,7 +3,7 @@ from django.urls import path
 from .views import (
     MyProfileAPI, LoginAPI, RegisterAPI, UserProfileAPI, FollowToggleView, LogoutAPI,
     UserFollowersView, UserFollowingView, UserPostsView, UserSearchView, 
-    UserStatsView, ChangePasswordView, DeleteAccountView,
+    UserStatsView, FollowSuggestionsView, ChangePasswordView, DeleteAccountView,
     AdminBanUserView, AdminUnbanUserView, AdminUserListView
 )
 
@@ -13,6 +13,7 @@ urlpatterns = [
     path('logout/', LogoutAPI.as_view(), name='logout'),
     path('register/', RegisterAPI.as_view(), name='register'),
     path('search/', UserSearchView.as_view(), name='user-search'),
+    path('suggestions/', FollowSuggestionsView.as_view(), name='follow-suggestions'),
     path('me/stats/', UserStatsView.as_view(), name='user-stats'),
     path('change-password/', ChangePasswordView.as_view(), name='change-password'),
     path('delete-account/', DeleteAccountView.as_view(), name='delete-account'),
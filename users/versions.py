@@ -0,0 +1,46 @@
+"""
+Версии пользовательских данных для условных GET.
+
+Profile.feed_version меняется при каждом изменении состава ленты
+(раскладка поста, подписка/отписка, удаление поста) и при правке постов в
+ней (подпись, варианты изображения); счетчики лайков и комментариев
+версию не меняют. Profile.notifications_version меняется при создании,
+группировке, прочтении и удалении уведомлений. ETag строится из версии,
+поэтому на повторный опрос с If-None-Match сервер отвечает 304 по одной
+строке профиля.
+
+После коммита изменения версии уведомлений отправляется сигнал
+notifications_changed - по нему поток уведомлений (notifications/stream.py)
+будит подключенных пользователей.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import Signal
+
+from .models import Profile
+
+# user_ids - пользователи, у которых изменились уведомления
+notifications_changed = Signal()
+
+
+def bump_feed(user_ids):
+    """Увеличить версию ленты пользователей (user_ids - список или подзапрос)"""
+    Profile.objects.filter(user_id__in=user_ids).update(feed_version=F('feed_version') + 1)
+
+
+def bump_notifications(user_ids):
+    """Увеличить версию уведомлений пользователей"""
+    user_ids = list(user_ids)
+    Profile.objects.filter(user_id__in=user_ids).update(
+        notifications_version=F('notifications_version') + 1
+    )
+    transaction.on_commit(
+        lambda: notifications_changed.send(sender=Profile, user_ids=user_ids)
+    )
+
+
+def get_versions(user_id):
+    """(feed_version, notifications_version) пользователя"""
+    return Profile.objects.filter(user_id=user_id).values_list(
+        'feed_version', 'notifications_version'
+    ).first() or (0, 0)
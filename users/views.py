@@ -1,20 +1,31 @@
+from functools import partial
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import status, generics
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from django.db.models import Count, Q
+from django.db.models import Exists, OuterRef, Sum
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.password_validation import validate_password
 
-from .models import Profile, User
-from .serializers import ProfileSerializer, UserSerializer, RegisterSerializer, LoginSerializer
+from .models import FollowSuggestion, Profile, User
+from .serializers import (
+    FollowListUserSerializer, FollowSuggestionSerializer, ProfileSerializer, UserSerializer, RegisterSerializer, LoginSerializer,
+)
+from . import graph, search
+from .counters import Follow
 from posts.serializers import PostSerializer
 from posts.models import Post
+from api.cache import CachedResponseMixin, user_id_for
+from api.conditional import ConditionalGetMixin
+from images.uploads import StreamingImageUploadMixin
 
 
-class MyProfileAPI(APIView):
+class MyProfileAPI(StreamingImageUploadMixin, APIView):
     permission_classes = (IsAuthenticated,)
+    query_budget = 3
 
     def get(self, request):
         profile = request.user.profile
@@ -23,9 +34,10 @@ class MyProfileAPI(APIView):
 
     def put(self, request):
         profile = request.user.profile
-        serializer = ProfileSerializer(profile, data=request.data, partial=True)
+        serializer = ProfileSerializer(profile, data=request.data, partial=True, context={'request': request})
 
         if serializer.is_valid():
+            serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -81,11 +93,28 @@ class LogoutAPI(APIView):
         return Response({'message': 'Logout successful'}, status=status.HTTP_200_OK)
 
 
-class UserProfileAPI(generics.RetrieveAPIView):
+class UserProfileAPI(ConditionalGetMixin, CachedResponseMixin, generics.RetrieveAPIView):
     permission_classes = (AllowAny,)
+    query_budget = 6
     serializer_class = ProfileSerializer
     lookup_field = 'username'
     queryset = User.objects.all()
+    conditional_cache_control = 'no-cache'
+
+    def retrieve(self, request, *args, **kwargs):
+        compute = partial(super().retrieve, request, *args, **kwargs)
+        return self.conditional_response(request, partial(self.cached_response, request, compute))
+
+    def get_validators(self):
+        # Profile.updated_at меняется и при изменении счетчиков подписок
+        updated_at = Profile.objects.filter(
+            user__username=self.kwargs['username']
+        ).values_list('updated_at', flat=True).first()
+        return None if updated_at is None else (updated_at.isoformat(), updated_at)
+
+    def get_cache_namespaces(self):
+        user_id = user_id_for(self.kwargs['username'])
+        return None if user_id is None else [f'user:{user_id}']
 
     def get_object(self):
         username = self.kwargs['username']
@@ -97,83 +126,137 @@ class FollowToggleView(APIView):
     permission_classes = (IsAuthenticated,)
 
     def post(self, request, username):
-        target_user = get_object_or_404(User, username=username)
+        target_profile_id = Profile.objects.filter(user__username=username).values_list('pk', flat=True).first()
+        if target_profile_id is None:
+            raise Http404
 
-        if target_user == request.user:
-            return Response({'message': 'Нельзя подписываться на себя'}, status=status.HTTP_400_BAD_REQUEST)
-
-        target_profile = target_user.profile
         current_profile = request.user.profile
+        if target_profile_id == current_profile.pk:
+            return Response({'message': 'Нельзя подписываться на себя'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if target_profile in current_profile.following.all():
-            current_profile.following.remove(target_profile)
+        if graph.is_following(current_profile.pk, target_profile_id):
+            graph.unfollow(current_profile, target_profile_id)
             return Response({'message': "Вы отписались"})
         else:
-            current_profile.following.add(target_profile)
+            graph.follow(current_profile, target_profile_id)
             return Response({"message": "Вы подписались"})
 
 
-class UserFollowersView(generics.ListAPIView):
+class FollowListMixin:
+    """
+    Список пользователей по строкам подписок (users/graph.py): keyset по
+    id строки, пользователь приходит тем же запросом, is_following для
+    всей страницы - одним запросом.
+    """
+    serializer_class = FollowListUserSerializer
+    permission_classes = (AllowAny,)
+    query_budget = 5
+    cursor_ordering = ('-id',)
+    # Сторона строки подписки, которую показываем
+    edge_profile = None
+
+    def get_profile_id(self):
+        profile_id = Profile.objects.filter(
+            user__username=self.kwargs['username']
+        ).values_list('pk', flat=True).first()
+        if profile_id is None:
+            raise Http404
+        return profile_id
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        users = [getattr(edge, self.edge_profile).user for edge in page]
+        following_ids = graph.following_among(request.user.pk, [user.pk for user in users])
+        serializer = self.get_serializer(users, many=True, context={
+            **self.get_serializer_context(), 'following_ids': following_ids,
+        })
+        return self.get_paginated_response(serializer.data)
+
+
+class UserFollowersView(FollowListMixin, generics.ListAPIView):
     """
     Список подписчиков пользователя:
     - GET /users/<username>/followers/
     """
-    serializer_class = UserSerializer
-    permission_classes = (AllowAny,)
+    edge_profile = 'from_profile'
 
     def get_queryset(self):
-        username = self.kwargs['username']
-        user = get_object_or_404(User, username=username)
-        followers_profiles = user.profile.followers.all()
-        return [profile.user for profile in followers_profiles]
+        return graph.followers(self.get_profile_id())
 
 
-class UserFollowingView(generics.ListAPIView):
+class UserFollowingView(FollowListMixin, generics.ListAPIView):
     """
     Список подписок пользователя:
     - GET /users/<username>/following/
     """
-    serializer_class = UserSerializer
-    permission_classes = (AllowAny,)
+    edge_profile = 'to_profile'
 
     def get_queryset(self):
-        username = self.kwargs['username']
-        user = get_object_or_404(User, username=username)
-        following_profiles = user.profile.following.all()
-        return [profile.user for profile in following_profiles]
+        return graph.following(self.get_profile_id())
 
 
-class UserPostsView(generics.ListAPIView):
+class UserPostsView(CachedResponseMixin, generics.ListAPIView):
     """
     Посты пользователя:
     - GET /users/<username>/posts/
     """
     serializer_class = PostSerializer
     permission_classes = (AllowAny,)
+    query_budget = 5
 
     def get_queryset(self):
         username = self.kwargs['username']
         user = get_object_or_404(User, username=username)
-        return Post.objects.filter(author=user).select_related('author').prefetch_related('likes')
+        return Post.objects.filter(author=user).select_related('author').order_by('-created_at', '-id')
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, partial(super().list, request, *args, **kwargs))
+
+    def get_cache_namespaces(self):
+        user_id = user_id_for(self.kwargs['username'])
+        return None if user_id is None else [f'user:{user_id}']
 
 
 class UserSearchView(generics.ListAPIView):
     """
-    Поиск пользователей:
-    - GET /users/search/?q=query
+    Поиск пользователей (автодополнение), top-k без пагинации:
+    - GET /users/search/?q=query&limit=10
     """
     serializer_class = UserSerializer
     permission_classes = (AllowAny,)
+    query_budget = 4
+    pagination_class = None
 
     def get_queryset(self):
         query = self.request.query_params.get('q', '')
-        if query:
-            return User.objects.filter(
-                Q(username__icontains=query) | 
-                Q(first_name__icontains=query) | 
-                Q(last_name__icontains=query)
-            )
-        return User.objects.none()
+        try:
+            limit = int(self.request.query_params.get('limit', search.SEARCH_LIMIT))
+        except ValueError:
+            limit = search.SEARCH_LIMIT
+        return search.search_users(query, limit=limit)
+
+
+class FollowSuggestionsView(generics.ListAPIView):
+    """
+    Рекомендации подписок ("возможно, вы знакомы"):
+    - GET /users/suggestions/
+    Таблицу пересчитывает manage.py compute_follow_suggestions; тех, на
+    кого пользователь подписался после расчета, отфильтровываем здесь.
+    """
+    serializer_class = FollowSuggestionSerializer
+    permission_classes = (IsAuthenticated,)
+    query_budget = 3
+    cursor_ordering = ('-score', 'id')
+
+    def get_queryset(self):
+        already_following = Follow.objects.filter(
+            from_profile__user_id=self.request.user.pk,
+            to_profile__user_id=OuterRef('suggested_id'),
+        )
+        return FollowSuggestion.objects.filter(
+            user=self.request.user,
+            suggested__is_active=True,
+        ).exclude(Exists(already_following)).select_related('suggested')
 
 
 class UserStatsView(APIView):
@@ -182,6 +265,7 @@ class UserStatsView(APIView):
     - GET /users/me/stats/
     """
     permission_classes = (IsAuthenticated,)
+    query_budget = 5
 
     def get(self, request):
         user = request.user
@@ -189,10 +273,10 @@ class UserStatsView(APIView):
         
         stats = {
             'posts_count': Post.objects.filter(author=user).count(),
-            'followers_count': profile.followers.count(),
-            'following_count': profile.following.count(),
+            'followers_count': profile.followers_count,
+            'following_count': profile.following_count,
             'total_likes_received': Post.objects.filter(author=user).aggregate(
-                total_likes=Count('likes')
+                total_likes=Sum('likes_count')
             )['total_likes'] or 0,
         }
         
@@ -311,9 +395,11 @@ class AdminUserListView(generics.ListAPIView):
     """
     serializer_class = UserSerializer
     permission_classes = (IsAuthenticated,)
+    query_budget = 3
+    cursor_ordering = ('-date_joined', '-id')
 
     def get_queryset(self):
         if not self.request.user.is_staff:
             return User.objects.none()
-        return User.objects.all().order_by('-date_joined')
+        return User.objects.all().order_by('-date_joined', '-id')
 